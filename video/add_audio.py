@@ -1,7 +1,11 @@
 from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip, concatenate_audioclips
 import os
 
-def add_audio_to_video(video_path, audio_path, output_path, video_audio_factor=0.0, music_volume=1.0):
+from cache_utils import is_url
+from pcm_cache import cached_audio_clip
+
+def add_audio_to_video(video_path, audio_path, output_path, video_audio_factor=0.0, music_volume=1.0, use_pcm_cache=True, qc=False,
+                       encode_plan=None):
     """
     Add background music to a video file
 
@@ -11,29 +15,40 @@ def add_audio_to_video(video_path, audio_path, output_path, video_audio_factor=0
         output_path (str): Path where the output video will be saved
         video_audio_factor (float): Volume factor for original video audio (0.0 to 1.0, default 0.0 - mute)
         music_volume (float): Volume factor for added music (0.0 to 1.0, default 1.0)
+        use_pcm_cache (bool): Read the music from the decoded-PCM cache instead of decoding it
+                              again (default: True; local files only, the cache is keyed by content)
+        qc (bool/str): Check the result for black frames, freezes, silence and loudness and write
+                       <output>.qc.json next to it, or the report to this path (see media_qc.py)
+        encode_plan (dict): Rate control from encode_planner, starting from MoviePy's medium/CRF 23: a plan
+                            from plan_encode, or its constraints to plan on the video, e.g.
+                            {'target_size': '700MB', 'deadline': 600}
     """
     try:
         # Load the video
         video = VideoFileClip(video_path)
 
-        # Load the audio
-        audio = AudioFileClip(audio_path)
-
         # Get original video audio if needed and if it exists
         original_audio = None
         if video_audio_factor > 0 and video.audio is not None:
             original_audio = video.audio.volumex(video_audio_factor)
 
-        # If audio is shorter than video, loop it
-        if audio.duration < video.duration:
-            # Calculate how many times to loop
-            num_loops = int(video.duration // audio.duration) + 1
-            audio = concatenate_audioclips([audio] * num_loops)
+        if use_pcm_cache and not is_url(audio_path):
+            # Decoded once, then memory-mapped; looped and trimmed to the video length
+            audio = cached_audio_clip(audio_path, duration=video.duration, loop=True)
+        else:
+            # Load the audio
+            audio = AudioFileClip(audio_path)
 
+            # If audio is shorter than video, loop it
+            if audio.duration < video.duration:
+                # Calculate how many times to loop
+                num_loops = int(video.duration // audio.duration) + 1
+                audio = concatenate_audioclips([audio] * num_loops)
 
-        # Trim audio if it's longer than video
-        if audio.duration > video.duration:
-             audio = audio.subclip(0, video.duration)
+
+            # Trim audio if it's longer than video
+            if audio.duration > video.duration:
+                 audio = audio.subclip(0, video.duration)
 
         # Adjust music volume
         audio = audio.volumex(music_volume)
@@ -49,11 +64,12 @@ def add_audio_to_video(video_path, audio_path, output_path, video_audio_factor=0
         final_video = video.set_audio(final_audio)
 
         # Write the result to file
-        final_video.write_videofile(
-            output_path,
-            codec='libx264',
-            audio_codec='aac'
-        )
+        write_kwargs = {'codec': 'libx264', 'audio_codec': 'aac'}
+        if encode_plan is not None:
+            from encode_planner import moviepy_write_kwargs, resolve_plan, writer_settings
+            plan = resolve_plan(encode_plan, video_path, **writer_settings(write_kwargs))
+            write_kwargs = moviepy_write_kwargs(plan, write_kwargs)
+        final_video.write_videofile(output_path, **write_kwargs)
 
         # Clean up
         video.close()
@@ -65,8 +81,13 @@ def add_audio_to_video(video_path, audio_path, output_path, video_audio_factor=0
 
         print(f"Audio added successfully and saved to: {output_path}")
 
+        if qc:
+            from media_qc import run_qc
+            run_qc(output_path, report_path=qc if isinstance(qc, str) else None)
+
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        raise
 
 if __name__ == "__main__":
     # Example usage
@@ -1,17 +1,19 @@
+import contextlib
 import os
 import uuid
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, g, abort, jsonify, send_file
 
-# Import your existing functions (make sure these files are in the same directory or accessible)
-from trim_video import trim_video
-from stitch_videos import concatenate_videos
-from overlay_text import add_text_overlay
-from add_audio import add_audio_to_video
+import config
+from storage_manager import StorageManager, mark_used
+from storage_backend import LocalStorage, get_storage
+
+# The processing modules (moviepy, cv2, numpy...) are imported inside each task so that
+# workers start fast and only load what the requested task needs
 # from overlay_image import add_logo_cv2 # Import if you add the image tab later
 
 # --- Configuration ---
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-PROCESSED_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processed')
+UPLOAD_FOLDER = config.get('upload_folder')
+PROCESSED_FOLDER = config.get('processed_folder')
 ALLOWED_EXTENSIONS_VIDEO = {'mp4', 'mov', 'avi', 'mkv', 'webm'}
 ALLOWED_EXTENSIONS_AUDIO = {'mp3', 'wav', 'aac', 'ogg'}
 ALLOWED_EXTENSIONS_IMAGE = {'png', 'jpg', 'jpeg', 'gif'} # For logo if added later
@@ -25,6 +27,17 @@ app.secret_key = 'your_very_secret_key' # Change this for production
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+# Keeps uploads/ and processed/ within their quotas; files used by a running job are pinned
+STORAGE = StorageManager(
+    {UPLOAD_FOLDER: config.get('upload_quota'), PROCESSED_FOLDER: config.get('processed_quota')},
+    cold_dir=config.get('cold_folder') or None,
+    inactive_after=config.get('inactive_after')
+)
+STORAGE.start()
+
+# Optional shared store (local folder or s3://bucket/prefix) where results are also published
+RESULTS = get_storage(config.get('results_url')) if config.get('results_url') else None
+
 def allowed_file(filename, allowed_extensions):
     """Checks if the file extension is allowed."""
     return '.' in filename and \
@@ -36,6 +49,9 @@ def save_uploaded_file(file, allowed_extensions):
         filename = str(uuid.uuid4()) + "_" + file.filename
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
+        # Pinned until the request finishes so eviction can't remove it mid-job
+        STORAGE.acquire(filepath)
+        g.setdefault('job_files', []).append(filepath)
         return filepath
     return None
 
@@ -46,6 +62,163 @@ def index():
     """Renders the main page."""
     return render_template('index.html')
 
+def uploaded_path(upload_id):
+    """Path of a file saved by /upload; upload ids are plain file names."""
+    if not upload_id or os.path.basename(upload_id) != upload_id:
+        raise ValueError("Invalid upload id")
+    filepath = STORAGE.resolve(os.path.join(app.config['UPLOAD_FOLDER'], upload_id))
+    if not os.path.exists(filepath):
+        raise ValueError("Unknown or expired upload id")
+    return filepath
+
+@app.route('/upload', methods=['POST'])
+def upload():
+    """Saves one file for later previews/renders and returns its id (and video info)."""
+    try:
+        file = request.files.get('file')
+        if not file or file.filename == '':
+            raise ValueError("No file selected")
+        filepath = save_uploaded_file(file, ALLOWED_EXTENSIONS_VIDEO | ALLOWED_EXTENSIONS_AUDIO | ALLOWED_EXTENSIONS_IMAGE)
+        if not filepath:
+            raise ValueError("Invalid file type")
+
+        result = {'upload_id': os.path.basename(filepath)}
+        if allowed_file(file.filename, ALLOWED_EXTENSIONS_VIDEO):
+            # Probe and index now so the first preview doesn't pay for it
+            from ffmpeg_runner import probe_video_cached
+            from seek_index import load_seek_index
+            result['info'] = probe_video_cached(filepath)
+            load_seek_index(filepath)
+        if allowed_file(file.filename, ALLOWED_EXTENSIONS_AUDIO) or result.get('info', {}).get('has_audio'):
+            # Waveform peaks for the audio tab, generated in the background
+            start_waveform_job(filepath)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        for filepath in g.get('job_files', []):
+            STORAGE.release(filepath)
+
+@app.route('/preview/<task>', methods=['POST'])
+def preview(task):
+    """
+    Low-resolution preview of a text/logo/audio edit on an uploaded video
+
+    Form fields: video_id (from /upload), at (seconds), window (seconds), still (1 for a
+    single frame), plus the same task fields as /process/<task> (logo_id / audio_id
+    for the logo and audio files).
+    """
+    from preview import render_preview
+
+    try:
+        if task not in ('text', 'logo', 'audio', 'none'):
+            raise ValueError("Invalid task specified")
+        form = request.form
+        params = {}
+        if task == 'text':
+            position = form.get('position', 'center')
+            if position == 'right_top': position = ('right', 'top')
+            elif position == 'left_bottom': position = ('left', 'bottom')
+            params = {
+                'text': form.get('overlay_text', 'Default Text'),
+                'font_size': int(form.get('font_size', 70)),
+                'color': form.get('text_color', 'white'),
+                'position': position,
+            }
+        elif task == 'logo':
+            params = {
+                'logo_path': uploaded_path(form.get('logo_id')),
+                'position': form.get('position', 'top-left'),
+                'padding': int(form.get('padding', 5)),
+            }
+            if form.get('logo_width') and form.get('logo_height'):
+                params['size'] = (int(form['logo_width']), int(form['logo_height']))
+        elif task == 'audio':
+            params = {
+                'audio_path': uploaded_path(form.get('audio_id')),
+                'video_volume': float(form.get('video_volume', 0.0)) / 100.0,
+                'music_volume': float(form.get('music_volume', 100.0)) / 100.0,
+            }
+
+        preview_path = render_preview(
+            uploaded_path(form.get('video_id')),
+            None if task == 'none' else task,
+            params,
+            at=float(form.get('at', 0.0)),
+            window=min(float(form.get('window', 3.0)), 10.0),
+            still=form.get('still') in ('1', 'true', 'on')
+        )
+        return send_file(preview_path, max_age=3600)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/thumbnails/<upload_id>')
+def filmstrip(upload_id):
+    """
+    Filmstrip of an uploaded video: JSON timing map with the sprite sheet URL
+
+    Query arguments: count (default 100), width (thumbnail width, default 160).
+    """
+    import json
+    from thumbnails import generate_filmstrip
+
+    try:
+        count = min(int(request.args.get('count', 100)), 400)
+        width = min(int(request.args.get('width', 160)), 320)
+        _, map_path = generate_filmstrip(uploaded_path(upload_id), count=count, thumb_width=width)
+        with open(map_path, 'r', encoding='utf-8') as f:
+            timing_map = json.load(f)
+        timing_map['sprite_url'] = url_for('thumbnail_sprite', name=timing_map['sprite'])
+        return jsonify(timing_map)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/thumbnails/sprite/<name>')
+def thumbnail_sprite(name):
+    """Serves a sprite sheet from the thumbnail cache (names are content keys, so cache for long)."""
+    from thumbnails import THUMBNAIL_CACHE_DIR
+    return send_from_directory(THUMBNAIL_CACHE_DIR, name, max_age=86400)
+
+def start_waveform_job(filepath):
+    """Starts the peaks generation of an upload in the background; the file stays pinned until it's done."""
+    from waveform import start_waveform
+    peaks_path, future = start_waveform(filepath)
+    if future is not None:
+        STORAGE.acquire(filepath)
+        future.add_done_callback(lambda _: STORAGE.release(filepath))
+    return peaks_path, future
+
+@app.route('/waveform/<upload_id>')
+def waveform_peaks(upload_id):
+    """
+    Waveform peaks of an uploaded audio or video file for a time range
+
+    Query arguments: start, end (seconds, default: whole file), pixels (display width,
+    default 1000). Answers 202 while the peaks are still being generated.
+    """
+    from concurrent.futures import wait
+    from waveform import read_peaks
+
+    try:
+        peaks_path, future = start_waveform_job(uploaded_path(upload_id))
+        if future is not None:
+            wait([future], timeout=1.0)
+            if not future.done():
+                return jsonify({'status': 'pending'}), 202
+            future.result()  # Raises if the generation failed
+        end = request.args.get('end')
+        peaks = read_peaks(
+            peaks_path,
+            start=float(request.args.get('start', 0.0)),
+            end=float(end) if end else None,
+            pixels=min(int(request.args.get('pixels', 1000)), 8000)
+        )
+        response = jsonify(dict(peaks, peaks=peaks['peaks'].tolist()))
+        response.cache_control.max_age = 3600
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/process/<task>', methods=['POST'])
 def process_task(task):
     """Handles the processing for different tasks."""
@@ -53,8 +226,16 @@ def process_task(task):
     output_filepath = None
     error_message = None
     processed_video_url = None
+    profile_urls = []
+    profile = contextlib.ExitStack()
+    session = None
 
     try:
+        # X-Profile-Job: 1 profiles this job; the files are stored next to the result
+        if request.headers.get('X-Profile-Job', '').lower() in ('1', 'true', 'yes'):
+            from profiling import profile_job
+            session = profile.enter_context(profile_job(app.config['PROCESSED_FOLDER'], f"profile_{uuid.uuid4()}"))
+
         # --- Trim Task ---
         if task == 'trim':
             if 'video_file' not in request.files:
@@ -72,6 +253,7 @@ def process_task(task):
             if not input_filepath:
                  raise ValueError("Invalid file type")
 
+            from trim_video import trim_video
             output_filename = f"trimmed_{str(uuid.uuid4())}.mp4"
             output_filepath = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
             trim_video(input_filepath, output_filepath, start_time, end_time)
@@ -91,6 +273,7 @@ def process_task(task):
             if len(input_filepaths) < 2:
                 raise ValueError("Need at least two valid video files to stitch")
 
+            from stitch_videos import concatenate_videos
             output_filename = f"stitched_{str(uuid.uuid4())}.mp4"
             output_filepath = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
             concatenate_videos(input_filepaths, output_filepath)
@@ -117,6 +300,7 @@ def process_task(task):
             if not input_filepath:
                  raise ValueError("Invalid file type")
 
+            from overlay_text import add_text_overlay
             output_filename = f"text_{str(uuid.uuid4())}.mp4"
             output_filepath = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
             add_text_overlay(input_filepath, output_filepath, text, font_size, color, position)
@@ -140,6 +324,7 @@ def process_task(task):
             if not input_video_path or not input_audio_path:
                  raise ValueError("Invalid file type for video or audio")
 
+            from add_audio import add_audio_to_video
             output_filename = f"audio_{str(uuid.uuid4())}.mp4"
             output_filepath = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
             add_audio_to_video(input_video_path, input_audio_path, output_filepath, video_volume, music_volume)
@@ -149,7 +334,11 @@ def process_task(task):
 
         # --- Success ---
         if output_filename and os.path.exists(output_filepath):
+            if RESULTS is not None:
+                RESULTS.upload_file(output_filepath, output_filename)
             processed_video_url = url_for('serve_processed', filename=output_filename)
+            if session:
+                session.name = os.path.splitext(output_filename)[0]
             flash(f"Task '{task}' completed successfully!", "success")
         else:
              raise ValueError(f"Processing failed or output file not found for task '{task}'.")
@@ -159,24 +348,37 @@ def process_task(task):
         flash(error_message, "error")
         print(f"Error: {error_message}") # Log error to console
 
-    # Clean up uploaded files (optional) - consider doing this in a background task
-    # for file_to_remove in request.files.values():
-    #     if file_to_remove and file_to_remove.filename != '':
-    #          try:
-    #              # Be careful here, ensure you only delete from uploads
-    #              # uploaded_path = os.path.join(app.config['UPLOAD_FOLDER'], ...) # reconstruct path safely
-    #              # os.remove(uploaded_path)
-    #              pass # Implement safe cleanup if needed
-    #          except OSError as e:
-    #              print(f"Error removing uploaded file: {e}")
+    profile.close()  # Writes the profile files
+    if session:
+        profile_urls = [url_for('serve_processed', filename=os.path.basename(path)) for path in session.files]
+        print(f"Profile of task '{task}': {', '.join(session.files)}")
+
+    # Unpin the uploads; the storage manager evicts them once they are inactive
+    for filepath in g.get('job_files', []):
+        STORAGE.release(filepath)
+
+    # Scripted clients (e.g. load_test.py) ask for JSON instead of the page
+    if request.accept_mimetypes.best == 'application/json':
+        if error_message:
+            return jsonify({'error': error_message}), 400
+        return jsonify({'processed_video_url': processed_video_url, 'profile': profile_urls})
 
     return render_template('index.html', processed_video_url=processed_video_url)
 
 
 @app.route('/processed/<filename>')
 def serve_processed(filename):
-    """Serves the processed video file."""
-    return send_from_directory(app.config['PROCESSED_FOLDER'], filename)
+    """Serves the processed video file (from the cold tier if it was moved there)."""
+    if os.path.basename(filename) != filename:
+        abort(404)
+    filepath = STORAGE.resolve(os.path.join(app.config['PROCESSED_FOLDER'], filename))
+    if not os.path.exists(filepath) and RESULTS is not None and RESULTS.exists(filename):
+        # Evicted locally but published: serve from the shared store
+        if isinstance(RESULTS, LocalStorage):
+            return send_from_directory(RESULTS.root, filename)
+        return redirect(RESULTS.input_url(filename))
+    mark_used(filepath)  # Downloads count as use for LRU eviction
+    return send_from_directory(os.path.dirname(filepath), filename)
 
 # --- Run App ---
 if __name__ == '__main__':
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import uuid
+import numpy as np
+from moviepy.editor import AudioClip
+
+from cache_utils import file_digest, touch
+from ffmpeg_runner import probe_video_cached, run_ffmpeg
+
+ASSET_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'assets')
+REGISTRY_NAME = 'registry.json'
+
+# Everything that must match for segments to be joined without re-encoding.
+# The x264 preset and level are part of it because they change the stream headers.
+OUTPUT_PROFILES = {
+    '2160p30': {'width': 3840, 'height': 2160, 'fps': 30, 'vcodec': 'libx264', 'preset': 'medium',
+                'crf': 18, 'level': '5.1', 'pix_fmt': 'yuv420p', 'acodec': 'aac', 'audio_fps': 48000,
+                'audio_channels': 2, 'audio_bitrate': '192k'},
+    '1080p30': {'width': 1920, 'height': 1080, 'fps': 30, 'vcodec': 'libx264', 'preset': 'medium',
+                'crf': 20, 'level': '4.1', 'pix_fmt': 'yuv420p', 'acodec': 'aac', 'audio_fps': 48000,
+                'audio_channels': 2, 'audio_bitrate': '192k'},
+    '720p30': {'width': 1280, 'height': 720, 'fps': 30, 'vcodec': 'libx264', 'preset': 'medium',
+               'crf': 21, 'level': '3.1', 'pix_fmt': 'yuv420p', 'acodec': 'aac', 'audio_fps': 48000,
+               'audio_channels': 2, 'audio_bitrate': '128k'},
+}
+DEFAULT_PROFILE = '1080p30'
+
+def get_profile(profile):
+    """Accepts a profile name from OUTPUT_PROFILES or a profile dict."""
+    if isinstance(profile, str):
+        if profile not in OUTPUT_PROFILES:
+            raise ValueError(f"Unknown output profile: {profile}")
+        return OUTPUT_PROFILES[profile]
+    return profile
+
+def profile_key(profile):
+    """Short stable hash of a profile, used in cache file names."""
+    encoded = json.dumps(get_profile(profile), sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+def profile_encoder_args(profile, plan=None):
+    """
+    FFmpeg output arguments that produce a stream matching the profile
+
+    Args:
+        profile (str/dict): Output profile name or dict
+        plan (dict): Plan from encode_planner.plan_encode whose rate control replaces the profile's
+                     CRF (default: none). The profile's preset is kept because it changes the stream
+                     headers; a two-pass plan is encoded in one pass at its bitrate, capped
+    """
+    profile = get_profile(profile)
+    if plan is None:
+        rate = ['-crf', str(profile['crf'])]
+    elif plan['rate_control'] == 'two_pass':
+        cap = plan['maxrate'] or plan['bitrate']
+        rate = ['-b:v', str(plan['bitrate']), '-maxrate', str(cap), '-bufsize', str(2 * cap)]
+    else:
+        rate = ['-crf', str(plan['crf'])]
+        if plan['maxrate']:
+            rate += ['-maxrate', str(plan['maxrate']), '-bufsize', str(plan['bufsize'])]
+    return [
+        '-c:v', profile['vcodec'],
+        '-preset', profile['preset'],
+    ] + rate + [
+        '-level', profile['level'],
+        '-pix_fmt', profile['pix_fmt'],
+        '-r', str(profile['fps']),
+        '-video_track_timescale', '90000',
+        '-c:a', profile['acodec'],
+        '-ar', str(profile['audio_fps']),
+        '-ac', str(profile['audio_channels']),
+        '-b:a', profile['audio_bitrate'],
+    ]
+
+def profile_write_kwargs(profile):
+    """Keyword arguments for MoviePy's write_videofile that match the profile."""
+    profile = get_profile(profile)
+    return {
+        'codec': profile['vcodec'],
+        'audio_codec': profile['acodec'],
+        'fps': profile['fps'],
+        'preset': profile['preset'],
+        'audio_fps': profile['audio_fps'],
+        'audio_nbytes': 2,
+        'audio_bitrate': profile['audio_bitrate'],
+        # MoviePy muxes its temporary audio file with -acodec copy, so the channel
+        # count comes from the clip itself (see conform_clip)
+        'ffmpeg_params': ['-crf', str(profile['crf']), '-level', profile['level'],
+                          '-pix_fmt', profile['pix_fmt'], '-video_track_timescale', '90000'],
+    }
+
+def conform_clip(clip, profile=DEFAULT_PROFILE):
+    """
+    Letterbox a MoviePy clip to the profile size and give it a stereo track if it has none
+
+    Args:
+        clip (VideoClip): Clip that will be written with profile_write_kwargs
+        profile (str/dict): Output profile name or dict (default: DEFAULT_PROFILE)
+    """
+    profile = get_profile(profile)
+    width, height = profile['width'], profile['height']
+
+    if (clip.w, clip.h) != (width, height):
+        scale = min(width / clip.w, height / clip.h)
+        clip = clip.resize(scale).on_color(size=(width, height), color=(0, 0, 0), pos='center')
+
+    if clip.audio is None:
+        channels = profile['audio_channels']
+        silence = AudioClip(lambda t: np.zeros((np.size(t), channels)) if np.ndim(t) else np.zeros(channels),
+                            duration=clip.duration, fps=profile['audio_fps'])
+        clip = clip.set_audio(silence)
+
+    return clip
+
+def normalize_to_profile(input_path, output_path, profile=DEFAULT_PROFILE):
+    """
+    Re-encode a clip to exactly match an output profile
+
+    The picture is scaled to fit and letterboxed, and a silent track is added if the
+    clip has no audio, so the result can be spliced with any other clip of the profile.
+
+    Args:
+        input_path (str): Path to the input video file
+        output_path (str): Path where the normalized video will be saved
+        profile (str/dict): Output profile name or dict (default: DEFAULT_PROFILE)
+    """
+    run_ffmpeg(normalize_args(input_path, output_path, profile))
+
+def normalize_args(input_path, output_path, profile=DEFAULT_PROFILE, plan=None):
+    """ffmpeg arguments of normalize_to_profile, e.g. to run several with RUNNER.run_many_sync (see profile_encoder_args for plan)."""
+    profile = get_profile(profile)
+    width, height = profile['width'], profile['height']
+    video_filter = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={profile['fps']}")
+
+    ffmpeg_args = ['-i', input_path]
+    if probe_video_cached(input_path)['has_audio']:
+        ffmpeg_args += ['-map', '0:v:0', '-map', '0:a:0']
+    else:
+        layout = 'stereo' if profile['audio_channels'] == 2 else 'mono'
+        ffmpeg_args += ['-f', 'lavfi', '-i', f"anullsrc=r={profile['audio_fps']}:cl={layout}",
+                       '-map', '0:v:0', '-map', '1:a:0', '-shortest']
+    ffmpeg_args += ['-vf', video_filter] + profile_encoder_args(profile, plan)
+    ffmpeg_args += ['-movflags', '+faststart', '-y', output_path]
+    return ffmpeg_args
+
+def _registry_path(cache_dir):
+    return os.path.join(cache_dir, REGISTRY_NAME)
+
+def load_registry(cache_dir=ASSET_CACHE_DIR):
+    """Returns the {name: source_path} mapping of registered assets."""
+    path = _registry_path(cache_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def register_asset(name, source_path, profiles=(), cache_dir=ASSET_CACHE_DIR):
+    """
+    Register a reusable clip (intro, outro, bumper) under a name
+
+    Args:
+        name (str): Asset name, e.g. 'brand-intro'
+        source_path (str): Path to the master clip
+        profiles (iterable): Output profiles to pre-encode right away (default: none, encode on first use)
+        cache_dir (str): Asset cache folder (default: cache/assets next to this file)
+    """
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Asset file not found: {source_path}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    registry = load_registry(cache_dir)
+    registry[name] = os.path.abspath(source_path)
+
+    tmp_path = _registry_path(cache_dir) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, indent=2)
+    os.replace(tmp_path, _registry_path(cache_dir))
+
+    for profile in profiles:
+        get_asset_segment(name, profile, cache_dir)
+
+def get_asset_segment(name_or_path, profile=DEFAULT_PROFILE, cache_dir=ASSET_CACHE_DIR):
+    """
+    Path of an asset pre-encoded to an output profile, encoding it only the first time
+
+    Args:
+        name_or_path (str): Registered asset name, or a path to a clip
+        profile (str/dict): Output profile name or dict (default: DEFAULT_PROFILE)
+        cache_dir (str): Asset cache folder (default: cache/assets next to this file)
+    """
+    source_path = load_registry(cache_dir).get(name_or_path, name_or_path)
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Unknown asset or missing file: {name_or_path}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    segment_path = os.path.join(cache_dir, f"{file_digest(source_path)}_{profile_key(profile)}.mp4")
+
+    if os.path.exists(segment_path):
+        touch(segment_path)
+        return segment_path
+
+    print(f"Pre-encoding asset {name_or_path} for profile {profile_key(profile)}...")
+    tmp_path = segment_path + f'.{uuid.uuid4().hex}.mp4'
+    try:
+        normalize_to_profile(source_path, tmp_path, profile)
+        os.replace(tmp_path, segment_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return segment_path
+
+if __name__ == "__main__":
+    # Example usage: register brand clips once, pre-encoded for every delivery profile
+    register_asset('hero-intro', r"C:\data\hero\brand-intro.mp4", profiles=['1080p30', '720p30'])
+    register_asset('hero-outro', r"C:\data\hero\brand-outro.mp4", profiles=['1080p30', '720p30'])
+    print(load_registry())
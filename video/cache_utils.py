@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+# (path, size, mtime) -> digest, so unchanged files are only hashed once per process
+_digest_memo = {}
+
+def is_url(path):
+    """True for URLs (e.g. presigned S3 inputs), which have no local file to stat, hash or put a sidecar next to."""
+    return '://' in path
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    SHA-1 of a file's content, used as a cache key that survives renames and copies
+
+    Args:
+        path (str): File to hash
+        chunk_size (int): Read size in bytes (default: 1 MiB)
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if memo_key in _digest_memo:
+        return _digest_memo[memo_key]
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+
+    _digest_memo[memo_key] = sha1.hexdigest()
+    return _digest_memo[memo_key]
+
+def file_version(path):
+    """Cheap identity of a file version (path, size, mtime), for keys where hashing the content would cost too much."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime}"
+
+def touch(path):
+    """Marks a cache entry as recently used (mtime is the LRU clock, atime is often disabled)."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+def enforce_budget(cache_dir, max_bytes, keep=()):
+    """
+    Evict least recently used files until a cache folder fits in its disk budget
+
+    Args:
+        cache_dir (str): Cache folder (searched recursively)
+        max_bytes (int): Disk budget in bytes
+        keep (iterable): Paths that must not be evicted (e.g. the entry just written)
+
+    Returns:
+        int: Number of bytes freed
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Removed by another process meanwhile
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        try:
+            os.remove(path)
+            freed += size
+        except OSError as e:
+            print(f"Warning: Could not evict cache file {path}: {e}")
+
+    return freed
@@ -0,0 +1,332 @@
+# Command line entry point: python cli.py <command> [options]
+#
+# Only argparse is loaded up front; each command imports the processing modules it
+# needs (moviepy, cv2, torch, ...) when it runs, so --help and light commands start fast.
+# Inputs and outputs can be local paths or s3://bucket/key URIs (see storage_backend.py).
+# trim, text, logo, audio and upscale also take '-' for stdin/stdout (see stream_tools.py).
+import argparse
+import contextlib
+import os
+import shlex
+import sys
+
+from storage_backend import output_target, resolve_input
+
+def _size(value):
+    """Parses WIDTHxHEIGHT into a (width, height) tuple."""
+    try:
+        width, height = value.lower().split('x')
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected WIDTHxHEIGHT, got '{value}'")
+
+def _position(value):
+    """'right_top' style positions become MoviePy tuples, like in the web app."""
+    return tuple(value.split('_')) if '_' in value else value
+
+def _streaming(*paths):
+    """True when a path is '-', i.e. the command reads stdin or writes stdout."""
+    return '-' in paths
+
+def _add_stream_format(command):
+    command.add_argument('--format', default='mpegts', choices=['mpegts', 'mp4'],
+                         help="Container when the output is '-' (stdout): mpegts or fragmented mp4")
+
+def _qc_report(args):
+    """Report path for --qc: <output>.qc.json, uploaded next to the output when that is remote."""
+    if not args.qc:
+        return contextlib.nullcontext(False)
+    return output_target(args.output + '.qc.json', suffix='.json')
+
+def cmd_trim(args):
+    if _streaming(args.input, args.output):
+        from stream_tools import stream_trim
+        stream_trim(resolve_input(args.input), args.output, args.start, args.end, args.format)
+        return
+
+    from trim_video import trim_video
+    with output_target(args.output) as output:
+        trim_video(resolve_input(args.input), output, args.start, args.end, use_index=not args.no_index)
+
+def cmd_stitch(args):
+    from stitch_videos import concatenate_videos
+    with output_target(args.output) as output, _qc_report(args) as report:
+        concatenate_videos([resolve_input(path) for path in args.inputs], output,
+                           intro=args.intro, outro=args.outro, profile=args.profile, qc=report)
+
+def cmd_text(args):
+    if _streaming(args.input, args.output):
+        if args.cues:
+            raise ValueError("Cue lists need a file input and output, not '-'")
+        from stream_tools import stream_text
+        stream_text(resolve_input(args.input), args.output, args.text, args.font_size, args.color,
+                    _position(args.position), args.format)
+        return
+
+    with output_target(args.output) as output:
+        if args.cues:
+            from overlay_text import add_timed_captions
+            add_timed_captions(resolve_input(args.input), output, args.cues, font_size=args.font_size,
+                               color=args.color, position=_position(args.position))
+        else:
+            from overlay_text import add_text_overlay
+            add_text_overlay(resolve_input(args.input), output, args.text, args.font_size, args.color,
+                             _position(args.position))
+
+def cmd_logo(args):
+    if _streaming(args.input, args.output):
+        from stream_tools import stream_logo
+        stream_logo(resolve_input(args.input), args.output, args.logo, position=args.position,
+                    size=args.size, padding=args.padding, stream_format=args.format)
+        return
+
+    with output_target(args.output) as output:
+        if args.yuv:
+            from overlay_yuv import add_logo_yuv
+            add_logo_yuv(resolve_input(args.input), output, args.logo, position=args.position,
+                         size=args.size, padding=args.padding)
+        else:
+            from overlay_image import add_logo_cv2
+            add_logo_cv2(resolve_input(args.input), output, args.logo, position=args.position,
+                         size=args.size, padding=args.padding, workers=args.workers)
+
+def cmd_audio(args):
+    if _streaming(args.video, args.output):
+        if args.qc:
+            raise ValueError("--qc needs a file output, not '-'")
+        from stream_tools import stream_audio
+        stream_audio(resolve_input(args.video), resolve_input(args.audio), args.output,
+                     args.video_volume, args.music_volume, args.format)
+        return
+
+    from add_audio import add_audio_to_video
+    with output_target(args.output) as output, _qc_report(args) as report:
+        add_audio_to_video(resolve_input(args.video), resolve_input(args.audio), output,
+                           args.video_volume, args.music_volume, qc=report)
+
+def cmd_upscale(args):
+    if _streaming(args.input, args.output):
+        # Only the ffmpeg Lanczos backend works on a stream, at its fixed quality
+        if args.target_size or args.max_bitrate:
+            raise ValueError("--target-size and --max-bitrate need a file input and output, not '-'")
+        if args.quality or args.backend or args.deadline is not None:
+            raise ValueError("--quality, --backend and --deadline need a file input and output, not '-'")
+        from stream_tools import stream_upscale
+        stream_upscale(resolve_input(args.input), args.output, target_height=args.height,
+                       stream_format=args.format)
+        return
+
+    if args.target_size or args.max_bitrate:
+        # Size and bitrate limits are planned for the ffmpeg backend's encoder, which
+        # uploads an s3:// output while encoding
+        from video_upscaler_ffmpeg import upscale_video_ffmpeg
+        plan = {'target_size': args.target_size, 'max_bitrate': args.max_bitrate, 'deadline': args.deadline}
+        upscale_video_ffmpeg(resolve_input(args.input), args.output, target_height=args.height, encode_plan=plan)
+        return
+
+    from upscaler_engine import upscale
+    with output_target(args.output) as output:
+        upscale(resolve_input(args.input), output, target=args.height, quality=args.quality or 'high',
+                deadline=args.deadline, backends=args.backend)
+
+def cmd_scenes(args):
+    from scene_detect import detect_scenes, split_scenes
+    input_path = resolve_input(args.input)
+    cuts = detect_scenes(input_path, threshold=args.threshold, min_scene_len=args.min_scene_len,
+                         method=args.method, width=args.width)
+    if args.json:
+        import json
+        print(json.dumps(cuts))
+    else:
+        for t in cuts:
+            print(f"{t:.3f}")
+    if args.split:
+        # Clips are named after the input, not after its presigned URL
+        split_scenes(input_path, args.split, cuts=cuts,
+                     name=os.path.splitext(os.path.basename(args.input))[0])
+
+def cmd_timeline(args):
+    from timeline import load_timeline, render_timeline
+    clips, profile = load_timeline(args.spec)
+    with output_target(args.output) as output:
+        render_timeline(clips, output, profile=args.profile or profile)
+
+def cmd_qc(args):
+    from media_qc import run_qc
+    limits = {name: getattr(args, name) for name in ('min_black', 'min_freeze', 'min_silence', 'silence_db',
+                                                       'loudness_target') if getattr(args, name) is not None}
+    # The report goes next to the input by default, uploaded there when the input is remote
+    with output_target(args.report or args.input + '.qc.json', suffix='.json') as report_path:
+        report = run_qc(resolve_input(args.input), report_path=report_path, **limits)
+    if not report['passed']:
+        raise ValueError("QC failed")
+
+def _profile_target(args):
+    """Folder and file prefix for --profile output: next to the local output file by default."""
+    output = getattr(args, 'output', None) or getattr(args, 'file', None)
+    if args.profile_dir:
+        directory = args.profile_dir
+    elif output and not output.startswith('s3://'):
+        directory = os.path.dirname(os.path.abspath(output))
+    else:
+        directory = os.getcwd()
+    name = os.path.splitext(os.path.basename(output))[0] if output else args.command
+    return directory, f"{name}.{args.command}"
+
+def run_command(args):
+    """Runs a parsed command, wrapped in profile_job when --profile is given."""
+    if not (args.profile_job or args.profile_dir):
+        return args.func(args)
+
+    from profiling import profile_job
+    directory, name = _profile_target(args)
+    session = None
+    try:
+        with profile_job(directory, name) as session:
+            args.func(args)
+    finally:
+        if session and session.files:
+            print(f"Profile written: {', '.join(session.files)}", file=sys.stderr)
+
+def cmd_batch(args):
+    """Runs one command per line of a file in this process, so imports are paid only once."""
+    parser = build_parser()
+    failures = 0
+    with open(args.file, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+
+    for number, line in enumerate(lines, 1):
+        if not line or line.startswith('#'):
+            continue
+        print(f"[{number}] {line}")
+        try:
+            job = parser.parse_args(shlex.split(line))
+            if job.func is cmd_batch:
+                raise ValueError("Nested batch files are not supported")
+            run_command(job)
+        except (Exception, SystemExit) as e:
+            failures += 1
+            print(f"Error on line {number}: {e}", file=sys.stderr)
+            if not args.keep_going:
+                break
+
+    if failures:
+        raise RuntimeError(f"{failures} batch job(s) failed")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='video', description='Video editing tools')
+    parser.add_argument('--profile', action='store_true', dest='profile_job',
+                        help='Profile the job (cProfile, sampled stacks, tracemalloc, ffmpeg CPU time); '
+                             'files are written next to the output')
+    parser.add_argument('--profile-dir', help='Write the profile files to this folder instead (implies --profile)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    trim = commands.add_parser('trim', help='Cut a video between two timestamps')
+    trim.add_argument('input')
+    trim.add_argument('output')
+    trim.add_argument('--start', type=float, required=True, help='Start time in seconds')
+    trim.add_argument('--end', type=float, required=True, help='End time in seconds')
+    trim.add_argument('--no-index', action='store_true', help='Skip the seek-index fast path')
+    _add_stream_format(trim)
+    trim.set_defaults(func=cmd_trim)
+
+    stitch = commands.add_parser('stitch', help='Join videos one after another')
+    stitch.add_argument('output')
+    stitch.add_argument('inputs', nargs='+')
+    stitch.add_argument('--intro', help='Registered asset name or path played first')
+    stitch.add_argument('--outro', help='Registered asset name or path played last')
+    stitch.add_argument('--profile', default='1080p30', help='Output profile used with intro/outro')
+    stitch.add_argument('--qc', action='store_true', help='Run media QC on the result')
+    stitch.set_defaults(func=cmd_stitch)
+
+    text = commands.add_parser('text', help='Burn a text caption, or a cue list, into a video')
+    text.add_argument('input')
+    text.add_argument('output')
+    source = text.add_mutually_exclusive_group(required=True)
+    source.add_argument('--text', help='Caption shown for the whole video')
+    source.add_argument('--cues', help='SRT or JSON cue list')
+    text.add_argument('--font-size', type=int, default=70)
+    text.add_argument('--color', default='white')
+    text.add_argument('--position', default='center', help="e.g. center, top, right_top")
+    _add_stream_format(text)
+    text.set_defaults(func=cmd_text)
+
+    logo = commands.add_parser('logo', help='Overlay a logo image')
+    logo.add_argument('input')
+    logo.add_argument('output')
+    logo.add_argument('--logo', required=True, help='Logo image (PNG with transparency preferred)')
+    logo.add_argument('--position', default='top-left',
+                      choices=['top-left', 'top-right', 'bottom-left', 'bottom-right'])
+    logo.add_argument('--size', type=_size, help='Resize the logo to WIDTHxHEIGHT')
+    logo.add_argument('--padding', type=int, default=5)
+    logo.add_argument('--workers', type=int, help='Blend in this many processes')
+    logo.add_argument('--yuv', action='store_true', help='Blend directly on yuv420p frames')
+    _add_stream_format(logo)
+    logo.set_defaults(func=cmd_logo)
+
+    audio = commands.add_parser('audio', help='Mix a music track into a video')
+    audio.add_argument('video')
+    audio.add_argument('audio')
+    audio.add_argument('output')
+    audio.add_argument('--video-volume', type=float, default=0.0, help='Original audio volume (0-1)')
+    audio.add_argument('--music-volume', type=float, default=1.0, help='Music volume (0-1)')
+    audio.add_argument('--qc', action='store_true', help='Run media QC on the result')
+    _add_stream_format(audio)
+    audio.set_defaults(func=cmd_audio)
+
+    upscale = commands.add_parser('upscale', help='Upscale with the best backend for a deadline')
+    upscale.add_argument('input')
+    upscale.add_argument('output')
+    upscale.add_argument('--height', type=int, default=2160, help='Target height (default: 2160)')
+    upscale.add_argument('--quality', choices=['low', 'medium', 'high'], help='Best quality level to consider (default: high)')
+    upscale.add_argument('--deadline', type=float, help='Time budget in seconds')
+    upscale.add_argument('--backend', action='append', help='Only consider this backend (repeatable)')
+    upscale.add_argument('--target-size', help='Output size limit, e.g. 2GB (ffmpeg backend, planned from sample encodes)')
+    upscale.add_argument('--max-bitrate', help='Video bitrate ceiling, e.g. 40M (ffmpeg backend, capped CRF)')
+    _add_stream_format(upscale)
+    upscale.set_defaults(func=cmd_upscale)
+
+    scenes = commands.add_parser('scenes', help='Detect scene cuts and optionally split the video at them')
+    scenes.add_argument('input')
+    scenes.add_argument('--threshold', type=float, help='Cut threshold 0-1 (default: 0.35 hist, 0.15 luma)')
+    scenes.add_argument('--min-scene-len', type=float, default=1.0, help='Minimum scene length in seconds')
+    scenes.add_argument('--method', default='hist', choices=['hist', 'luma'])
+    scenes.add_argument('--width', type=int, default=64, help='Analysis width in pixels (default: 64)')
+    scenes.add_argument('--split', metavar='DIR', help='Also write each scene as a clip to this folder')
+    scenes.add_argument('--json', action='store_true', help='Print the cut list as JSON')
+    scenes.set_defaults(func=cmd_scenes)
+
+    timeline = commands.add_parser('timeline', help='Render a JSON timeline, re-encoding only changed clips')
+    timeline.add_argument('spec', help='Timeline JSON: {"profile": ..., "clips": [{"source", "trim", "ops"}]}')
+    timeline.add_argument('output')
+    timeline.add_argument('--profile', help='Output profile (default: from the spec, else 1080p30)')
+    timeline.set_defaults(func=cmd_timeline)
+
+    qc = commands.add_parser('qc', help='Check for black frames, freezes, silence and loudness in one decode')
+    qc.add_argument('input')
+    qc.add_argument('--report', help='Report path or s3:// URI (default: <input>.qc.json)')
+    qc.add_argument('--loudness-target', type=float, help='Integrated loudness target in LUFS, e.g. -16')
+    qc.add_argument('--min-black', type=float, help='Shortest black run reported, seconds (default: 0.5)')
+    qc.add_argument('--min-freeze', type=float, help='Shortest freeze reported, seconds (default: 2.0)')
+    qc.add_argument('--min-silence', type=float, help='Shortest silence reported, seconds (default: 2.0)')
+    qc.add_argument('--silence-db', type=float, help='Silence level in dBFS (default: -50)')
+    qc.set_defaults(func=cmd_qc)
+
+    batch = commands.add_parser('batch', help='Run commands listed one per line in a file')
+    batch.add_argument('file')
+    batch.add_argument('--keep-going', action='store_true', help='Continue after a failed line')
+    batch.set_defaults(func=cmd_batch)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        run_command(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import json
+import math
+import os
+import sys
+
+# Settings are read from (later wins): built-in defaults, a JSON config file, environment variables
+CONFIG_ENV = 'VIDEO_EDITOR_CONFIG'
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+
+ENV_VARS = {
+    'ffmpeg_path': 'VIDEO_FFMPEG',
+    'ffprobe_path': 'VIDEO_FFPROBE',
+    'imagemagick_path': 'VIDEO_IMAGEMAGICK',
+    'upload_folder': 'VIDEO_UPLOAD_FOLDER',
+    'processed_folder': 'VIDEO_PROCESSED_FOLDER',
+    'upload_quota': 'VIDEO_UPLOAD_QUOTA',
+    'processed_quota': 'VIDEO_PROCESSED_QUOTA',
+    'cold_folder': 'VIDEO_COLD_FOLDER',
+    'inactive_after': 'VIDEO_INACTIVE_AFTER',
+    'results_url': 'VIDEO_RESULTS_URL',
+    's3_endpoint_url': 'VIDEO_S3_ENDPOINT_URL',
+}
+
+def _binary(windows_path, name):
+    """The usual Windows install location if it exists, otherwise the bare name (looked up on PATH)."""
+    return windows_path if os.path.exists(windows_path) else name
+
+def _defaults():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return {
+        'ffmpeg_path': _binary(r"C:\ffmpeg\bin\ffmpeg.exe", 'ffmpeg'),
+        'ffprobe_path': _binary(r"C:\ffmpeg\bin\ffprobe.exe", 'ffprobe'),
+        'imagemagick_path': _binary(r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe", 'magick'),
+        'upload_folder': os.path.join(base_dir, 'uploads'),
+        'processed_folder': os.path.join(base_dir, 'processed'),
+        'upload_quota': 20 * 1024 ** 3,  # Bytes kept in the fast tier
+        'processed_quota': 50 * 1024 ** 3,
+        'cold_folder': '',  # Empty: evicted files are deleted instead of moved
+        'inactive_after': 24 * 3600,  # Seconds without access before moving to the cold tier
+        'results_url': '',  # Also publish results here, e.g. s3://media/processed (empty: local only)
+        's3_endpoint_url': '',  # S3-compatible endpoint, e.g. http://127.0.0.1:9000 for MinIO (empty: AWS)
+    }
+
+_config = None
+_imagemagick_configured = False
+
+def load_config(config_path=None):
+    """
+    Build the settings dict without touching any other module
+
+    Args:
+        config_path (str): JSON file with any of the keys in ENV_VARS
+                           (default: $VIDEO_EDITOR_CONFIG, else config.json next to this file if present)
+    """
+    config = _defaults()
+
+    config_path = config_path or os.environ.get(CONFIG_ENV) or DEFAULT_CONFIG_PATH
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            values = json.load(f)
+        unknown = set(values) - set(config)
+        if unknown:
+            # stderr: stdout may be carrying a piped video
+            print(f"Warning: Unknown config keys ignored: {', '.join(sorted(unknown))}", file=sys.stderr)
+        config.update({key: value for key, value in values.items() if key in config})
+
+    for key, env_var in ENV_VARS.items():
+        if os.environ.get(env_var):
+            config[key] = _env_value(env_var, config[key])
+    return config
+
+def _env_value(env_var, default):
+    """Parses an environment override; numeric settings keep their type and accept e.g. 2e10 or 3600.5."""
+    value = os.environ[env_var]
+    if not isinstance(default, (int, float)):
+        return value
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is None or not math.isfinite(number):
+        raise ValueError(f"{env_var} must be a number, got '{value}'")
+    return int(number) if isinstance(default, int) else number
+
+def get(key):
+    """Returns one setting, loading the configuration on first use."""
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config[key]
+
+def configure_imagemagick():
+    """Points MoviePy at ImageMagick; called right before TextClip is used instead of at import time."""
+    global _imagemagick_configured
+    if _imagemagick_configured:
+        return
+    from moviepy.config import change_settings
+    change_settings({"IMAGEMAGICK_BINARY": get('imagemagick_path')})
+    _imagemagick_configured = True
@@ -0,0 +1,297 @@
+import math
+import os
+import re
+import tempfile
+import time
+
+from ffmpeg_runner import probe_video_cached, run_ffmpeg
+from seek_index import count_frames
+
+# x264 presets from best compression to fastest; plans never go slower than the starting one
+PRESETS = ('veryslow', 'slower', 'slow', 'medium', 'fast', 'faster', 'veryfast', 'superfast', 'ultrafast')
+
+TWO_PASS_FACTOR = 1.6   # Two-pass time relative to one pass (the first pass decodes and filters again)
+SIZE_MARGIN = 0.97      # Aim below a target size for container overhead and rate-control error
+DEADLINE_MARGIN = 0.9   # Share of the remaining deadline a projected encode may use
+CRF_DOUBLING = 6        # x264 bitrate roughly halves for every +6 CRF
+
+_UNITS = {'': 1, 'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3}
+
+def parse_size(value):
+    """'700MB', '1.5G', '2000k' or a plain number of bytes -> bytes (decimal units)."""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([kmg]?)i?b?\s*', str(value).lower())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+def parse_bitrate(value):
+    """'8M', '2500k' or a plain number of bits per second -> bits per second."""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([kmg]?)(?:bps|b)?\s*', str(value).lower())
+    if not match:
+        raise ValueError(f"Invalid bitrate: {value}")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+def sample_starts(duration, sample_count, sample_seconds):
+    """Evenly spread window starts, or [None] (one window from the start) when the file is barely longer than the sample."""
+    if duration <= sample_count * sample_seconds * 1.5:
+        return [None]
+    return [duration * (i + 1) / (sample_count + 1) - sample_seconds / 2 for i in range(sample_count)]
+
+def encode_sample(input_path, preset, crf, video_filter=None, starts=(None,), sample_seconds=2.0, threads=0):
+    """
+    Encode sample windows of the input with one preset and CRF, the way the job will
+
+    The windows are read with input seeking, joined and passed through the job's video
+    filter, so decode, filter and encode cost are all in the timing.
+
+    Returns:
+        dict: 'preset', 'crf', 'frames', 'seconds_per_frame' and 'bitrate' (bits per second)
+    """
+    info = probe_video_cached(input_path)
+    args = []
+    for start in starts:
+        if start is None:
+            args += ['-t', f'{sample_seconds:.3f}', '-i', input_path]
+        else:
+            args += ['-ss', f'{start:.3f}', '-t', f'{sample_seconds:.3f}', '-i', input_path]
+    chain = ''.join(f'[{i}:v:0]' for i in range(len(starts))) + f'concat=n={len(starts)}:v=1:a=0'
+    if video_filter:
+        chain += f',{video_filter}'
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    try:
+        began = time.perf_counter()
+        progress = run_ffmpeg(args + [
+            '-filter_complex', f'{chain}[v]',
+            '-map', '[v]',
+            '-c:v', 'libx264',
+            '-preset', preset,
+            '-crf', str(crf),
+            '-threads', str(threads),
+            '-an',
+            '-y',
+            tmp_path
+        ])
+        elapsed = time.perf_counter() - began
+        frames = int(progress.get('frame', 0)) or int(len(starts) * sample_seconds * info['fps'])
+        seconds = frames / info['fps'] if info['fps'] else len(starts) * sample_seconds
+        return {
+            'preset': preset,
+            'crf': crf,
+            'frames': frames,
+            'seconds_per_frame': elapsed / max(frames, 1),
+            'bitrate': int(os.path.getsize(tmp_path) * 8 / max(seconds, 1e-3)),
+        }
+    finally:
+        os.remove(tmp_path)
+
+def plan_encode(input_path, target_size=None, max_bitrate=None, deadline=None, video_filter=None,
+                preset='slow', crf=18, audio_bitrate=192000, threads=0, sample_count=3, sample_seconds=2.0,
+                output_duration=None):
+    """
+    Choose the x264 preset and rate control for a job from short sample encodes
+
+    Samples of the actual content are encoded with the preferred preset first, then
+    faster ones, at the quality CRF. Each sample gives the real encode speed (with the
+    job's decode and filter) and the bitrate that CRF needs for this content, which
+    decide the plan:
+
+    - no size or bitrate limit: plain CRF;
+    - the CRF bitrate fits the budget: CRF (capped at max_bitrate when one is given);
+    - it doesn't: two-pass at the budget for a target size when the deadline allows
+      the second pass, otherwise capped CRF with the CRF raised to about the budget.
+
+    With a deadline the slowest preset whose projected time fits is used (the fastest
+    tried when none fits); planning time counts against the deadline.
+
+    Args:
+        input_path (str): Path to the input video file
+        target_size (int/str): Output size limit, bytes or e.g. '700MB'
+        max_bitrate (int/str): Video bitrate ceiling, bits/s or e.g. '8M'
+        deadline (float): Wall-clock budget in seconds for the encode, None for no limit
+        video_filter (str): The job's -vf chain (e.g. the upscale), applied to the samples too
+        preset (str): Preferred (slowest) x264 preset (default: 'slow')
+        crf (int): Quality CRF, never lowered by the plan (default: 18)
+        audio_bitrate (int): Audio bits/s counted against target_size (default: 192000)
+        threads (int): Encoder threads, 0 for automatic (default: 0)
+        sample_count (int): Sample windows spread over the input (default: 3)
+        sample_seconds (float): Length of each window (default: 2.0)
+        output_duration (float): Length of the output in seconds when it isn't the input's,
+                                 e.g. a trim (default: the input duration)
+
+    Returns:
+        dict: 'preset', 'rate_control' ('crf', 'capped_crf' or 'two_pass'), 'crf', 'bitrate',
+              'maxrate', 'bufsize', 'passes', 'estimated_seconds', 'estimated_bytes' and the
+              'samples' that were encoded
+    """
+    started = time.perf_counter()
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown x264 preset: {preset}")
+    info = probe_video_cached(input_path)
+    duration = info['duration']
+    if duration <= 0:
+        raise ValueError(f"Unknown duration of: {input_path}")
+    if output_duration:
+        # Samples still come from the whole input; size and time follow the output
+        duration = output_duration
+        frame_count = int(duration * info['fps'])
+    else:
+        frame_count = count_frames(input_path, fallback=int(duration * info['fps']))
+
+    max_bitrate = parse_bitrate(max_bitrate) if max_bitrate else None
+    budget = None  # Video bits per second
+    if target_size:
+        budget = parse_size(target_size) * 8 * SIZE_MARGIN / duration - audio_bitrate
+        if budget <= 0:
+            raise ValueError(f"Target size {target_size} is too small for the audio alone")
+    if max_bitrate:
+        budget = min(budget, max_bitrate) if budget else max_bitrate
+
+    plan = {'preset': preset, 'rate_control': 'crf', 'crf': crf, 'bitrate': None, 'maxrate': None, 'bufsize': None,
+            'passes': 1, 'estimated_seconds': None, 'estimated_bytes': None, 'samples': []}
+    if budget is None and deadline is None:
+        return plan  # Nothing to fit: no need to sample
+
+    starts = sample_starts(info['duration'], sample_count, sample_seconds)
+    if starts == [None]:
+        sample_seconds = min(info['duration'], sample_count * sample_seconds)
+    fallback = None
+    for candidate in PRESETS[PRESETS.index(preset):]:
+        sample = encode_sample(input_path, candidate, crf, video_filter, starts, sample_seconds, threads)
+        plan['samples'].append(sample)
+        one_pass = sample['seconds_per_frame'] * frame_count
+        remaining = None if deadline is None else (deadline - (time.perf_counter() - started)) * DEADLINE_MARGIN
+        print(f"Encode sample {candidate}: {sample['bitrate'] / 1e6:.2f} Mb/s at CRF {crf}, ~{one_pass:.0f}s"
+              + (f" (remaining budget {remaining:.0f}s)" if remaining is not None else ""))
+
+        choice = None
+        if budget is None or sample['bitrate'] <= budget:
+            # The quality CRF already fits; the cap only guards against peaks
+            choice = {'rate_control': 'capped_crf' if max_bitrate else 'crf', 'crf': crf,
+                      'seconds': one_pass, 'video_bitrate': sample['bitrate']}
+        else:
+            if target_size and (remaining is None or one_pass * TWO_PASS_FACTOR <= remaining):
+                choice = {'rate_control': 'two_pass', 'crf': None,
+                          'seconds': one_pass * TWO_PASS_FACTOR, 'video_bitrate': budget}
+            else:
+                raised = crf + math.ceil(CRF_DOUBLING * math.log2(sample['bitrate'] / budget))
+                choice = {'rate_control': 'capped_crf', 'crf': min(raised, 51),
+                          'seconds': one_pass, 'video_bitrate': budget}
+
+        if fallback is None or choice['seconds'] < fallback[1]['seconds']:
+            fallback = (candidate, choice)
+        if remaining is None or choice['seconds'] <= remaining:
+            break
+    else:
+        print("Warning: No preset meets the deadline, using the fastest one tried")
+        candidate, choice = fallback
+
+    plan.update({
+        'preset': candidate,
+        'rate_control': choice['rate_control'],
+        'crf': choice['crf'],
+        'passes': 2 if choice['rate_control'] == 'two_pass' else 1,
+        'estimated_seconds': round(choice['seconds'], 1),
+        'estimated_bytes': int((choice['video_bitrate'] + audio_bitrate) * duration / 8),
+    })
+    if choice['rate_control'] == 'two_pass':
+        plan['bitrate'] = int(budget)
+    if choice['rate_control'] == 'capped_crf' or max_bitrate:
+        cap = max_bitrate or budget
+        plan['maxrate'], plan['bufsize'] = int(cap), int(2 * cap)
+    print(f"Encode plan: {plan['preset']}, {plan['rate_control']}"
+          + (f" CRF {plan['crf']}" if plan['crf'] is not None else f" {plan['bitrate'] / 1e6:.2f} Mb/s")
+          + (f", max {plan['maxrate'] / 1e6:.2f} Mb/s" if plan['maxrate'] else ""))
+    return plan
+
+def resolve_plan(encode_plan, input_path, **options):
+    """
+    A plan from plan_encode as it is, or plan constraints ({'target_size': '700MB', 'deadline': 600, ...})
+    planned on input_path with the extra plan_encode options (video_filter, threads, output_duration,
+    and the writer's own preset and crf as the starting point)
+    """
+    if 'rate_control' in encode_plan:
+        return encode_plan
+    return plan_encode(input_path, **dict(options, **encode_plan))
+
+def encoder_passes(plan, passlogfile=None):
+    """
+    libx264 arguments for each pass of a plan: one list, or two for two-pass
+
+    Args:
+        plan (dict): From plan_encode
+        passlogfile (str): Pass log prefix, required for two-pass (use a temporary folder)
+    """
+    args = ['-c:v', 'libx264', '-preset', plan['preset']]
+    if plan['rate_control'] == 'two_pass':
+        if not passlogfile:
+            raise ValueError("Two-pass encodes need a passlogfile")
+        args += ['-b:v', str(plan['bitrate'])]
+    else:
+        args += ['-crf', str(plan['crf'])]
+    if plan['maxrate']:
+        args += ['-maxrate', str(plan['maxrate']), '-bufsize', str(plan['bufsize'])]
+    if plan['rate_control'] != 'two_pass':
+        return [args]
+    return [args + ['-pass', str(number), '-passlogfile', passlogfile] for number in (1, 2)]
+
+def writer_settings(write_kwargs):
+    """
+    Preset and CRF a MoviePy write_videofile call uses, as the starting point for plan_encode
+
+    Args:
+        write_kwargs (dict): write_videofile arguments; without their own preset or -crf
+                             MoviePy's 'medium' and x264's CRF 23 apply
+
+    Returns:
+        dict: 'preset' and 'crf'
+    """
+    params = list(write_kwargs.get('ffmpeg_params', []))
+    crf = int(params[params.index('-crf') + 1]) if '-crf' in params else 23
+    return {'preset': write_kwargs.get('preset', 'medium'), 'crf': crf}
+
+def moviepy_write_kwargs(plan, base=None):
+    """
+    Keyword arguments for MoviePy's write_videofile that follow a single-pass plan
+
+    MoviePy writes in one pass, so a two-pass plan is written as capped CRF at its bitrate.
+
+    Args:
+        plan (dict): From plan_encode
+        base (dict): write_videofile arguments to keep (e.g. profile_write_kwargs); their own
+                     rate control (-crf/-maxrate/-bufsize, preset, bitrate) is replaced
+    """
+    kwargs = dict(base or {})
+    kept, params = [], list(kwargs.get('ffmpeg_params', []))
+    while params:
+        name = params.pop(0)
+        if name in ('-crf', '-maxrate', '-bufsize'):
+            params.pop(0)
+        else:
+            kept.append(name)
+    kwargs.pop('bitrate', None)
+
+    if plan['rate_control'] == 'two_pass':
+        cap = plan['maxrate'] or plan['bitrate']
+        kwargs['bitrate'] = str(plan['bitrate'])
+        rate = ['-maxrate', str(cap), '-bufsize', str(2 * cap)]
+    else:
+        rate = ['-crf', str(plan['crf'])]
+        if plan['maxrate']:
+            rate += ['-maxrate', str(plan['maxrate']), '-bufsize', str(plan['bufsize'])]
+    kwargs.update({'codec': 'libx264', 'preset': plan['preset'], 'ffmpeg_params': rate + kept})
+    return kwargs
+
+if __name__ == "__main__":
+    # Example usage: a 4K upscale that must fit in 2 GB and finish within 30 minutes
+    input_video = r"C:\data\hero\concat-all-text.mp4"
+
+    plan = plan_encode(
+        input_video,
+        target_size='2GB',
+        deadline=1800,
+        video_filter='scale=3840:2160:flags=lanczos,unsharp=5:5:1.5:5:5:0.0'
+    )
+    print(plan)
+    print(encoder_passes(plan, passlogfile=r"C:\data\hero\upscale-2pass"))
@@ -0,0 +1,513 @@
+import asyncio
+import collections
+import contextvars
+import json
+import os
+import re
+import subprocess
+import threading
+from tqdm import tqdm
+
+import config
+
+FFMPEG_PATH = config.get('ffmpeg_path')
+FFPROBE_PATH = config.get('ffprobe_path')
+
+# Set by profiling.profile_job: ffmpeg processes started in that context run with
+# '-benchmark' and append their own CPU time and peak memory to this list
+CHILD_STATS = contextvars.ContextVar('ffmpeg_child_stats', default=None)
+_BENCH_TIMES = re.compile(r'bench: utime=([\d.]+)s stime=([\d.]+)s rtime=([\d.]+)s')
+_BENCH_RSS = re.compile(r'bench: maxrss=(\d+)')
+
+def _record_bench(stats, args, log):
+    """Adds the '-benchmark' summary of a finished ffmpeg process to a CHILD_STATS list."""
+    times = _BENCH_TIMES.search(log)
+    rss = _BENCH_RSS.search(log)
+    command = ' '.join(str(arg) for arg in args)
+    stats.append({
+        'command': command if len(command) <= 300 else command[:297] + '...',
+        'utime': float(times.group(1)) if times else None,
+        'stime': float(times.group(2)) if times else None,
+        'rtime': float(times.group(3)) if times else None,
+        'maxrss_kb': int(rss.group(1)) if rss else None,
+    })
+
+class FFmpegError(Exception):
+    """Raised when an ffmpeg/ffprobe process fails or times out; carries the end of its log."""
+
+    def __init__(self, message, returncode=None, log=''):
+        super().__init__(f"{message}\n{log}" if log else message)
+        self.returncode = returncode
+        self.log = log
+
+class LogBuffer:
+    """Keeps only the last max_bytes of a process log so chatty encodes can't eat memory."""
+
+    def __init__(self, max_bytes=64 * 1024):
+        self.max_bytes = max_bytes
+        self.lines = collections.deque()
+        self.size = 0
+
+    def append(self, line):
+        self.lines.append(line)
+        self.size += len(line)
+        while self.size > self.max_bytes and len(self.lines) > 1:
+            self.size -= len(self.lines.popleft())
+
+    def text(self):
+        return ''.join(self.lines)
+
+class FFmpegRunner:
+    """
+    Runs ffmpeg and ffprobe processes on one shared asyncio event loop
+
+    Progress comes from ffmpeg's machine-readable '-progress' output on stdout,
+    stderr is streamed into a capped LogBuffer, and semaphores limit how many
+    encodes and probes run at once. The loop lives in a background thread, so
+    plain scripts, Flask worker threads and coroutines on other loops all share
+    the same limits. The encode limit is a thread semaphore, so FFmpegPipe
+    processes count against it as well.
+    """
+
+    def __init__(self, max_concurrent=4, max_concurrent_probes=16, timeout=None, log_bytes=64 * 1024):
+        """
+        Args:
+            max_concurrent (int): Maximum number of ffmpeg processes running at once (default: 4)
+            max_concurrent_probes (int): Maximum number of ffprobe processes running at once (default: 16)
+            timeout (float): Default timeout in seconds per process, None for no limit
+            log_bytes (int): How much of each process's stderr to keep (default: 64 KiB)
+        """
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_probes = max_concurrent_probes
+        # Shared by run() and FFmpegPipe, which start processes from any thread
+        self.encode_slots = threading.BoundedSemaphore(max_concurrent)
+        self.timeout = timeout
+        self.log_bytes = log_bytes
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        """Starts the background event loop on first use."""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='ffmpeg-runner', daemon=True)
+                thread.start()
+                # Semaphores must be created on the loop that uses them (Python 3.9)
+                asyncio.run_coroutine_threadsafe(self._create_slots(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _create_slots(self):
+        self._probe_slots = asyncio.Semaphore(self.max_concurrent_probes)
+
+    async def _acquire_encode_slot(self):
+        """Waits for a slot of the encode limit without blocking the loop."""
+        if self.encode_slots.acquire(blocking=False):
+            return
+        waiter = asyncio.get_running_loop().run_in_executor(None, self.encode_slots.acquire)
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # The blocking acquire can't be interrupted; give the slot back once it is granted
+            waiter.add_done_callback(lambda _: self.encode_slots.release())
+            raise
+
+    async def _on_loop(self, coro):
+        """Awaits a coroutine on the runner loop, from whatever loop the caller is on."""
+        loop = self._get_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _sync(self, coro):
+        """Runs a coroutine on the runner loop and blocks until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    async def _read_progress(self, stream, on_progress):
+        """Parses key=value blocks from '-progress pipe:1'; each block ends with a 'progress=' line."""
+        block = {}
+        while True:
+            line = await stream.readline()
+            if not line:
+                return block
+            key, _, value = line.decode('utf-8', 'replace').strip().partition('=')
+            block[key] = value
+            if key == 'progress':
+                if on_progress:
+                    on_progress(dict(block))
+                if value == 'end':
+                    return block
+
+    async def _read_log(self, stream, log):
+        while True:
+            line = await stream.readline()
+            if not line:
+                return
+            log.append(line.decode('utf-8', 'replace'))
+
+    async def _run(self, args, on_progress, timeout, stats=None, take_slot=True):
+        cmd = [FFMPEG_PATH, '-hide_banner', '-nostats', '-progress', 'pipe:1']
+        cmd += (['-benchmark'] if stats is not None else []) + list(args)
+        log = LogBuffer(self.log_bytes)
+
+        if take_slot:
+            await self._acquire_encode_slot()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            # Both pipes are always drained, so the process can never block on a full pipe
+            readers = asyncio.gather(
+                self._read_progress(process.stdout, on_progress),
+                self._read_log(process.stderr, log),
+                process.wait()
+            )
+            try:
+                progress, _, returncode = await asyncio.wait_for(readers, timeout or self.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise FFmpegError(f"ffmpeg timed out after {timeout or self.timeout}s", None, log.text())
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+        finally:
+            if take_slot:
+                self.encode_slots.release()
+
+        if stats is not None:
+            _record_bench(stats, args, log.text())
+        if returncode != 0:
+            raise FFmpegError(f"ffmpeg exited with code {returncode}", returncode, log.text())
+        return progress
+
+    async def _ffprobe(self, args, timeout):
+        cmd = [FFPROBE_PATH, '-v', 'error'] + list(args)
+        async with self._probe_slots:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise FFmpegError(f"ffprobe timed out after {timeout or self.timeout}s")
+
+        if process.returncode != 0:
+            log = stderr.decode('utf-8', 'replace')[-self.log_bytes:]
+            raise FFmpegError(f"ffprobe exited with code {process.returncode}", process.returncode, log)
+        return stdout
+
+    async def run(self, args, on_progress=None, timeout=None):
+        """
+        Run ffmpeg with the given arguments (everything after the binary name)
+
+        Args:
+            args (list): ffmpeg arguments, e.g. ['-i', 'in.mp4', '-c:v', 'libx264', 'out.mp4']
+            on_progress (callable): Called with each progress dict ('frame', 'out_time_us', 'speed', ...)
+            timeout (float): Timeout in seconds (default: the runner's timeout)
+
+        Returns:
+            dict: The final progress block
+        """
+        return await self._on_loop(self._run(args, on_progress, timeout, CHILD_STATS.get()))
+
+    async def ffprobe(self, args, timeout=None):
+        """Run ffprobe with the given arguments and return its raw stdout."""
+        return await self._on_loop(self._ffprobe(args, timeout))
+
+    async def probe(self, input_path, timeout=None):
+        """
+        Probe a media file's streams and container in one ffprobe call
+
+        Returns:
+            dict: ffprobe JSON with 'streams' and 'format'
+        """
+        stdout = await self.ffprobe([
+            '-show_entries', 'stream=index,codec_type,codec_name,width,height,r_frame_rate,'
+                             'sample_rate,channels:format=duration,size,bit_rate',
+            '-of', 'json',
+            input_path
+        ], timeout)
+        return json.loads(stdout.decode('utf-8'))
+
+    async def probe_many(self, input_paths, timeout=None):
+        """Probe several files concurrently; returns results in the same order."""
+        return await asyncio.gather(*(self.probe(path, timeout) for path in input_paths))
+
+    async def run_many(self, args_list, timeout=None):
+        """Run several ffmpeg commands concurrently (within the encode limit); returns their final progress."""
+        return await asyncio.gather(*(self.run(args, timeout=timeout) for args in args_list))
+
+    def run_sync(self, args, on_progress=None, timeout=None):
+        """Blocking version of run()."""
+        # A thread with pipes open already holds the slot of its job (see FFmpegPipe)
+        take_slot = not _holds_pipe_slot()
+        return self._sync(self._run(args, on_progress, timeout, CHILD_STATS.get(), take_slot))
+
+    def ffprobe_sync(self, args, timeout=None):
+        """Blocking version of ffprobe()."""
+        return self._sync(self._ffprobe(args, timeout))
+
+    def probe_sync(self, input_path, timeout=None):
+        """Blocking version of probe()."""
+        return self._sync(self.probe(input_path, timeout))
+
+    def probe_many_sync(self, input_paths, timeout=None):
+        """Blocking version of probe_many()."""
+        return self._sync(self.probe_many(input_paths, timeout))
+
+    def run_many_sync(self, args_list, timeout=None):
+        """Blocking version of run_many()."""
+        return self._sync(self.run_many(args_list, timeout))
+
+# Shared by every tool in this folder so limits apply process-wide
+RUNNER = FFmpegRunner()
+
+def _parse_rate(rate):
+    """Converts an ffprobe rate like '30000/1001' to a float."""
+    num, _, den = (rate or '0').partition('/')
+    return float(num) / float(den) if den and float(den) else float(num)
+
+def summarize_probe(probe):
+    """
+    Flatten ffprobe JSON into the fields the tools use
+
+    Returns:
+        dict: width, height, fps, duration, has_audio, audio_sample_rate, audio_channels
+    """
+    video = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'audio'), None)
+    duration = probe.get('format', {}).get('duration')
+    return {
+        'width': int(video.get('width', 0)),
+        'height': int(video.get('height', 0)),
+        'fps': _parse_rate(video.get('r_frame_rate')),
+        'duration': float(duration) if duration not in (None, 'N/A') else 0.0,
+        'has_audio': audio is not None,
+        'audio_sample_rate': int(audio['sample_rate']) if audio and audio.get('sample_rate') else None,
+        'audio_channels': audio.get('channels') if audio else None,
+    }
+
+def probe_video(input_path, timeout=None):
+    """Blocking probe of one file, summarized (see summarize_probe)."""
+    return summarize_probe(RUNNER.probe_sync(input_path, timeout))
+
+# (path, size, mtime) -> summarized probe, so repeated requests on the same upload skip ffprobe
+_probe_memo = {}
+
+def probe_video_cached(input_path, timeout=None):
+    """probe_video() memoized per process for local files that haven't changed."""
+    try:
+        stat = os.stat(input_path)
+    except OSError:
+        return probe_video(input_path, timeout)  # URL or missing file: nothing to key on
+
+    memo_key = (os.path.abspath(input_path), stat.st_size, stat.st_mtime)
+    if memo_key not in _probe_memo:
+        _probe_memo[memo_key] = probe_video(input_path, timeout)
+    return dict(_probe_memo[memo_key])
+
+def probe_videos(input_paths, timeout=None):
+    """Blocking concurrent probe of several files, summarized (see summarize_probe)."""
+    return [summarize_probe(probe) for probe in RUNNER.probe_many_sync(input_paths, timeout)]
+
+def run_ffmpeg(args, total_frames=None, desc=None, timeout=None):
+    """
+    Run ffmpeg on the shared runner and block until it finishes
+
+    Args:
+        args (list): ffmpeg arguments after the binary name
+        total_frames (int): Show a tqdm progress bar with this total (default: no bar)
+        desc (str): Progress bar label
+        timeout (float): Timeout in seconds (default: the runner's timeout)
+    """
+    if not total_frames:
+        return RUNNER.run_sync(args, timeout=timeout)
+
+    pbar = tqdm(total=total_frames, desc=desc)
+
+    def on_progress(progress):
+        try:
+            pbar.update(int(progress.get('frame', 0)) - pbar.n)
+        except ValueError:
+            pass
+
+    try:
+        return RUNNER.run_sync(args, on_progress=on_progress, timeout=timeout)
+    finally:
+        pbar.close()
+
+class _PipeSlot:
+    """One slot of RUNNER.encode_slots, shared by the pipes a thread has open at the same time."""
+
+    def __init__(self):
+        self.users = 1
+        self.lock = threading.Lock()
+
+# The pipes one thread has open (e.g. a decoder feeding an encoder) belong to one job and
+# share its slot; taking one slot per pipe could deadlock jobs that each hold one
+_pipe_slots = threading.local()
+
+def _take_pipe_slot():
+    slot = getattr(_pipe_slots, 'slot', None)
+    if slot is not None:
+        with slot.lock:
+            if slot.users:
+                slot.users += 1
+                return slot
+    RUNNER.encode_slots.acquire()
+    slot = _pipe_slots.slot = _PipeSlot()
+    return slot
+
+def _drop_pipe_slot(slot):
+    with slot.lock:
+        slot.users -= 1
+        last = slot.users == 0
+    if last:
+        RUNNER.encode_slots.release()
+
+def _holds_pipe_slot():
+    slot = getattr(_pipe_slots, 'slot', None)
+    return slot is not None and slot.users > 0
+
+class FFmpegPipe:
+    """
+    ffmpeg process that exchanges raw data (e.g. rawvideo frames) over stdin/stdout
+
+    stderr is drained by a background thread into a capped LogBuffer so the
+    process never stalls on it, and close() raises FFmpegError on failure. The
+    process holds a slot of the runner's encode limit from start until close().
+    """
+
+    def __init__(self, args, stdin=None, stdout=None, log_bytes=64 * 1024, pass_fds=()):
+        """
+        Args:
+            args (list): ffmpeg arguments after the binary name (use 'pipe:0'/'pipe:1' for the pipes)
+            stdin: 'pipe' to write to the process, a file object to pass through, or None
+            stdout: 'pipe' to read from the process, a file object to pass through, or None
+            log_bytes (int): How much of stderr to keep (default: 64 KiB)
+            pass_fds (tuple): Extra file descriptors ffmpeg inherits, e.g. the write end of an
+                              os.pipe() used as a second output 'pipe:N' (POSIX only)
+        """
+        def stream(value):
+            if value == 'pipe':
+                return subprocess.PIPE
+            return subprocess.DEVNULL if value is None else value
+
+        self.args = args
+        self.stats = CHILD_STATS.get()
+        self.log = LogBuffer(log_bytes)
+        self._slot = _take_pipe_slot()
+        try:
+            self.process = subprocess.Popen(
+                [FFMPEG_PATH, '-hide_banner', '-nostats'] + (['-benchmark'] if self.stats is not None else []) +
+                list(args),
+                stdin=stream(stdin),
+                stdout=stream(stdout),
+                stderr=subprocess.PIPE,
+                pass_fds=pass_fds
+            )
+        except BaseException:
+            self._release_slot()
+            raise
+        self._log_thread = threading.Thread(target=self._drain_log, daemon=True)
+        self._log_thread.start()
+
+    def _drain_log(self):
+        for line in iter(self.process.stderr.readline, b''):
+            self.log.append(line.decode('utf-8', 'replace'))
+
+    def readinto(self, buffer):
+        """Fills a bytearray/memoryview completely; returns False at end of stream."""
+        view = memoryview(buffer)
+        filled = 0
+        while filled < len(view):
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def write(self, data):
+        self.process.stdin.write(data)
+
+    def close(self, kill=False):
+        """Closes the pipes and waits for ffmpeg; raises FFmpegError if it failed."""
+        if kill:
+            self.process.kill()
+        for pipe in (self.process.stdin, self.process.stdout):
+            if pipe:
+                try:
+                    pipe.close()
+                except (BrokenPipeError, OSError):
+                    pass
+        try:
+            returncode = self.process.wait()
+        finally:
+            self._release_slot()
+        self._log_thread.join()
+        if self.stats is not None:
+            _record_bench(self.stats, self.args, self.log.text())
+        if returncode != 0 and not kill:
+            raise FFmpegError(f"ffmpeg exited with code {returncode}", returncode, self.log.text())
+
+    def _release_slot(self):
+        """Frees the encode slot once, however often close() is called."""
+        slot, self._slot = self._slot, None
+        if slot is not None:
+            _drop_pipe_slot(slot)
+
+def concat_segments(segment_paths, output_path):
+    """
+    Join video segments that share the same codec settings without re-encoding
+
+    Args:
+        segment_paths (list): Segment files in playback order
+        output_path (str): Path where the joined video will be saved
+    """
+    list_path = output_path + '.concat.txt'
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            # The concat demuxer wants forward slashes and escaped quotes
+            escaped = os.path.abspath(path).replace('\\', '/').replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    try:
+        run_ffmpeg([
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_path,
+            '-c', 'copy',
+            '-movflags', '+faststart',
+            '-y',
+            output_path
+        ])
+    finally:
+        os.remove(list_path)
+
+if __name__ == "__main__":
+    # Example usage: probe several files concurrently, then run a few encodes at once
+    inputs = [
+        r"C:\data\hero\trim-s1.mp4",
+        r"C:\data\hero\trim-s3.mp4",
+        r"C:\data\hero\trim-s4.mp4",
+    ]
+    for path, info in zip(inputs, probe_videos(inputs)):
+        print(f"{path}: {info['width']}x{info['height']} @ {info['fps']:.2f}fps, {info['duration']:.2f}s")
+
+    async def encode_all():
+        jobs = [RUNNER.run(['-i', path, '-vf', 'scale=-2:720', '-c:v', 'libx264', '-y', path[:-4] + '-720p.mp4'])
+                for path in inputs]
+        await asyncio.gather(*jobs)
+
+    asyncio.run(encode_all())
@@ -0,0 +1,210 @@
+import multiprocessing
+import os
+import queue
+import traceback
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from seek_index import count_frames
+
+def _attach(name, shape):
+    """Attaches to a shared memory block and returns (block, uint8 array of the given shape)."""
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+
+def _decoder_process(input_path, in_name, in_shape, free_slots, work_queue, done_queue, workers):
+    """Decodes frames straight into free input slots and hands (sequence, slot) to the workers."""
+    block, inputs = _attach(in_name, in_shape)
+    try:
+        video = cv2.VideoCapture(input_path)
+        if not video.isOpened():
+            raise IOError(f"Cannot open video file: {input_path}")
+
+        sequence = 0
+        while True:
+            slot = free_slots.get()
+            ret, frame = video.read(inputs[slot])
+            if not ret:
+                break
+            # OpenCV decodes in place when the buffer matches, otherwise copy it in
+            if frame.ctypes.data != inputs[slot].ctypes.data:
+                np.copyto(inputs[slot], frame)
+            work_queue.put((sequence, slot))
+            sequence += 1
+
+        video.release()
+        done_queue.put(('eof', sequence))
+    except Exception:
+        done_queue.put(('error', traceback.format_exc()))
+    finally:
+        for _ in range(workers):
+            work_queue.put(None)
+        # Views must be dropped before the block can be closed
+        inputs = frame = None
+        block.close()
+
+def _transform_process(in_name, in_shape, out_name, out_shape, work_queue, done_queue, transform, make_transform):
+    """Applies the transform to input slots, writing the result into the matching output slot."""
+    in_block, inputs = _attach(in_name, in_shape)
+    out_block, outputs = _attach(out_name, out_shape)
+    try:
+        # Heavy models (e.g. ESRGAN) are built once per worker instead of being pickled
+        if make_transform is not None:
+            transform = make_transform()
+
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            sequence, slot = item
+            np.copyto(outputs[slot], transform(inputs[slot]))
+            done_queue.put((sequence, slot))
+    except Exception:
+        done_queue.put(('error', traceback.format_exc()))
+    finally:
+        inputs = outputs = None
+        in_block.close()
+        out_block.close()
+
+def parallel_transform(input_path, output_path, new_size, transform=None, make_transform=None,
+                       workers=None, slots=None, fourcc='mp4v', desc='Processing video'):
+    """
+    Run a per-frame transform over a video on every core using a shared-memory frame ring
+
+    A decoder process fills a fixed ring of input frame slots, N worker processes write
+    the transformed frames into the matching output slots and this process encodes
+    them in order. Frames never get pickled: only slot indices cross process
+    boundaries, and a slot is handed back to the decoder once its frame is written.
+
+    Workers are started with 'spawn', so transform/make_transform must be picklable
+    (top-level functions or functools.partial of them) and callers need the usual
+    `if __name__ == "__main__":` guard.
+
+    Args:
+        input_path (str): Path to input video file
+        output_path (str): Path to save the transformed video
+        new_size (tuple): (width, height) of the transformed frames
+        transform (callable): Function taking a BGR frame and returning the new frame; it may
+                              modify the input frame in place
+        make_transform (callable): Alternative to transform, called once in each worker to build
+                                   the transform (for models that cannot be pickled)
+        workers (int): Number of transform processes (default: CPU count - 1)
+        slots (int): Frames in flight; each slot holds one input and one output frame
+                     (default: 2 * workers + 2)
+        fourcc (str): Codec of the output (default: 'mp4v')
+        desc (str): Progress bar label
+    """
+    if (transform is None) == (make_transform is None):
+        raise ValueError("Pass exactly one of transform or make_transform")
+
+    video = cv2.VideoCapture(input_path)
+    if not video.isOpened():
+        raise IOError(f"Cannot open video file: {input_path}")
+    fps = video.get(cv2.CAP_PROP_FPS)
+    width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    frame_count = count_frames(input_path, fallback=int(video.get(cv2.CAP_PROP_FRAME_COUNT)))
+    video.release()
+
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    slots = slots or 2 * workers + 2
+    in_shape = (slots, height, width, 3)
+    out_shape = (slots, new_size[1], new_size[0], 3)
+
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, new_size, isColor=True)
+    if not writer.isOpened():
+        raise IOError(f"Could not open video writer: {output_path}")
+
+    ctx = multiprocessing.get_context('spawn')
+    in_block = shared_memory.SharedMemory(create=True, size=int(np.prod(in_shape)))
+    out_block = shared_memory.SharedMemory(create=True, size=int(np.prod(out_shape)))
+    outputs = np.ndarray(out_shape, dtype=np.uint8, buffer=out_block.buf)
+
+    free_slots = ctx.Queue()
+    work_queue = ctx.Queue()
+    done_queue = ctx.Queue()
+    for slot in range(slots):
+        free_slots.put(slot)
+
+    processes = [ctx.Process(
+        target=_decoder_process,
+        args=(input_path, in_block.name, in_shape, free_slots, work_queue, done_queue, workers),
+        daemon=True
+    )]
+    for _ in range(workers):
+        processes.append(ctx.Process(
+            target=_transform_process,
+            args=(in_block.name, in_shape, out_block.name, out_shape, work_queue, done_queue,
+                  transform, make_transform),
+            daemon=True
+        ))
+
+    pbar = tqdm(total=frame_count, desc=f"{desc} ({workers} workers)")
+    try:
+        for process in processes:
+            process.start()
+
+        # Workers finish out of order; frames are written strictly by sequence number
+        pending = {}
+        next_sequence = 0
+        total = None
+        while total is None or next_sequence < total:
+            try:
+                tag, value = done_queue.get(timeout=1.0)
+            except queue.Empty:
+                if any(process.exitcode not in (None, 0) for process in processes):
+                    raise RuntimeError("A frame ring process died unexpectedly")
+                continue
+
+            if tag == 'error':
+                raise RuntimeError(f"Frame ring process failed:\n{value}")
+            if tag == 'eof':
+                total = value
+                continue
+
+            pending[tag] = value
+            while next_sequence in pending:
+                slot = pending.pop(next_sequence)
+                writer.write(outputs[slot])
+                free_slots.put(slot)
+                next_sequence += 1
+                pbar.update(1)
+
+        for process in processes:
+            process.join()
+    finally:
+        pbar.close()
+        writer.release()
+        for process in processes:
+            if process.pid is None:
+                continue
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for q in (free_slots, work_queue, done_queue):
+            q.close()
+            q.cancel_join_thread()
+        del outputs
+        for block in (in_block, out_block):
+            block.close()
+            block.unlink()
+
+    print(f"Video saved to: {output_path} ({total} frames)")
+
+if __name__ == "__main__":
+    # Example usage: Lanczos + sharpen 4K upscale on every core
+    import functools
+    from video_upscaler_cv2 import sharpen_upscale_frame
+
+    input_video = r"C:\data\hero\concat-all-text.mp4"
+    output_video = r"C:\data\hero\concat-all-4k-parallel.mp4"
+
+    parallel_transform(
+        input_video,
+        output_video,
+        (3840, 2160),
+        transform=functools.partial(sharpen_upscale_frame, new_width=3840, new_height=2160),
+        workers=8
+    )
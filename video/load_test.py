@@ -0,0 +1,414 @@
+# Load test for the web app: python load_test.py --url http://127.0.0.1:5000 [options]
+#
+# Generates synthetic media with ffmpeg (lavfi test sources, no real footage needed),
+# then drives /process/<task> with a weighted mix of tasks, either closed-loop (a fixed
+# number of clients) or open-loop (Poisson arrivals at a given rate). Reports throughput,
+# latency percentiles and error rate per task, and the server's CPU/RSS over time.
+# Meant for a local instance only: uploads are real files and every request renders.
+import argparse
+import json
+import math
+import mimetypes
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ffmpeg_runner import run_ffmpeg
+
+TASKS = ('trim', 'stitch', 'text', 'audio')
+
+def make_media(media_dir, duration=10, size=(1280, 720), fps=30):
+    """
+    Synthetic inputs: two short test-pattern videos (with a tone) and a music track
+
+    Args:
+        media_dir (str): Folder for the generated files (reused if they already exist)
+        duration (float): Video length in seconds
+        size (tuple): Video size (width, height)
+        fps (int): Frame rate
+
+    Returns:
+        dict: 'videos' (list of paths) and 'audio' (path)
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    width, height = size
+    media = {'videos': [], 'audio': os.path.join(media_dir, 'music.wav')}
+
+    for i, (pattern, tone) in enumerate((('testsrc2', 440), ('smptebars', 660))):
+        path = os.path.join(media_dir, f"clip{i}_{width}x{height}_{duration}s.mp4")
+        if not os.path.exists(path):
+            run_ffmpeg([
+                '-f', 'lavfi', '-i', f'{pattern}=size={width}x{height}:rate={fps}:duration={duration}',
+                '-f', 'lavfi', '-i', f'sine=frequency={tone}:duration={duration}',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+                '-c:a', 'aac', '-shortest',
+                '-y', path
+            ])
+        media['videos'].append(path)
+
+    if not os.path.exists(media['audio']):
+        run_ffmpeg(['-f', 'lavfi', '-i', f'sine=frequency=220:duration={duration * 2}', '-y', media['audio']])
+    return media
+
+def encode_multipart(fields, files):
+    """
+    multipart/form-data body with the standard library only
+
+    Args:
+        fields (dict): Form fields
+        files (list): (field_name, path) tuples; a field may appear several times
+
+    Returns:
+        tuple: (body bytes, content type header)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    for name, path in files:
+        filename = os.path.basename(path)
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        with open(path, 'rb') as f:
+            data = f.read()
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+def task_request(task, media, duration):
+    """Form fields and files of one /process/<task> request on the synthetic media."""
+    video = random.choice(media['videos'])
+    if task == 'trim':
+        start = round(random.uniform(0, duration / 2), 2)
+        return {'start_time': start, 'end_time': start + duration / 4}, [('video_file', video)]
+    if task == 'stitch':
+        return {}, [('video_files', path) for path in media['videos']]
+    if task == 'text':
+        return ({'overlay_text': 'Load test', 'font_size': 48, 'text_color': 'white', 'position': 'center'},
+                [('video_file', video)])
+    if task == 'audio':
+        return {'video_volume': 50, 'music_volume': 100}, [('video_file', video), ('audio_file', media['audio'])]
+    raise ValueError(f"Unknown task: {task}")
+
+def parse_mix(value):
+    """'trim=4,text=1' -> {'trim': 4.0, 'text': 1.0}; a bare name gets weight 1."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in TASKS:
+            raise argparse.ArgumentTypeError(f"Unknown task '{name}' (choose from {', '.join(TASKS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+class ServerMonitor:
+    """
+    Samples CPU and RSS of the server process in a background thread
+
+    CPU includes child processes once they have exited (the ffmpeg calls each job makes);
+    RSS adds up the server and its live children. Uses psutil when installed, otherwise
+    /proc (Linux only); without either the monitor records nothing.
+    """
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+        try:
+            import psutil
+            self._process = psutil.Process(pid)
+        except ImportError:
+            self._process = None
+            if not os.path.exists(f'/proc/{pid}/stat'):
+                print("Warning: Server CPU/RSS not recorded (install psutil)")
+                self.pid = None
+
+    def _read(self):
+        """Returns (cpu seconds including reaped children, rss bytes)."""
+        if self._process is not None:
+            times = self._process.cpu_times()
+            rss = self._process.memory_info().rss
+            for child in self._process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except Exception:
+                    pass  # Exited meanwhile
+            return times.user + times.system + times.children_user + times.children_system, rss
+
+        with open(f'/proc/{self.pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        cpu = sum(int(value) for value in fields[11:15]) / ticks  # utime, stime, cutime, cstime
+        rss = int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+        return cpu, rss
+
+    def _run(self, started):
+        last_cpu, last_time = self._read()[0], time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                cpu, rss = self._read()
+            except Exception:
+                break  # Server went away
+            now = time.monotonic()
+            self.samples.append({
+                't': round(now - started, 2),
+                'cpu_percent': round(100 * (cpu - last_cpu) / (now - last_time), 1),
+                'rss_mb': round(rss / 1024 ** 2, 1),
+            })
+            last_cpu, last_time = cpu, now
+
+    def start(self, started):
+        if self.pid:
+            self._thread = threading.Thread(target=self._run, args=(started,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+def start_server(port):
+    """Starts app.py on a local port (threaded, no reloader) and waits until it answers."""
+    process = subprocess.Popen(
+        [sys.executable, '-c', f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError("The app exited during startup")
+        try:
+            urllib.request.urlopen(url + '/upload', timeout=1)
+        except urllib.error.HTTPError:
+            return process, url  # Any HTTP answer (405 here) means it is up
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("The app did not start listening in time")
+
+def run_load_test(url, media, mix, concurrency=4, rate=None, requests=None, duration=60.0,
+                  media_duration=10, server_pid=None, timeout=600):
+    """
+    Drive /process/<task> and collect per-request results
+
+    Args:
+        url (str): Base URL of the app, e.g. http://127.0.0.1:5000
+        media (dict): Output of make_media
+        mix (dict): Task weights, e.g. {'trim': 4, 'audio': 1}
+        concurrency (int): Clients (closed loop) or maximum requests in flight (open loop)
+        rate (float): Arrivals per second for an open-loop test (default: closed loop)
+        requests (int): Stop after this many requests (default: run for `duration`)
+        duration (float): Test length in seconds when `requests` is not set
+        media_duration (float): Length of the synthetic videos (for trim ranges)
+        server_pid (int): Server process to sample CPU/RSS from (default: not sampled)
+        timeout (float): Per-request timeout in seconds
+
+    Returns:
+        dict: Report with 'summary', 'tasks', 'server' and raw 'results'
+    """
+    tasks, weights = zip(*mix.items())
+    results = []
+    lock = threading.Lock()
+    issued = [0]
+
+    def next_task():
+        """Picks the next task, or None when the request budget or the time is used up."""
+        with lock:
+            if requests is not None and issued[0] >= requests:
+                return None
+            if requests is None and time.monotonic() - started >= duration:
+                return None
+            issued[0] += 1
+        return random.choices(tasks, weights)[0]
+
+    def send(task, queued_at):
+        fields, files = task_request(task, media, media_duration)
+        body, content_type = encode_multipart(fields, files)
+        request = urllib.request.Request(f'{url}/process/{task}', data=body, method='POST', headers={
+            'Content-Type': content_type,
+            'Accept': 'application/json',  # The app answers with JSON instead of the HTML page
+        })
+        sent_at = time.monotonic()
+        error = None
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                status = response.status
+                response.read()
+        except urllib.error.HTTPError as e:
+            status = e.code
+            try:
+                error = json.loads(e.read()).get('error')
+            except ValueError:
+                error = e.reason
+        except OSError as e:
+            status, error = None, str(e)
+        done_at = time.monotonic()
+        with lock:
+            results.append({
+                'task': task,
+                'start': round(sent_at - started, 3),
+                'latency': done_at - queued_at,  # Includes client-side queueing in open-loop tests
+                'service': done_at - sent_at,
+                'status': status,
+                'error': error,
+                'bytes': len(body),
+            })
+
+    monitor = ServerMonitor(server_pid) if server_pid else None
+    started = time.monotonic()
+    if monitor:
+        monitor.start(started)
+
+    try:
+        if rate is None:
+            # Closed loop: each client sends its next request as soon as the previous one returns
+            def client():
+                while True:
+                    task = next_task()
+                    if task is None:
+                        return
+                    send(task, time.monotonic())
+
+            threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            # Open loop: Poisson arrivals regardless of how fast the server answers
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                next_arrival = started
+                while True:
+                    task = next_task()
+                    if task is None:
+                        break
+                    time.sleep(max(0.0, next_arrival - time.monotonic()))
+                    executor.submit(send, task, time.monotonic())
+                    next_arrival += random.expovariate(rate)
+    finally:
+        elapsed = time.monotonic() - started
+        if monitor:
+            monitor.stop()
+
+    return build_report(results, elapsed, monitor.samples if monitor else [])
+
+def _latency_stats(results):
+    latencies = sorted(result['latency'] for result in results)
+    ok = [result for result in results if result['status'] == 200]
+    return {
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'error_rate': round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        **{f'p{q}': round(percentile(latencies, q), 3) if latencies else None for q in (50, 90, 95, 99)},
+        'max': round(latencies[-1], 3) if latencies else None,
+    }
+
+def build_report(results, elapsed, server_samples):
+    """Summary over all requests, per-task breakdown and the server samples."""
+    ok = sum(1 for result in results if result['status'] == 200)
+    summary = _latency_stats(results)
+    summary.update({
+        'elapsed': round(elapsed, 2),
+        'throughput': round(ok / elapsed, 3) if elapsed else 0.0,  # Successful requests per second
+        'upload_mb_per_s': round(sum(result['bytes'] for result in results) / 1024 ** 2 / elapsed, 2) if elapsed else 0.0,
+    })
+    if server_samples:
+        summary['server_cpu_percent_max'] = max(sample['cpu_percent'] for sample in server_samples)
+        summary['server_rss_mb_max'] = max(sample['rss_mb'] for sample in server_samples)
+
+    errors = {}
+    for result in results:
+        if result['status'] != 200:
+            message = f"{result['status']}: {result['error']}"
+            errors[message] = errors.get(message, 0) + 1
+
+    return {
+        'summary': summary,
+        'tasks': {task: _latency_stats([result for result in results if result['task'] == task])
+                  for task in sorted({result['task'] for result in results})},
+        'errors': errors,
+        'server': server_samples,
+        'results': results,
+    }
+
+def print_report(report):
+    summary = report['summary']
+    print(f"\n{summary['requests']} requests in {summary['elapsed']}s: "
+          f"{summary['throughput']} ok/s, error rate {summary['error_rate']:.1%}")
+    print(f"{'task':<8}{'n':>6}{'err':>6}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for task, stats in list(report['tasks'].items()) + [('all', summary)]:
+        print(f"{task:<8}{stats['requests']:>6}{stats['errors']:>6}" +
+              ''.join(f"{stats[key] if stats[key] is not None else '-':>9}" for key in ('p50', 'p90', 'p95', 'p99', 'max')))
+    for message, count in report['errors'].items():
+        print(f"  {count}x {message}")
+    if report['server']:
+        print(f"\n{'t':>8}{'cpu %':>9}{'rss MB':>10}")
+        for sample in report['server']:
+            print(f"{sample['t']:>8}{sample['cpu_percent']:>9}{sample['rss_mb']:>10}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load test /process/<task> of a local app instance")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running instance, e.g. http://127.0.0.1:5000')
+    target.add_argument('--serve', type=int, metavar='PORT', help='Start app.py on this local port for the test')
+    parser.add_argument('--pid', type=int, help='Server process id for CPU/RSS sampling (automatic with --serve)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('trim=4,stitch=1,text=1,audio=2'),
+                        help='Task weights (default: trim=4,stitch=1,text=1,audio=2)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Clients, or maximum requests in flight with --rate (default: 4)')
+    parser.add_argument('--rate', type=float, help='Open-loop arrival rate in requests per second')
+    parser.add_argument('--requests', type=int, help='Total requests (default: run for --duration)')
+    parser.add_argument('--duration', type=float, default=60.0, help='Test length in seconds (default: 60)')
+    parser.add_argument('--media-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'loadtest'),
+                        help='Folder for the synthetic media')
+    parser.add_argument('--media-duration', type=int, default=10, help='Length of the synthetic videos (default: 10)')
+    parser.add_argument('--media-size', default='1280x720', help='Size of the synthetic videos (default: 1280x720)')
+    parser.add_argument('--timeout', type=float, default=600, help='Per-request timeout in seconds (default: 600)')
+    parser.add_argument('--report', help='Also write the full report (including every request) as JSON')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    width, height = (int(v) for v in args.media_size.lower().split('x'))
+    media = make_media(args.media_dir, args.media_duration, (width, height))
+
+    server = None
+    url, pid = args.url, args.pid
+    if args.serve:
+        server, url = start_server(args.serve)
+        pid = pid or server.pid
+
+    try:
+        report = run_load_test(url.rstrip('/'), media, args.mix, concurrency=args.concurrency, rate=args.rate,
+                               requests=args.requests, duration=args.duration,
+                               media_duration=args.media_duration, server_pid=pid, timeout=args.timeout)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.report}")
+    return 1 if report['summary']['requests'] == 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import numpy as np
+
+from cache_utils import is_url
+from ffmpeg_runner import FFmpegPipe, probe_video_cached
+from seek_index import load_seek_index
+
+AUDIO_RATE = 48000
+AUDIO_BLOCK = AUDIO_RATE // 10  # 100 ms: silence resolution and loudness sub-block
+
+# ITU-R BS.1770 K-weighting at 48 kHz (high shelf, then high pass), applied by ffmpeg's biquad
+K_WEIGHTING = (
+    'biquad=b0=1.53512485958697:b1=-2.69169618940638:b2=1.19839281085285:a0=1:a1=-1.69065929318241:a2=0.73248077421585,'
+    'biquad=b0=1:b1=-2:b2=1:a0=1:a1=-1.99004745483398:a2=0.99007225036621'
+)
+
+# Default limits of the checks
+QC_DEFAULTS = {
+    'black_pixel': 32,      # Luma below this counts as black (covers limited and full range)
+    'black_ratio': 0.98,    # Share of black pixels for a black frame
+    'min_black': 0.5,       # Seconds
+    'freeze_noise': 0.5,    # Mean absolute luma change below this is a frozen frame
+    'min_freeze': 2.0,      # Seconds
+    'silence_db': -50.0,    # dBFS
+    'min_silence': 2.0,     # Seconds
+    'loudness_target': None,  # LUFS, e.g. -16 for web or -23 for broadcast (None: not checked)
+    'loudness_tolerance': 1.0,  # LU
+}
+
+def _intervals(flags, times, end_time, min_duration):
+    """Runs of True in a per-unit flag array as {'start', 'end', 'duration'} dicts, unit i spanning times[i] to times[i + 1]."""
+    edges = np.diff(np.concatenate([[0], np.asarray(flags, dtype=np.int8), [0]]))
+    bounds = np.append(np.asarray(times, dtype=np.float64), end_time)
+    intervals = []
+    for first, stop in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        start, end = float(bounds[first]), float(bounds[stop])
+        if end - start >= min_duration:
+            intervals.append({'start': round(start, 3), 'end': round(end, 3), 'duration': round(end - start, 3)})
+    return intervals
+
+def integrated_loudness(k_power):
+    """
+    Gated integrated loudness (BS.1770) from the K-weighted power of 100 ms sub-blocks
+
+    Gating blocks are 400 ms with 75% overlap, i.e. four consecutive sub-blocks; an
+    absolute gate at -70 LUFS is followed by a relative gate 10 LU below the mean.
+    """
+    if len(k_power) < 4:
+        return None
+    blocks = np.convolve(k_power, np.ones(4) / 4, mode='valid')
+    loudness = -0.691 + 10 * np.log10(np.maximum(blocks, 1e-20))
+    gated = blocks[loudness > -70]
+    if not len(gated):
+        return None
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10
+    gated = blocks[(loudness > -70) & (loudness > relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+class _AudioAnalyzer:
+    """Consumes interleaved float32 audio: the raw channels (1 or 2) followed by the same channels K-weighted."""
+
+    def __init__(self, channels=2):
+        self.channels = channels
+        self.width = 2 * channels  # Values per sample frame
+        self.raw_power = []
+        self.k_power = []
+        self.peak = 0.0
+        self.leftover = np.empty((0, self.width), dtype=np.float32)
+        self.error = None
+
+    def feed(self, data):
+        usable = len(data) - len(data) % (4 * self.width)
+        samples = np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, self.width)
+        if len(self.leftover):
+            samples = np.concatenate([self.leftover, samples])
+        if len(samples):
+            self.peak = max(self.peak, float(np.abs(samples[:, :self.channels]).max()))
+        whole = len(samples) // AUDIO_BLOCK * AUDIO_BLOCK
+        self.leftover = samples[whole:].copy()
+        if whole:
+            power = np.square(samples[:whole].reshape(-1, AUDIO_BLOCK, self.width), dtype=np.float64).mean(axis=1)
+            self.raw_power.append(power[:, :self.channels].mean(axis=1))
+            # Sum over the channels, weight 1 for mono, left and right
+            self.k_power.append(power[:, self.channels:].sum(axis=1))
+
+    def read_all(self, stream, chunk_blocks=30):
+        try:
+            for chunk in iter(lambda: stream.read(AUDIO_BLOCK * 4 * self.width * chunk_blocks), b''):
+                self.feed(chunk)
+        except Exception as e:
+            self.error = e
+
+    def report(self, options):
+        raw_power = np.concatenate(self.raw_power) if self.raw_power else np.empty(0)
+        k_power = np.concatenate(self.k_power) if self.k_power else np.empty(0)
+        times = np.arange(len(raw_power)) * (AUDIO_BLOCK / AUDIO_RATE)
+        silent = 10 * np.log10(np.maximum(raw_power, 1e-20)) < options['silence_db']
+        loudness = integrated_loudness(k_power)
+        return {
+            'integrated_lufs': round(loudness, 2) if loudness is not None else None,
+            'sample_peak_dbfs': round(20 * np.log10(self.peak), 2) if self.peak > 0 else None,
+            'silence': _intervals(silent, times, len(raw_power) * AUDIO_BLOCK / AUDIO_RATE, options['min_silence']),
+        }
+
+def analyze_media(input_path, width=64, batch_size=256, **limits):
+    """
+    Check a file for black frames, frozen video, silent gaps and loudness in one decode
+
+    A single ffmpeg process decodes the file once: the video, scaled to a tiny gray frame,
+    comes out on stdout and the audio (raw plus K-weighted, as float32) on a second pipe.
+    Video frames are checked in numpy batches and audio in 100 ms blocks, both at the same
+    time (the audio is read on a thread). On Windows, where a second pipe can't be passed
+    to ffmpeg, the audio is read by a second, audio-only ffmpeg process instead.
+
+    Args:
+        input_path (str): Path to the media file
+        width (int): Analysis width of the video in pixels (default: 64)
+        batch_size (int): Video frames per numpy batch (default: 256)
+        **limits: Overrides of QC_DEFAULTS, e.g. min_silence=1.0, loudness_target=-16
+
+    Returns:
+        dict: JSON-ready report with 'video', 'audio', 'problems' and 'passed'
+    """
+    unknown = set(limits) - set(QC_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown QC options: {', '.join(sorted(unknown))}")
+    options = dict(QC_DEFAULTS, **limits)
+
+    info = probe_video_cached(input_path)
+    has_video = bool(info['width'] and info['height'])
+    duration = info['duration']
+
+    # Mono stays one channel: BS.1770 sums the channel powers, so an upmix would read 3 LU high.
+    # More than two channels are downmixed to stereo.
+    channels = 1 if info['audio_channels'] == 1 else 2
+    layout = 'mono' if channels == 1 else 'stereo'
+    audio_filter = (f'[0:a:0]aresample={AUDIO_RATE},aformat=sample_fmts=flt:channel_layouts={layout},'
+                    f'asplit=2[raw][kin];[kin]{K_WEIGHTING}[k];[raw][k]amerge=inputs=2[qa]')
+    audio_output = ['-filter_complex', audio_filter, '-map', '[qa]', '-c:a', 'pcm_f32le', '-f', 'f32le']
+
+    args = ['-i', input_path]
+    height = frame_bytes = 0
+    if has_video:
+        height = max(2, int(round(width * info['height'] / info['width'] / 2)) * 2)
+        frame_bytes = width * height
+        args += ['-map', '0:v:0', '-vf', f'scale={width}:{height}:flags=area,format=gray',
+                 '-vsync', 'passthrough', '-f', 'rawvideo', 'pipe:1']
+
+    audio = _AudioAnalyzer(channels) if info['has_audio'] else None
+    processes = []
+    audio_stream = None
+    try:
+        if audio and has_video and os.name == 'posix':
+            # Same process, audio on an extra pipe
+            read_fd, write_fd = os.pipe()
+            try:
+                processes.append(FFmpegPipe(args + audio_output + [f'pipe:{write_fd}'], stdout='pipe',
+                                            pass_fds=(write_fd,)))
+            finally:
+                os.close(write_fd)
+            audio_stream = os.fdopen(read_fd, 'rb')
+        else:
+            if has_video:
+                processes.append(FFmpegPipe(args, stdout='pipe'))
+            if audio:
+                processes.append(FFmpegPipe(['-i', input_path, '-vn'] + audio_output + ['pipe:1'], stdout='pipe'))
+                audio_stream = processes[-1].process.stdout
+
+        audio_thread = None
+        if audio:
+            audio_thread = threading.Thread(target=audio.read_all, args=(audio_stream,), daemon=True)
+            audio_thread.start()
+
+        black = []
+        diffs = []
+        if has_video:
+            video = processes[0]
+            buffer = bytearray(batch_size * frame_bytes)
+            view = memoryview(buffer)
+            batch = np.frombuffer(buffer, dtype=np.uint8).reshape(batch_size, frame_bytes)
+            previous = None
+            while True:
+                count = 0
+                while count < batch_size and video.readinto(view[count * frame_bytes:(count + 1) * frame_bytes]):
+                    count += 1
+                if count == 0:
+                    break
+                frames = batch[:count]
+                black.append((frames < options['black_pixel']).mean(axis=1) >= options['black_ratio'])
+                chain = frames if previous is None else np.concatenate([previous[None], frames])
+                diffs.append(np.abs(np.diff(chain.astype(np.int16), axis=0)).mean(axis=1))
+                previous = frames[-1].copy()
+
+        if audio_thread:
+            audio_thread.join()
+            if audio.error:
+                raise audio.error
+        for process in processes:
+            process.close()
+    except BaseException:
+        for process in processes:
+            process.close(kill=True)
+        raise
+    finally:
+        if audio_stream is not None and not audio_stream.closed:
+            audio_stream.close()
+
+    report = {'file': input_path, 'duration': round(duration, 3), 'limits': options}
+
+    if has_video:
+        black = np.concatenate(black) if black else np.zeros(0, dtype=bool)
+        frame_count = len(black)
+        try:
+            pts = load_seek_index(input_path)['pts']
+            times = pts[:frame_count] if len(pts) >= frame_count else None
+        except Exception:
+            times = None
+        if times is None:
+            times = np.arange(frame_count) / (info['fps'] or 30.0)
+
+        # A frame is frozen when it matches the frame before or after it
+        same = np.zeros(frame_count, dtype=bool)
+        if frame_count > 1:
+            same[1:] = np.concatenate(diffs) < options['freeze_noise']  # The first frame has no predecessor
+        frozen = same | np.append(same[1:], False)
+
+        report['video'] = {
+            'frames': int(frame_count),
+            'black': _intervals(black, times, duration, options['min_black']),
+            'freeze': _intervals(frozen, times, duration, options['min_freeze']),
+        }
+
+    if audio:
+        report['audio'] = audio.report(options)
+
+    problems = []
+    for section, check in (('video', 'black'), ('video', 'freeze'), ('audio', 'silence')):
+        for interval in report.get(section, {}).get(check, []):
+            problems.append(f"{check} {interval['start']:.2f}s-{interval['end']:.2f}s")
+    loudness = report.get('audio', {}).get('integrated_lufs')
+    if options['loudness_target'] is not None and loudness is not None and \
+            abs(loudness - options['loudness_target']) > options['loudness_tolerance']:
+        problems.append(f"loudness {loudness:.1f} LUFS (target {options['loudness_target']} LUFS)")
+    if report.get('audio', {}).get('sample_peak_dbfs') is not None and report['audio']['sample_peak_dbfs'] >= 0:
+        problems.append("audio clipping (sample peak at 0 dBFS)")
+
+    report['problems'] = problems
+    report['passed'] = not problems
+    return report
+
+def write_report(report, report_path=None):
+    """Saves a QC report as JSON (default: <media file>.qc.json) and returns its path."""
+    if not report_path and is_url(report['file']):
+        raise ValueError("A report path is needed when the checked file is a URL")
+    report_path = report_path or report['file'] + '.qc.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return report_path
+
+def run_qc(input_path, report_path=None, **limits):
+    """analyze_media + write_report with a console summary; used at the end of the render functions."""
+    report = analyze_media(input_path, **limits)
+    report_path = write_report(report, report_path)
+    if report['passed']:
+        print(f"QC passed: {report_path}")
+    else:
+        print(f"QC found {len(report['problems'])} problem(s): {', '.join(report['problems'])} ({report_path})")
+    return report
+
+if __name__ == "__main__":
+    # Example usage: check a deliverable before it goes out
+    report = run_qc(r"C:\data\hero\final_video_with_music.mp4", loudness_target=-16)
+    print(json.dumps({key: report[key] for key in ('passed', 'problems')}, indent=2))
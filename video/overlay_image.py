@@ -1,9 +1,30 @@
 import cv2
 import numpy as np
 import os
+import functools
 from tqdm import tqdm
 
-def add_logo_cv2(input_path, output_path, logo_path, position='top-left', size=None, padding=5):
+from seek_index import count_frames
+from frame_ring import parallel_transform
+
+def blend_logo_frame(frame, logo, x, y):
+    """Blends a logo (BGR or BGRA) onto a frame in place at (x, y) and returns the frame."""
+    logo_h, logo_w = logo.shape[:2]
+
+    # Define region of interest (ROI)
+    roi = frame[y:y+logo_h, x:x+logo_w]
+
+    # Blend logo with transparency
+    if logo.shape[2] == 4: # Check for alpha channel
+        alpha = logo[:, :, 3] / 255.0
+        for c in range(0, 3):
+            frame[y:y+logo_h, x:x+logo_w, c] = (alpha * logo[:, :, c] +
+                                             (1.0 - alpha) * roi[:, :, c])
+    else: # No alpha channel, just overlay
+        frame[y:y+logo_h, x:x+logo_w] = logo[:,:,:3]
+    return frame
+
+def add_logo_cv2(input_path, output_path, logo_path, position='top-left', size=None, padding=5, workers=None):
     """
     Add logo overlay to a video file using OpenCV
 
@@ -14,6 +35,8 @@ def add_logo_cv2(input_path, output_path, logo_path, position='top-left', size=N
         position (str): Position of logo - 'top-left', 'top-right', 'bottom-left', 'bottom-right'
         size (tuple): Optional (width, height) to resize the logo. If None, original size is kept
         padding (int): Padding from edges in pixels (default: 5)
+        workers (int): If set, blend frames in this many processes through the shared-memory
+                       frame ring (default: None, single process)
     """
     try:
         # Verify logo file exists
@@ -29,7 +52,8 @@ def add_logo_cv2(input_path, output_path, logo_path, position='top-left', size=N
         fps = int(video.get(cv2.CAP_PROP_FPS))
         width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        # CAP_PROP_FRAME_COUNT is only an estimate (often wrong for VFR footage)
+        frame_count = count_frames(input_path, fallback=int(video.get(cv2.CAP_PROP_FRAME_COUNT)))
 
         # Read the logo
         logo = cv2.imread(logo_path, cv2.IMREAD_UNCHANGED)
@@ -65,6 +89,18 @@ def add_logo_cv2(input_path, output_path, logo_path, position='top-left', size=N
         x = max(0, min(x, width - logo_w))
         y = max(0, min(y, height - logo_h))
 
+        if workers:
+            video.release()
+            parallel_transform(
+                input_path,
+                output_path,
+                (width, height),
+                transform=functools.partial(blend_logo_frame, logo=logo, x=x, y=y),
+                workers=workers,
+                desc='Adding logo'
+            )
+            return
+
         # Create video writer (try different codecs)
         codecs = [('mp4v', '.mp4'), ('XVID', '.avi')]
         writer = None
@@ -94,19 +130,7 @@ def add_logo_cv2(input_path, output_path, logo_path, position='top-left', size=N
             if not ret:
                 break
 
-            # Define region of interest (ROI)
-            roi = frame[y:y+logo_h, x:x+logo_w]
-
-            # Blend logo with transparency
-            if logo.shape[2] == 4: # Check for alpha channel
-                alpha = logo[:, :, 3] / 255.0
-                for c in range(0, 3):
-                    frame[y:y+logo_h, x:x+logo_w, c] = (alpha * logo[:, :, c] +
-                                                     (1.0 - alpha) * roi[:, :, c])
-            else: # No alpha channel, just overlay
-                frame[y:y+logo_h, x:x+logo_w] = logo[:,:,:3]
-
-            writer.write(frame)
+            writer.write(blend_logo_frame(frame, logo, x, y))
             pbar.update(1)
 
         # Clean up
@@ -121,6 +145,7 @@ def add_logo_cv2(input_path, output_path, logo_path, position='top-left', size=N
         # Release resources if they were opened
         if 'video' in locals() and video.isOpened(): video.release()
         if 'writer' in locals() and writer and writer.isOpened(): writer.release()
+        raise
 
 
 if __name__ == "__main__":
@@ -1,15 +1,15 @@
 from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip
-from moviepy.config import change_settings
+import bisect
+import json
 import os
+import re
+import numpy as np
 
-# Configure moviepy to use ImageMagick (adjust path if necessary)
-try:
-    change_settings({"IMAGEMAGICK_BINARY": r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe"})
-except Exception as e:
-    print(f"Warning: Could not configure ImageMagick. Text overlay might fail. Error: {e}")
+from config import configure_imagemagick
 
 
-def add_text_overlay(input_path, output_path, text, font_size=70, color='white', position='center', font='Arial-Bold-Italic', stroke_color='black', stroke_width=2):
+def add_text_overlay(input_path, output_path, text, font_size=70, color='white', position='center', font='Arial-Bold-Italic', stroke_color='black', stroke_width=2,
+                     encode_plan=None):
     """
     Add text overlay to a video file
 
@@ -23,8 +23,13 @@ def add_text_overlay(input_path, output_path, text, font_size=70, color='white',
         font (str): Font name (default: 'Arial-Bold-Italic')
         stroke_color (str): Outline color for text (default: 'black')
         stroke_width (int): Outline width (default: 2)
+        encode_plan (dict): Rate control from encode_planner, starting from MoviePy's medium/CRF 23: a plan
+                            from plan_encode, or its constraints to plan on the input, e.g.
+                            {'target_size': '700MB', 'deadline': 600}
     """
     try:
+        configure_imagemagick()
+
         # Load the video
         video = VideoFileClip(input_path)
 
@@ -58,7 +63,166 @@ def add_text_overlay(input_path, output_path, text, font_size=70, color='white',
         video_with_text = CompositeVideoClip([video, txt_clip])
 
         # Write the result to file
-        video_with_text.write_videofile(
+        write_kwargs = {'codec': 'libx264', 'audio_codec': 'aac'}
+        if encode_plan is not None:
+            from encode_planner import moviepy_write_kwargs, resolve_plan, writer_settings
+            plan = resolve_plan(encode_plan, input_path, **writer_settings(write_kwargs))
+            write_kwargs = moviepy_write_kwargs(plan, write_kwargs)
+        video_with_text.write_videofile(output_path, **write_kwargs)
+
+        # Clean up
+        video.close()
+        txt_clip.close()
+        video_with_text.close()
+
+        print(f"Text overlay added successfully and saved to: {output_path}")
+
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        raise
+
+def load_cues(cue_path):
+    """
+    Load a caption cue list from an .srt file or a .json file
+
+    A JSON file holds a list of objects with 'start', 'end' (seconds) and 'text', plus
+    optional style keys: 'position', 'font_size', 'color', 'font', 'stroke_color', 'stroke_width'.
+
+    Args:
+        cue_path (str): Path to the .srt or .json file
+
+    Returns:
+        list: Cue dicts
+    """
+    with open(cue_path, 'r', encoding='utf-8-sig') as f:
+        content = f.read()
+
+    if cue_path.lower().endswith('.json'):
+        cues = json.loads(content)
+        for cue in cues:
+            # JSON has no tuples; ["right", "top"] means ('right', 'top')
+            if isinstance(cue.get('position'), list):
+                cue['position'] = tuple(cue['position'])
+        return cues
+
+    # SRT: blocks of "index / start --> end / text lines" separated by blank lines
+    timestamp = r'(\d+):(\d+):(\d+)[,.](\d+)'
+    cues = []
+    for block in re.split(r'\n\s*\n', content.strip()):
+        lines = block.strip().splitlines()
+        for i, line in enumerate(lines):
+            match = re.match(timestamp + r'\s*-->\s*' + timestamp, line.strip())
+            if match:
+                h1, m1, s1, ms1, h2, m2, s2, ms2 = match.groups()
+                cues.append({
+                    'start': int(h1) * 3600 + int(m1) * 60 + int(s1) + int(ms1) / 1000.0,
+                    'end': int(h2) * 3600 + int(m2) * 60 + int(s2) + int(ms2) / 1000.0,
+                    'text': '\n'.join(lines[i + 1:]),
+                })
+                break
+    return cues
+
+def _resolve_position(position, video_w, video_h, w, h, padding=5):
+    """Converts a position ('center', ('right', 'top'), (x, y), ...) to pixel coordinates."""
+    if position == 'center':
+        position = ('center', 'center')
+    elif position in ('top', 'bottom'):
+        position = ('center', position)
+    elif position in ('left', 'right'):
+        position = (position, 'center')
+
+    horizontal, vertical = position
+    x = {'left': padding, 'center': (video_w - w) // 2, 'right': video_w - w - padding}.get(horizontal, horizontal)
+    y = {'top': padding, 'center': (video_h - h) // 2, 'bottom': video_h - h - padding}.get(vertical, vertical)
+    return int(x), int(y)
+
+def add_timed_captions(input_path, output_path, cues, font_size=70, color='white', position='center',
+                       font='Arial-Bold-Italic', stroke_color='black', stroke_width=2):
+    """
+    Burn a list of timed captions into a video in a single decode/encode pass
+
+    Every distinct caption is rasterized once; each frame only blends the captions
+    that are active at its timestamp.
+
+    Args:
+        input_path (str): Path to the input video file
+        output_path (str): Path where the output video will be saved
+        cues (list/str): Cue dicts with 'start', 'end', 'text' and optional style keys,
+                         or a path to an .srt/.json cue file (see load_cues)
+        font_size (int): Default font size for cues that don't set one (default: 70)
+        color (str): Default text color (default: 'white')
+        position (str/tuple): Default position, same values as add_text_overlay (default: 'center')
+        font (str): Default font name (default: 'Arial-Bold-Italic')
+        stroke_color (str): Default outline color (default: 'black')
+        stroke_width (int): Default outline width (default: 2)
+    """
+    try:
+        configure_imagemagick()
+        if isinstance(cues, str):
+            cues = load_cues(cues)
+
+        video = VideoFileClip(input_path)
+
+        # Rasterize each distinct caption/style once: premultiplied color plus alpha
+        sprites = {}
+        timeline = []
+        for cue in sorted(cues, key=lambda c: c['start']):
+            style = (
+                cue['text'],
+                cue.get('font_size', font_size),
+                cue.get('color', color),
+                cue.get('font', font),
+                cue.get('stroke_color', stroke_color),
+                cue.get('stroke_width', stroke_width),
+                cue.get('position', position),
+            )
+            if style not in sprites:
+                txt_clip = TextClip(
+                    style[0],
+                    fontsize=style[1],
+                    color=style[2],
+                    font=style[3],
+                    stroke_color=style[4],
+                    stroke_width=style[5]
+                )
+                rgb = txt_clip.get_frame(0).astype(np.float32)
+                alpha = txt_clip.mask.get_frame(0).astype(np.float32)[:, :, None]
+                txt_clip.close()
+
+                h, w = alpha.shape[:2]
+                x, y = _resolve_position(style[6], video.w, video.h, w, h)
+
+                # Clip the sprite to the frame
+                x0, y0 = max(x, 0), max(y, 0)
+                x1, y1 = min(x + w, video.w), min(y + h, video.h)
+                if x1 <= x0 or y1 <= y0:
+                    print(f"Warning: Caption is outside the frame, skipping: {style[0]!r}")
+                    sprites[style] = None
+                    continue
+                alpha = alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+                sprites[style] = (x0, y0, x1, y1, rgb[y0 - y:y1 - y, x0 - x:x1 - x] * alpha, 1.0 - alpha)
+
+            if sprites[style] is not None:
+                timeline.append((cue['start'], cue['end'], sprites[style]))
+
+        starts = [start for start, _, _ in timeline]
+
+        def burn_captions(get_frame, t):
+            frame = get_frame(t)
+            # Only cues that started by t are candidates; keep those that haven't ended
+            active = [sprite for start, end, sprite in timeline[:bisect.bisect_right(starts, t)] if t < end]
+            if not active:
+                return frame
+            frame = frame.copy()
+            for x0, y0, x1, y1, premultiplied, inverse_alpha in active:
+                roi = frame[y0:y1, x0:x1]
+                roi[:] = (roi * inverse_alpha + premultiplied).astype(np.uint8)
+            return frame
+
+        captioned = video.fl(burn_captions)
+
+        # Single encode for all captions
+        captioned.write_videofile(
             output_path,
             codec='libx264',
             audio_codec='aac'
@@ -66,13 +230,13 @@ def add_text_overlay(input_path, output_path, text, font_size=70, color='white',
 
         # Clean up
         video.close()
-        txt_clip.close()
-        video_with_text.close()
+        captioned.close()
 
-        print(f"Text overlay added successfully and saved to: {output_path}")
+        print(f"{len(timeline)} captions added successfully and saved to: {output_path}")
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        raise
 
 if __name__ == "__main__":
     # Example usage: Add text to a specific file
@@ -105,4 +269,18 @@ if __name__ == "__main__":
         font_size=50,
         color='White',
         position=('center', 'bottom') # Top-right position
-    ) 
\ No newline at end of file
+    ) 
+
+    # Example usage: all recipe steps burned in with one encode
+    # add_timed_captions(
+    #     input_path=r"C:\data\zomato\receipe\Channamasala\concatenated_final.mp4",
+    #     output_path=r"C:\data\zomato\receipe\Channamasala\captioned_final.mp4",
+    #     cues=[
+    #         {'start': 0.0, 'end': 4.0, 'text': "Saute the Onion, Wholespices,\n Ginger-Garlic Paste in Oil \n Till Golden Brown at Medium Flame"},
+    #         {'start': 4.0, 'end': 8.0, 'text': "Boil the Chickpeas until soft \n 15-18 Minutes"},
+    #         {'start': 8.0, 'end': 11.0, 'text': "Garnish and Serve"},
+    #     ],
+    #     font_size=50,
+    #     color='White',
+    #     position=('center', 'bottom')
+    # )
\ No newline at end of file
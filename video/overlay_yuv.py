@@ -0,0 +1,230 @@
+import cv2
+import numpy as np
+import os
+from tqdm import tqdm
+
+from ffmpeg_runner import FFmpegPipe, probe_video
+from seek_index import count_frames
+
+# Limited-range RGB -> YUV matrices (rows: Y, U, V; columns: R, G, B) and offsets
+YUV_MATRICES = {
+    'bt601': np.array([[0.257, 0.504, 0.098],
+                       [-0.148, -0.291, 0.439],
+                       [0.439, -0.368, -0.071]], dtype=np.float32),
+    'bt709': np.array([[0.183, 0.614, 0.062],
+                       [-0.101, -0.339, 0.439],
+                       [0.439, -0.399, -0.040]], dtype=np.float32),
+}
+YUV_OFFSETS = np.array([16, 128, 128], dtype=np.float32)
+
+def sprite_to_yuv420(sprite, matrix='bt709'):
+    """
+    Pre-convert a BGR/BGRA sprite (logo, rendered text) to premultiplied yuv420p planes
+
+    Chroma and alpha are subsampled 2x2 to match the video's chroma planes. Values are
+    premultiplied by alpha so blending is one multiply-add per sample.
+
+    Args:
+        sprite (numpy.ndarray): BGR or BGRA image; odd width/height are cropped by one pixel
+        matrix (str): 'bt709' (HD) or 'bt601' (SD) (default: 'bt709')
+
+    Returns:
+        list: [(premultiplied, inverse_alpha)] for the Y, U and V planes, as uint32 arrays
+              where inverse_alpha is 255 - alpha
+    """
+    h, w = sprite.shape[:2]
+    sprite = sprite[:h - h % 2, :w - w % 2]
+
+    if sprite.shape[2] == 4:
+        alpha = sprite[:, :, 3].astype(np.float32)
+    else:
+        alpha = np.full(sprite.shape[:2], 255.0, dtype=np.float32)
+
+    rgb = sprite[:, :, 2::-1].astype(np.float32)
+    yuv = rgb @ YUV_MATRICES[matrix].T + YUV_OFFSETS
+
+    def subsample(plane):
+        return (plane[0::2, 0::2] + plane[1::2, 0::2] + plane[0::2, 1::2] + plane[1::2, 1::2]) / 4.0
+
+    alpha_sub = subsample(alpha)
+    planes = [
+        (yuv[:, :, 0] * alpha, alpha),
+        # Average premultiplied chroma so transparent pixels don't tint the edges
+        (subsample(yuv[:, :, 1] * alpha), alpha_sub),
+        (subsample(yuv[:, :, 2] * alpha), alpha_sub),
+    ]
+    return [(np.round(premultiplied).astype(np.uint32), (255 - np.round(a)).astype(np.uint32))
+            for premultiplied, a in planes]
+
+def blend_yuv420(planes, sprite_planes, x, y):
+    """
+    Blend a pre-converted sprite into yuv420p planes in place, with integer math
+
+    Args:
+        planes (list): [Y, U, V] uint8 arrays of one frame
+        sprite_planes (list): Output of sprite_to_yuv420
+        x (int): Left edge of the sprite in luma pixels (must be even)
+        y (int): Top edge of the sprite in luma pixels (must be even)
+    """
+    for i, (plane, (premultiplied, inverse_alpha)) in enumerate(zip(planes, sprite_planes)):
+        px, py = (x, y) if i == 0 else (x // 2, y // 2)
+        h, w = premultiplied.shape
+        roi = plane[py:py + h, px:px + w]
+        roi[:] = (roi * inverse_alpha + premultiplied + 127) // 255
+
+def add_overlay_yuv(input_path, output_path, sprite, x, y, crf=18, preset='medium'):
+    """
+    Overlay a BGR/BGRA sprite on a video directly in yuv420p, without BGR conversion
+
+    Frames are read as raw yuv420p planes from an FFmpeg decoder pipe, the sprite is
+    blended onto the planes and they are piped straight into the encoder. The
+    original audio is copied.
+
+    Args:
+        input_path (str): Path to the input video file
+        output_path (str): Path where the output video will be saved
+        sprite (numpy.ndarray): BGR or BGRA image to overlay
+        x (int): Left edge of the sprite in pixels (rounded down to even)
+        y (int): Top edge of the sprite in pixels (rounded down to even)
+        crf (int): x264 constant rate factor (default: 18)
+        preset (str): x264 preset (default: 'medium')
+    """
+    info = probe_video(input_path)
+    width, height = info['width'], info['height']
+    if width % 2 or height % 2:
+        raise ValueError(f"yuv420p needs even dimensions, got {width}x{height}")
+
+    sprite_planes = sprite_to_yuv420(sprite, 'bt709' if height >= 720 else 'bt601')
+    sprite_h, sprite_w = sprite_planes[0][0].shape
+    if sprite_w > width or sprite_h > height:
+        raise ValueError(f"Overlay {sprite_w}x{sprite_h} is larger than the video {width}x{height}")
+
+    # Chroma is subsampled, so the sprite has to start on an even pixel and fit in the frame
+    x = max(0, min(x, width - sprite_w)) & ~1
+    y = max(0, min(y, height - sprite_h)) & ~1
+
+    decoder = FFmpegPipe([
+        '-i', input_path,
+        '-map', '0:v:0',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'yuv420p',
+        'pipe:1'
+    ], stdout='pipe')
+    encoder = FFmpegPipe([
+        '-f', 'rawvideo',
+        '-pix_fmt', 'yuv420p',
+        '-s', f'{width}x{height}',
+        '-r', f"{info['fps']:.6f}",
+        '-i', 'pipe:0',
+        '-i', input_path,
+        '-map', '0:v:0',
+        '-map', '1:a?',
+        '-c:v', 'libx264',
+        '-preset', preset,
+        '-crf', str(crf),
+        '-pix_fmt', 'yuv420p',
+        '-c:a', 'copy',
+        '-movflags', '+faststart',
+        '-y',
+        output_path
+    ], stdin='pipe')
+
+    # One reusable frame buffer with numpy views on its three planes
+    luma_size = width * height
+    chroma_size = luma_size // 4
+    buffer = bytearray(luma_size + 2 * chroma_size)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    planes = [
+        data[:luma_size].reshape(height, width),
+        data[luma_size:luma_size + chroma_size].reshape(height // 2, width // 2),
+        data[luma_size + chroma_size:].reshape(height // 2, width // 2),
+    ]
+
+    pbar = tqdm(total=count_frames(input_path, fallback=int(info['duration'] * info['fps'])),
+                desc='Adding overlay (YUV)')
+    try:
+        while decoder.readinto(buffer):
+            blend_yuv420(planes, sprite_planes, x, y)
+            encoder.write(buffer)
+            pbar.update(1)
+    except Exception:
+        decoder.close(kill=True)
+        encoder.close(kill=True)
+        raise
+    finally:
+        pbar.close()
+
+    # A decoder that failed mid-stream just ends the loop early: don't finish the encode
+    decoded = False
+    try:
+        decoder.close()
+        decoded = True
+    finally:
+        encoder.close(kill=not decoded)
+
+def add_logo_yuv(input_path, output_path, logo_path, position='top-left', size=None, padding=5):
+    """
+    Add logo overlay to a video file in the YUV domain (same options as add_logo_cv2)
+
+    Args:
+        input_path (str): Path to the input video file
+        output_path (str): Path where the output video will be saved
+        logo_path (str): Path to the logo file (preferably PNG with transparency)
+        position (str): Position of logo - 'top-left', 'top-right', 'bottom-left', 'bottom-right'
+        size (tuple): Optional (width, height) to resize the logo. If None, original size is kept
+        padding (int): Padding from edges in pixels (default: 5)
+    """
+    try:
+        # Verify logo file exists
+        if not os.path.exists(logo_path):
+            raise FileNotFoundError(f"Logo file not found: {logo_path}")
+
+        # Read the logo
+        logo = cv2.imread(logo_path, cv2.IMREAD_UNCHANGED)
+        if logo is None:
+            raise IOError(f"Cannot read logo file: {logo_path}")
+        if logo.ndim == 2:
+            logo = cv2.cvtColor(logo, cv2.COLOR_GRAY2BGR)
+
+        # Resize logo if size is specified
+        if size:
+            logo = cv2.resize(logo, size, interpolation=cv2.INTER_AREA)
+
+        info = probe_video(input_path)
+        width, height = info['width'], info['height']
+        logo_h, logo_w = logo.shape[:2]
+
+        # Calculate logo position
+        if position == 'top-left':
+            x, y = padding, padding
+        elif position == 'top-right':
+            x, y = width - logo_w - padding, padding
+        elif position == 'bottom-left':
+            x, y = padding, height - logo_h - padding
+        elif position == 'bottom-right':
+            x, y = width - logo_w - padding, height - logo_h - padding
+        else: # Default to top-left if position is invalid
+            print(f"Warning: Invalid position '{position}'. Defaulting to 'top-left'.")
+            x, y = padding, padding
+
+        add_overlay_yuv(input_path, output_path, logo, x, y)
+
+        print(f"Logo overlay added successfully in YUV and saved to: {output_path}")
+
+    except Exception as e:
+        print(f"An error occurred in add_logo_yuv: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    # Example usage
+    input_video = r"C:\data\hero\some_input_video.mp4" # Input video path
+    output_video = r"C:\data\hero\output_with_logo_yuv.mp4" # Output video path
+    logo_path = r"C:\data\hero\hero-logo.png"    # Logo file path
+
+    add_logo_yuv(
+        input_path=input_video,
+        output_path=output_video,
+        logo_path=logo_path,
+        position='top-left',
+        size=(100, 100)
+    )
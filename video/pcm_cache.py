@@ -0,0 +1,124 @@
+import os
+import shutil
+import uuid
+import numpy as np
+from moviepy.editor import AudioClip
+
+from cache_utils import file_digest, touch, enforce_budget
+from ffmpeg_runner import run_ffmpeg
+
+PCM_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'pcm')
+PCM_CACHE_BUDGET = 2 * 1024 ** 3  # 2 GiB
+
+def pcm_cache_path(audio_path, fps=44100, nchannels=2, cache_dir=PCM_CACHE_DIR):
+    """Returns the cache file for a track, keyed by content hash, sample rate and channel layout."""
+    return os.path.join(cache_dir, f"{file_digest(audio_path)}_{fps}hz_{nchannels}ch.npy")
+
+def decode_pcm(audio_path, output_path, fps=44100, nchannels=2):
+    """
+    Decode and resample an audio file to float32 PCM stored as a .npy file
+
+    The samples are streamed from FFmpeg straight to disk, so the whole track never
+    has to fit in memory.
+
+    Args:
+        audio_path (str): Path to the audio file (mp3, wav, etc.)
+        output_path (str): Where to save the .npy file
+        fps (int): Sample rate in Hz (default: 44100)
+        nchannels (int): Number of channels (default: 2)
+    """
+    raw_path = output_path + f'.{uuid.uuid4().hex}.raw'
+    tmp_path = output_path + f'.{uuid.uuid4().hex}.tmp'
+    try:
+        run_ffmpeg([
+            '-i', audio_path,
+            '-vn',
+            '-f', 'f32le',
+            '-acodec', 'pcm_f32le',
+            '-ac', str(nchannels),
+            '-ar', str(fps),
+            '-y',
+            raw_path
+        ])
+
+        # Prepend a .npy header to the raw samples so they can be memory-mapped with np.load
+        frame_bytes = 4 * nchannels
+        nframes = os.path.getsize(raw_path) // frame_bytes
+        with open(tmp_path, 'wb') as out, open(raw_path, 'rb') as raw:
+            np.lib.format.write_array_header_1_0(out, {
+                'descr': '<f4',
+                'fortran_order': False,
+                'shape': (nframes, nchannels),
+            })
+            shutil.copyfileobj(raw, out, length=16 * 1024 * 1024)
+            out.truncate(out.tell() - (os.path.getsize(raw_path) - nframes * frame_bytes))
+
+        # Atomic so concurrent jobs never see a half written entry
+        os.replace(tmp_path, output_path)
+    finally:
+        for path in (raw_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+def load_pcm(audio_path, fps=44100, nchannels=2, cache_dir=PCM_CACHE_DIR, budget=PCM_CACHE_BUDGET):
+    """
+    Get the decoded samples of an audio file, decoding it only on first use
+
+    Args:
+        audio_path (str): Path to the audio file (mp3, wav, etc.)
+        fps (int): Sample rate in Hz (default: 44100)
+        nchannels (int): Number of channels (default: 2)
+        cache_dir (str): Cache folder (default: cache/pcm next to this file)
+        budget (int): Disk budget of the cache in bytes; least recently used tracks are evicted
+
+    Returns:
+        numpy.memmap: Read-only (samples, channels) float32 array
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = pcm_cache_path(audio_path, fps, nchannels, cache_dir)
+
+    if os.path.exists(cache_path):
+        touch(cache_path)
+    else:
+        decode_pcm(audio_path, cache_path, fps, nchannels)
+        enforce_budget(cache_dir, budget, keep=[cache_path])
+
+    return np.load(cache_path, mmap_mode='r')
+
+def cached_audio_clip(audio_path, duration=None, fps=44100, nchannels=2, loop=False):
+    """
+    MoviePy AudioClip that reads samples directly from the PCM cache
+
+    Only the samples MoviePy asks for are paged in from the memory map, and looping
+    is done by index arithmetic instead of concatenating copies of the track.
+
+    Args:
+        audio_path (str): Path to the audio file (mp3, wav, etc.)
+        duration (float): Clip duration in seconds (default: length of the track)
+        fps (int): Sample rate in Hz (default: 44100)
+        nchannels (int): Number of channels (default: 2)
+        loop (bool): Repeat the track to fill the duration (default: False)
+    """
+    pcm = load_pcm(audio_path, fps, nchannels)
+    nframes = len(pcm)
+    if nframes == 0:
+        raise ValueError(f"No audio samples decoded from: {audio_path}")
+
+    def make_frame(t):
+        index = np.round(np.asarray(t) * fps).astype(np.int64)
+        if loop:
+            return pcm[index % nframes]
+        # Silence past the end of the track
+        inside = (index >= 0) & (index < nframes)
+        return np.where(inside[..., None], pcm[np.clip(index, 0, nframes - 1)], 0.0)
+
+    if duration is None:
+        duration = nframes / fps
+    return AudioClip(make_frame, duration=duration, fps=fps)
+
+if __name__ == "__main__":
+    # Example usage: the first call decodes, later calls just map the cached samples
+    music_path = r"C:\data\zomato\receipe\Noodles\s2.wav"
+
+    pcm = load_pcm(music_path)
+    print(f"Samples: {pcm.shape[0]}, channels: {pcm.shape[1]}, duration: {pcm.shape[0] / 44100:.2f}s")
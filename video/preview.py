@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import uuid
+
+from cache_utils import file_version, touch, enforce_budget
+from ffmpeg_runner import probe_video_cached, run_ffmpeg
+from seek_index import load_seek_index, frame_at_time, nearest_keyframe
+
+PREVIEW_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'previews')
+PREVIEW_CACHE_BUDGET = 1024 ** 3  # 1 GiB
+PREVIEW_HEIGHT = 360
+
+_X = {'left': '{padding}', 'center': '(W-w)/2', 'right': 'W-w-{padding}'}
+_Y = {'top': '{padding}', 'center': '(H-h)/2', 'bottom': 'H-h-{padding}'}
+
+def _pixel(value):
+    """True for an int pixel offset (bool is an int too, but never a position)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def overlay_xy(position, padding):
+    """
+    ffmpeg overlay x/y expressions for a position, mirroring the full-render tools
+
+    Accepts 'center', 'top', 'bottom', 'left', 'right', ('right', 'top') style tuples,
+    'top-right' style logo positions and (x, y) int pixel tuples (already scaled to the
+    preview). The result goes into a filtergraph, so anything else raises ValueError.
+    """
+    if position == 'center':
+        position = ('center', 'center')
+    elif position in ('top', 'bottom'):
+        position = ('center', position)
+    elif position in ('left', 'right'):
+        position = (position, 'center')
+    elif position in ('top-left', 'top-right', 'bottom-left', 'bottom-right'):
+        vertical, horizontal = position.split('-')
+        position = (horizontal, vertical)
+
+    if not isinstance(position, (tuple, list)) or len(position) != 2:
+        raise ValueError(f"Invalid position: {position!r}")
+    horizontal, vertical = position
+    if not _pixel(padding):
+        raise ValueError(f"Invalid padding: {padding!r}")
+    return _axis(horizontal, _X, padding, position), _axis(vertical, _Y, padding, position)
+
+def _axis(value, names, padding, position):
+    if _pixel(value):
+        return str(value)
+    if isinstance(value, str) and value in names:
+        return names[value].format(padding=padding)
+    raise ValueError(f"Invalid position: {position!r}")
+
+def _scale_position(position, scale):
+    """Scales (x, y) pixel positions to the preview size; named positions are left alone."""
+    if isinstance(position, (tuple, list)) and all(isinstance(v, (int, float)) for v in position):
+        return tuple(int(round(v * scale)) for v in position)
+    return position
+
+def text_sprite(params, scale, cache_dir):
+    """Renders the caption once with the same TextClip settings as the full render (cached PNG)."""
+    font_size = max(8, int(round(params.get('font_size', 70) * scale)))
+    style = {
+        'text': params.get('text', 'Default Text'),
+        'font_size': font_size,
+        'color': params.get('color', 'white'),
+        'font': params.get('font', 'Arial-Bold-Italic'),
+        'stroke_color': params.get('stroke_color', 'black'),
+        'stroke_width': max(1, int(round(params.get('stroke_width', 2) * scale))),
+    }
+    key = hashlib.sha1(json.dumps(style, sort_keys=True).encode('utf-8')).hexdigest()
+    sprite_path = os.path.join(cache_dir, f"text_{key}.png")
+    if os.path.exists(sprite_path):
+        touch(sprite_path)
+        return sprite_path
+
+    from moviepy.editor import TextClip
+    from config import configure_imagemagick
+    configure_imagemagick()
+
+    clip = TextClip(style['text'], fontsize=style['font_size'], color=style['color'], font=style['font'],
+                    stroke_color=style['stroke_color'], stroke_width=style['stroke_width'])
+    tmp_path = sprite_path + f'.{uuid.uuid4().hex}.png'
+    clip.save_frame(tmp_path, withmask=True)
+    clip.close()
+    os.replace(tmp_path, sprite_path)
+    return sprite_path
+
+def _preview_key(input_path, task, params, start, window, height, still):
+    """Cache key of a preview: every input file version (hashing a long upload would cost more than the preview) plus all the settings."""
+    files = {name: file_version(path) for name, path in params.items() if name.endswith('_path') and path}
+    settings = {name: value for name, value in params.items() if not name.endswith('_path')}
+    payload = json.dumps([file_version(input_path), task, settings, files, round(start, 3), window, height, still],
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def render_preview(input_path, task=None, params=None, at=0.0, window=3.0, height=PREVIEW_HEIGHT,
+                   still=False, cache_dir=PREVIEW_CACHE_DIR):
+    """
+    Render a short, low-resolution preview of an edit around a timestamp
+
+    Only the requested window is decoded: the seek index gives the keyframe to start
+    from, the probe is memoized, the frames are scaled down before the edit is applied
+    and encoded with the fastest x264 preset. Results are cached, so toggling back to
+    earlier settings is instant.
+
+    Args:
+        input_path (str): Path to the source video
+        task (str): 'text', 'logo', 'audio' or None for the plain window
+        params (dict): Edit settings, same meaning as in the full-render functions:
+                       text: text, font_size, color, position, font, stroke_color, stroke_width
+                       logo: logo_path, position, size (w, h), padding
+                       audio: audio_path, video_volume, music_volume
+        at (float): Timestamp in seconds the preview is centered on
+        window (float): Length of the preview clip in seconds (default: 3)
+        height (int): Preview height in pixels (default: 360)
+        still (bool): Return a single JPEG frame at `at` instead of a clip
+        cache_dir (str): Preview cache folder
+
+    Returns:
+        str: Path of the cached preview (.mp4 or .jpg)
+    """
+    params = dict(params or {})
+    os.makedirs(cache_dir, exist_ok=True)
+
+    info = probe_video_cached(input_path)
+    duration = info['duration']
+    height = min(height, info['height']) - (min(height, info['height']) % 2)
+    scale = height / info['height']
+
+    start = max(0.0, at if still else min(at - window / 2, duration - window))
+    preview_path = os.path.join(
+        cache_dir, _preview_key(input_path, task, params, start, window, height, still) + ('.jpg' if still else '.mp4'))
+    if os.path.exists(preview_path):
+        touch(preview_path)
+        return preview_path
+
+    # Input seek to the keyframe at or before the window, then an exact output-side offset
+    index = load_seek_index(input_path)
+    _, keyframe_pts = nearest_keyframe(index, frame_at_time(index, start))
+    offset = start - keyframe_pts
+
+    args = ['-ss', f'{keyframe_pts:.6f}', '-i', input_path]
+    filters = [f'[0:v]scale=-2:{height}[base]']
+    video_out = '[base]'
+    audio_map = ['-map', '0:a?']
+
+    if task == 'text':
+        sprite_path = text_sprite(params, scale, cache_dir)
+        args += ['-i', sprite_path]
+        x, y = overlay_xy(_scale_position(params.get('position', 'center'), scale), max(1, round(5 * scale)))
+        filters.append(f'[base][1:v]overlay={x}:{y}[v]')
+        video_out = '[v]'
+    elif task == 'logo':
+        args += ['-i', params['logo_path']]
+        size = params.get('size')
+        logo_scale = (f'{max(2, round(size[0] * scale))}:{max(2, round(size[1] * scale))}' if size
+                      else f'iw*{scale:.6f}:ih*{scale:.6f}')
+        padding = max(1, round(params.get('padding', 5) * scale))
+        x, y = overlay_xy(params.get('position', 'top-left'), padding)
+        filters.append(f'[1:v]scale={logo_scale}[logo]')
+        filters.append(f'[base][logo]overlay={x}:{y}[v]')
+        video_out = '[v]'
+    elif task == 'audio' and not still:
+        # The music starts with the video and loops; line it up with the keyframe the video
+        # input starts from, since the output-side offset trims both streams
+        music_duration = probe_video_cached(params['audio_path'])['duration']
+        music_offset = keyframe_pts % music_duration if music_duration else 0.0
+        args += ['-stream_loop', '-1', '-ss', f'{music_offset:.6f}', '-i', params['audio_path']]
+        music = f"[1:a]volume={params.get('music_volume', 1.0)}"
+        video_volume = params.get('video_volume', 0.0)
+        if video_volume > 0 and info['has_audio']:
+            filters.append(f'{music}[music]')
+            filters.append(f'[0:a]volume={video_volume}[orig]')
+            filters.append('[orig][music]amix=inputs=2:duration=first:normalize=0[a]')
+        else:
+            filters.append(f'{music}[a]')
+        audio_map = ['-map', '[a]']
+
+    args += ['-ss', f'{offset:.6f}', '-filter_complex', ';'.join(filters), '-map', video_out]
+    tmp_path = preview_path + f'.{uuid.uuid4().hex}' + ('.jpg' if still else '.mp4')
+    if still:
+        args += ['-frames:v', '1', '-q:v', '3', '-y', tmp_path]
+    else:
+        args += audio_map + [
+            '-t', f'{window:.3f}',
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-tune', 'zerolatency',
+            '-crf', '28',
+            '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac',
+            '-b:a', '96k',
+            '-movflags', '+faststart',
+            '-y', tmp_path
+        ]
+
+    try:
+        run_ffmpeg(args)
+        os.replace(tmp_path, preview_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    enforce_budget(cache_dir, PREVIEW_CACHE_BUDGET, keep=[preview_path])
+    return preview_path
+
+if __name__ == "__main__":
+    # Example usage: 3 seconds around 0:42 with a caption, and a still of the logo placement
+    input_video = r"C:\data\hero\trim-s1.mp4"
+
+    print(render_preview(input_video, 'text', {'text': 'Hero Xoom 160', 'font_size': 70, 'color': 'Red',
+                                               'position': ('right', 'top')}, at=42.0))
+    print(render_preview(input_video, 'logo', {'logo_path': r"C:\data\hero\hero-logo.png", 'size': (100, 100)},
+                         at=42.0, still=True))
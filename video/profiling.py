@@ -0,0 +1,233 @@
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from ffmpeg_runner import CHILD_STATS
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# tracemalloc is process-wide; it runs while at least one profiled job needs it
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+def _start_tracemalloc(frames):
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+
+def _stop_tracemalloc():
+    """Stops tracing after the last profiled job, unless it was already on (PYTHONTRACEMALLOC)."""
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+
+def _children_cpu():
+    """User+system seconds of all waited-for child processes, or None where unavailable."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval into collapsed-stack counts
+
+    The output ('frame;frame;frame count' per line, root first) is the input format of
+    flamegraph.pl, speedscope and inferno. Unlike cProfile it shows where the time goes
+    inside long-running calls, such as a MoviePy write_videofile loop.
+    """
+
+    def __init__(self, thread_id, interval=0.005, memory_every=0.5):
+        """
+        Args:
+            thread_id (int): threading.get_ident() of the thread to sample
+            interval (float): Seconds between samples (default: 5 ms)
+            memory_every (float): Seconds between tracemalloc readings (default: 0.5)
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.memory_every = memory_every
+        self.stacks = {}
+        self.memory = []  # (seconds since start, traced bytes)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        started = time.monotonic()
+        next_memory = started
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            now = time.monotonic()
+            if now >= next_memory and tracemalloc.is_tracing():
+                self.memory.append((round(now - started, 3), tracemalloc.get_traced_memory()[0]))
+                next_memory = now + self.memory_every
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+class ProfileSession:
+    """Result of profile_job: the output files and the summary, filled in when the job ends."""
+
+    def __init__(self, output_dir, name):
+        self.output_dir = output_dir
+        self.name = name  # May be changed inside the with block, e.g. once the output name is known
+        self.files = []
+        self.summary = {}
+
+    def path(self, suffix):
+        return os.path.join(self.output_dir, f"{self.name}{suffix}")
+
+@contextlib.contextmanager
+def profile_job(output_dir, name=None, enabled=True, interval=0.005, memory=True, memory_frames=1):
+    """
+    Profile the code in the with block and store the results next to the job output
+
+    Writes, for <output_dir>/<name>:
+        .pstats           cProfile data (python -m pstats, snakeviz)
+        .folded           collapsed stacks from a sampling thread (flamegraph.pl, speedscope)
+        .memory.txt       top allocation sites and the traced-memory timeline (tracemalloc)
+        .profile.json     wall/CPU time, child process CPU time and every ffmpeg call's own
+                          CPU time and peak memory (ffmpeg -benchmark)
+
+    Only the calling thread is profiled; work in frame_ring worker processes shows up in the
+    child CPU time. tracemalloc is process-wide, so allocations of concurrent jobs in the
+    same server process are included, and it slows allocation-heavy Python code down.
+
+    Args:
+        output_dir (str): Folder for the profile files (e.g. the folder of the job output)
+        name (str): File name prefix (default: job_<timestamp>)
+        enabled (bool): With False the block runs unprofiled (handy for a CLI flag or request header)
+        interval (float): Stack sampling interval in seconds (default: 5 ms)
+        memory (bool): Also trace allocations with tracemalloc (default: True)
+        memory_frames (int): Traceback depth kept per allocation (default: 1; deeper is much slower)
+
+    Yields:
+        ProfileSession, or None when disabled
+    """
+    if not enabled:
+        yield None
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    session = ProfileSession(output_dir, name or time.strftime('job_%Y%m%d_%H%M%S'))
+    child_stats = []
+    token = CHILD_STATS.set(child_stats)
+    if memory:
+        _start_tracemalloc(memory_frames)
+    sampler = StackSampler(threading.get_ident(), interval)
+    profiler = cProfile.Profile()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    children_start = _children_cpu()
+    error = None
+    sampler.start()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one cProfile at a time; concurrent jobs still get the sampler
+        print(f"Warning: Another profiler is active, {session.name} gets sampled stacks only")
+        profiler = None
+    try:
+        yield session
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        sampler.stop()
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        children_end = _children_cpu()
+        CHILD_STATS.reset(token)
+        snapshot = peak = None
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            _stop_tracemalloc()
+
+        try:
+            if profiler:
+                profiler.dump_stats(session.path('.pstats'))
+                session.files.append(session.path('.pstats'))
+            sampler.write_collapsed(session.path('.folded'))
+            session.files.append(session.path('.folded'))
+
+            if snapshot is not None:
+                with open(session.path('.memory.txt'), 'w', encoding='utf-8') as f:
+                    f.write(f"Peak traced memory: {peak / 1024 ** 2:.1f} MiB\n\nTop allocation sites:\n")
+                    for stat in snapshot.statistics('lineno')[:30]:
+                        f.write(f"{stat}\n")
+                    f.write("\nTraced memory over time (seconds, MiB):\n")
+                    for t, current in sampler.memory:
+                        f.write(f"{t:8.3f} {current / 1024 ** 2:10.1f}\n")
+                session.files.append(session.path('.memory.txt'))
+
+            ffmpeg_cpu = sum((stat['utime'] or 0) + (stat['stime'] or 0) for stat in child_stats)
+            session.summary = {
+                'name': session.name,
+                'error': error,
+                'wall_seconds': round(wall, 3),
+                'python_cpu_seconds': round(cpu, 3),
+                # Process-wide: includes children of concurrent jobs in a threaded server
+                'children_cpu_seconds': round(children_end - children_start, 3) if children_start is not None else None,
+                'ffmpeg_cpu_seconds': round(ffmpeg_cpu, 3),
+                'ffmpeg_calls': child_stats,
+                'peak_traced_bytes': peak,
+                'samples': sum(sampler.stacks.values()),
+            }
+            with open(session.path('.profile.json'), 'w', encoding='utf-8') as f:
+                json.dump(session.summary, f, indent=2)
+            session.files.append(session.path('.profile.json'))
+        except Exception as e:
+            print(f"Warning: Could not write profile {session.name}: {e}")
+
+def print_top(pstats_path, limit=25, sort='cumulative'):
+    """Prints the hottest functions of a saved profile."""
+    import pstats
+    pstats.Stats(pstats_path).sort_stats(sort).print_stats(limit)
+
+if __name__ == "__main__":
+    # Example usage: profile one logo job and show where its time went
+    from overlay_image import add_logo_cv2
+
+    output_video = r"C:\data\hero\logo-profiled.mp4"
+    with profile_job(os.path.dirname(output_video), 'logo-profiled') as session:
+        add_logo_cv2(r"C:\data\hero\trim-s1.mp4", output_video, r"C:\data\hero\hero-logo.png", size=(100, 100))
+
+    print(json.dumps({key: value for key, value in session.summary.items() if key != 'ffmpeg_calls'}, indent=2))
+    print_top(session.path('.pstats'))
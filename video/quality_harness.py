@@ -0,0 +1,447 @@
+# Quality regression harness for the fast paths: python quality_harness.py [--case NAME ...]
+#
+# Renders the same synthetic inputs (lavfi test pattern with pink noise, a music track and
+# a soft-edged logo) through the reference MoviePy/OpenCV implementation and through each
+# optimized path, then compares the outputs frame by frame (PSNR and SSIM on luma) and
+# checks that the audio is still sample-aligned (cross-correlation). A case fails when a
+# tolerance is exceeded; the report puts the speedup next to the quality numbers.
+import argparse
+import functools
+import json
+import os
+import shutil
+import sys
+import time
+import cv2
+import numpy as np
+
+from ffmpeg_runner import FFmpegPipe, probe_video_cached, run_ffmpeg
+
+HARNESS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'quality')
+
+# Default limits; cases and the command line can override any of them
+TOLERANCES = {
+    'min_psnr': 35.0,            # dB, mean over all frames
+    'min_frame_psnr': 30.0,      # dB, worst single frame
+    'min_ssim': 0.95,            # Mean over all frames
+    'max_frame_diff': 1,         # Frame count difference
+    'max_audio_offset_ms': 1.0,  # Lag of the candidate audio against the reference
+    'min_audio_corr': 0.9,       # Normalized cross-correlation at that lag
+}
+
+AUDIO_RATE = 48000
+
+# name -> reference dict and name -> case dict, see register_reference / register_case
+REFERENCES = {}
+CASES = {}
+
+def register_reference(name, run):
+    """
+    Register a reference render
+
+    Args:
+        name (str): Reference name, used by register_case
+        run (callable): run(media, output_path) renders the reference output
+    """
+    REFERENCES[name] = {'name': name, 'run': run}
+
+def register_case(name, reference, run, **tolerances):
+    """
+    Register an optimized path to check against a reference
+
+    Args:
+        name (str): Case name
+        reference (str): Name of the reference it must match
+        run (callable): run(media, output_path) renders the candidate output
+        **tolerances: Overrides of TOLERANCES for this case
+    """
+    unknown = set(tolerances) - set(TOLERANCES)
+    if unknown:
+        raise ValueError(f"Unknown tolerances: {', '.join(sorted(unknown))}")
+    CASES[name] = {'name': name, 'reference': reference, 'run': run, 'tolerances': tolerances}
+
+def make_inputs(media_dir, duration=6, size=(640, 360), fps=30):
+    """
+    Synthetic inputs shared by all cases (reused if they already exist)
+
+    The video has a keyframe every second, so trims can start on and between keyframes,
+    and pink-noise audio, which cross-correlates to a single sharp peak (a tone would
+    match at every period). The music is shorter than the video so it has to loop.
+
+    Returns:
+        dict: 'video', 'music' and 'logo' paths
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    width, height = size
+    media = {
+        'video': os.path.join(media_dir, f"source_{width}x{height}_{duration}s.mp4"),
+        'music': os.path.join(media_dir, 'music.wav'),
+        'logo': os.path.join(media_dir, 'logo.png'),
+    }
+
+    if not os.path.exists(media['video']):
+        run_ffmpeg([
+            '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={fps}:duration={duration}',
+            '-f', 'lavfi', '-i', f'anoisesrc=color=pink:amplitude=0.3:seed=7:sample_rate={AUDIO_RATE}:duration={duration}',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '16', '-pix_fmt', 'yuv420p',
+            '-g', str(fps), '-keyint_min', str(fps), '-sc_threshold', '0',
+            '-c:a', 'aac', '-b:a', '192k', '-shortest',
+            '-y', media['video']
+        ])
+    if not os.path.exists(media['music']):
+        run_ffmpeg(['-f', 'lavfi', '-i', f'anoisesrc=color=brown:amplitude=0.5:seed=11:sample_rate={AUDIO_RATE}:'
+                    f'duration={duration / 2}', '-y', media['music']])
+    if not os.path.exists(media['logo']):
+        # Opaque core, soft edge and a half-transparent band: exercises every alpha value
+        yy, xx = np.mgrid[0:96, 0:96]
+        radius = np.hypot(xx - 47.5, yy - 47.5)
+        logo = np.zeros((96, 96, 4), dtype=np.uint8)
+        logo[..., 0] = 40
+        logo[..., 1] = np.linspace(0, 255, 96, dtype=np.uint8)[None, :]
+        logo[..., 2] = 230
+        logo[..., 3] = np.clip((44 - radius) * 32, 0, 255).astype(np.uint8)
+        logo[40:56, :, 3] //= 2
+        cv2.imwrite(media['logo'], logo)
+    return media
+
+def psnr(a, b):
+    """PSNR in dB of two uint8 frames (100 for identical frames)."""
+    mse = np.mean((a.astype(np.float64) - b) ** 2)
+    return 100.0 if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+def ssim(a, b):
+    """Mean SSIM of two gray uint8 frames (11x11 Gaussian window, sigma 1.5)."""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    blur = functools.partial(cv2.GaussianBlur, ksize=(11, 11), sigmaX=1.5)
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a ** 2
+    var_b = blur(b * b) - mu_b ** 2
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+def _gray_frames(input_path, width, height):
+    """Decodes a video to gray frames of a fixed size, one frame per output frame."""
+    return FFmpegPipe([
+        '-i', input_path,
+        '-map', '0:v:0',
+        '-vf', f'scale={width}:{height}:flags=bicubic,format=gray',
+        '-vsync', 'passthrough',
+        '-f', 'rawvideo',
+        'pipe:1'
+    ], stdout='pipe')
+
+def compare_video(reference_path, candidate_path):
+    """
+    Frame-by-frame PSNR and SSIM on luma; the candidate is scaled to the reference size
+    if it differs (reported as 'resized')
+
+    Returns:
+        dict: frame counts, mean/min PSNR, mean/min SSIM and the per-frame values
+    """
+    info = probe_video_cached(reference_path)
+    width, height = info['width'], info['height']
+    candidate_info = probe_video_cached(candidate_path)
+
+    frame_bytes = width * height
+    buffers = [bytearray(frame_bytes), bytearray(frame_bytes)]
+    frames = [np.frombuffer(buffer, dtype=np.uint8).reshape(height, width) for buffer in buffers]
+    pipes = [_gray_frames(reference_path, width, height), _gray_frames(candidate_path, width, height)]
+    counts = [0, 0]
+    psnrs, ssims = [], []
+    try:
+        while True:
+            got = [pipe.readinto(buffer) for pipe, buffer in zip(pipes, buffers)]
+            counts = [count + ok for count, ok in zip(counts, got)]
+            if not all(got):
+                # Count what is left of the longer one
+                for i, pipe in enumerate(pipes):
+                    while got[i] and pipe.readinto(buffers[i]):
+                        counts[i] += 1
+                break
+            psnrs.append(psnr(frames[0], frames[1]))
+            ssims.append(ssim(frames[0], frames[1]))
+    except BaseException:
+        for pipe in pipes:
+            pipe.close(kill=True)
+        raise
+    for pipe in pipes:
+        pipe.close()
+
+    return {
+        'frames_reference': counts[0],
+        'frames_candidate': counts[1],
+        'resized': (candidate_info['width'], candidate_info['height']) != (width, height),
+        'psnr_mean': round(float(np.mean(psnrs)), 2) if psnrs else None,
+        'psnr_min': round(float(np.min(psnrs)), 2) if psnrs else None,
+        'ssim_mean': round(float(np.mean(ssims)), 4) if ssims else None,
+        'ssim_min': round(float(np.min(ssims)), 4) if ssims else None,
+        'psnr': [round(value, 2) for value in psnrs],
+        'ssim': [round(value, 4) for value in ssims],
+    }
+
+def _mono_samples(input_path, seconds):
+    pipe = FFmpegPipe(['-i', input_path, '-map', '0:a:0', '-t', str(seconds), '-ac', '1', '-ar', str(AUDIO_RATE),
+                       '-f', 'f32le', 'pipe:1'], stdout='pipe')
+    try:
+        data = pipe.process.stdout.read()
+    except BaseException:
+        pipe.close(kill=True)
+        raise
+    pipe.close()
+    return np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32).astype(np.float64)
+
+def compare_audio(reference_path, candidate_path, seconds=10.0, max_lag=0.5):
+    """
+    Lag of the candidate audio against the reference, to the sample, by FFT cross-correlation
+
+    Returns:
+        dict: 'offset_samples' and 'offset_ms' (positive: the candidate is late),
+              'correlation' (normalized, 1.0 for identical audio) and both durations
+    """
+    reference = _mono_samples(reference_path, seconds)
+    candidate = _mono_samples(candidate_path, seconds)
+    if not len(reference) or not len(candidate):
+        raise ValueError("No audio samples to compare")
+
+    size = 1 << int(np.ceil(np.log2(len(reference) + len(candidate))))
+    corr = np.fft.irfft(np.fft.rfft(candidate, size) * np.conj(np.fft.rfft(reference, size)), size)
+    lags = np.concatenate([np.arange(0, size // 2), np.arange(-(size // 2), 0)])
+    window = np.abs(lags) <= int(max_lag * AUDIO_RATE)
+    best = np.flatnonzero(window)[np.argmax(corr[window])]
+    lag = int(lags[best])
+    norm = np.sqrt(np.sum(reference ** 2) * np.sum(candidate ** 2))
+    return {
+        'offset_samples': lag,
+        'offset_ms': round(lag * 1000 / AUDIO_RATE, 3),
+        'correlation': round(float(corr[best] / norm), 4) if norm else 0.0,
+        'seconds_reference': round(len(reference) / AUDIO_RATE, 3),
+        'seconds_candidate': round(len(candidate) / AUDIO_RATE, 3),
+    }
+
+def check(result, tolerances):
+    """List of tolerance breaches of one compared case."""
+    failures = []
+    video = result.get('video')
+    if video:
+        if abs(video['frames_reference'] - video['frames_candidate']) > tolerances['max_frame_diff']:
+            failures.append(f"frame count {video['frames_candidate']} vs {video['frames_reference']}")
+        if video['psnr_mean'] is None:
+            failures.append("no frames to compare")
+        else:
+            if video['psnr_mean'] < tolerances['min_psnr']:
+                failures.append(f"mean PSNR {video['psnr_mean']:.2f} dB < {tolerances['min_psnr']}")
+            if video['psnr_min'] < tolerances['min_frame_psnr']:
+                failures.append(f"worst frame PSNR {video['psnr_min']:.2f} dB < {tolerances['min_frame_psnr']}")
+            if video['ssim_mean'] < tolerances['min_ssim']:
+                failures.append(f"mean SSIM {video['ssim_mean']:.4f} < {tolerances['min_ssim']}")
+    audio = result.get('audio')
+    if audio == 'missing':
+        failures.append("audio missing in the candidate")
+    elif audio:
+        if abs(audio['offset_ms']) > tolerances['max_audio_offset_ms']:
+            failures.append(f"audio offset {audio['offset_ms']:+.3f} ms ({audio['offset_samples']:+d} samples)")
+        if audio['correlation'] < tolerances['min_audio_corr']:
+            failures.append(f"audio correlation {audio['correlation']:.4f} < {tolerances['min_audio_corr']}")
+    return failures
+
+def _timed_render(run, media, output_path):
+    """Runs a render and returns its wall time; the editing functions report errors by printing, so check the file."""
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    started = time.perf_counter()
+    run(media, output_path)
+    seconds = time.perf_counter() - started
+    if not os.path.exists(output_path) or not os.path.getsize(output_path):
+        raise RuntimeError(f"Render produced no output: {output_path}")
+    return seconds
+
+def run_harness(cases=None, work_dir=HARNESS_DIR, keep=False, **tolerances):
+    """
+    Render and compare the registered cases
+
+    Each reference is rendered once and shared by the cases that use it.
+
+    Args:
+        cases (list): Case names (default: all registered)
+        work_dir (str): Folder for the inputs and renders
+        keep (bool): Keep the rendered outputs (default: False, only the inputs are kept)
+        **tolerances: Overrides of TOLERANCES for every case (on top of the case's own)
+
+    Returns:
+        dict: 'cases' (one result per case) and 'passed'
+    """
+    selected = list(CASES) if not cases else cases
+    unknown = [name for name in selected if name not in CASES]
+    if unknown:
+        raise ValueError(f"Unknown cases: {', '.join(unknown)} (choose from {', '.join(CASES)})")
+
+    media = make_inputs(os.path.join(work_dir, 'inputs'))
+    render_dir = os.path.join(work_dir, 'renders')
+    os.makedirs(render_dir, exist_ok=True)
+
+    references = {}  # name -> (path, seconds) or exception
+    results = []
+    try:
+        for name in selected:
+            case = CASES[name]
+            limits = {**TOLERANCES, **case['tolerances'], **tolerances}
+            result = {'case': name, 'reference': case['reference'], 'tolerances': limits}
+            print(f"--- {name} (reference: {case['reference']})")
+            try:
+                if case['reference'] not in references:
+                    path = os.path.join(render_dir, f"ref_{case['reference']}.mp4")
+                    try:
+                        references[case['reference']] = (path, _timed_render(REFERENCES[case['reference']]['run'], media, path))
+                    except Exception as e:
+                        references[case['reference']] = e
+                if isinstance(references[case['reference']], Exception):
+                    raise RuntimeError(f"Reference failed: {references[case['reference']]}")
+                reference_path, reference_seconds = references[case['reference']]
+
+                candidate_path = os.path.join(render_dir, f"{name}.mp4")
+                candidate_seconds = _timed_render(case['run'], media, candidate_path)
+                result.update({
+                    'reference_seconds': round(reference_seconds, 3),
+                    'candidate_seconds': round(candidate_seconds, 3),
+                    'speedup': round(reference_seconds / candidate_seconds, 2) if candidate_seconds else None,
+                    'video': compare_video(reference_path, candidate_path),
+                })
+                if probe_video_cached(reference_path)['has_audio']:
+                    if probe_video_cached(candidate_path)['has_audio']:
+                        result['audio'] = compare_audio(reference_path, candidate_path)
+                    else:
+                        result['audio'] = 'missing'
+                result['failures'] = check(result, limits)
+            except Exception as e:
+                result['error'] = str(e)
+                result['failures'] = [f"error: {e}"]
+            result['passed'] = not result['failures']
+            results.append(result)
+    finally:
+        if not keep:
+            shutil.rmtree(render_dir, ignore_errors=True)
+
+    return {'cases': results, 'passed': all(result['passed'] for result in results)}
+
+def print_report(report):
+    print(f"\n{'case':<22} {'speedup':>8} {'PSNR':>8} {'min':>7} {'SSIM':>7} {'audio ms':>9}  result")
+    for result in report['cases']:
+        video = result.get('video') or {}
+        audio = result.get('audio') if isinstance(result.get('audio'), dict) else {}
+        columns = [
+            f"{result['speedup']:.2f}x" if result.get('speedup') else '-',
+            f"{video['psnr_mean']:.2f}" if video.get('psnr_mean') is not None else '-',
+            f"{video['psnr_min']:.2f}" if video.get('psnr_min') is not None else '-',
+            f"{video['ssim_mean']:.4f}" if video.get('ssim_mean') is not None else '-',
+            f"{audio['offset_ms']:+.3f}" if audio else '-',
+        ]
+        status = 'ok' if result['passed'] else 'FAIL: ' + '; '.join(result['failures'])
+        print(f"{result['case']:<22} {columns[0]:>8} {columns[1]:>8} {columns[2]:>7} {columns[3]:>7} {columns[4]:>9}  {status}")
+    failed = sum(not result['passed'] for result in report['cases'])
+    print(f"\n{len(report['cases']) - failed} passed, {failed} failed")
+
+# --- Built-in references and cases ---
+# Editing modules are imported when a render runs, so listing cases stays light.
+
+def _trim_moviepy(start, end, media, output_path):
+    from trim_video import trim_video
+    trim_video(media['video'], output_path, start, end, use_index=False)
+
+def _trim_index(start, end, media, output_path):
+    from trim_video import fast_trim
+    fast_trim(media['video'], output_path, start, end)
+
+# Keyframes are every second: 2.0 s copies the streams, 2.5 s decodes from the keyframe before
+register_reference('trim_moviepy_2.0', functools.partial(_trim_moviepy, 2.0, 4.0))
+register_reference('trim_moviepy_2.5', functools.partial(_trim_moviepy, 2.5, 4.5))
+register_case('trim_copy', 'trim_moviepy_2.0', functools.partial(_trim_index, 2.0, 4.0))
+register_case('trim_index', 'trim_moviepy_2.5', functools.partial(_trim_index, 2.5, 4.5))
+
+LOGO_OPTIONS = {'position': 'bottom-right', 'padding': 10}
+
+def _logo_cv2(workers, media, output_path):
+    from overlay_image import add_logo_cv2
+    add_logo_cv2(media['video'], output_path, media['logo'], workers=workers, **LOGO_OPTIONS)
+
+def _logo_yuv(media, output_path):
+    from overlay_yuv import add_logo_yuv
+    add_logo_yuv(media['video'], output_path, media['logo'], **LOGO_OPTIONS)
+
+def _logo_stream(media, output_path):
+    from stream_tools import stream_logo
+    stream_logo(media['video'], output_path, media['logo'], **LOGO_OPTIONS)
+
+# The OpenCV reference is written with the mp4v encoder, so the bar is lower than for x264 pairs
+register_reference('logo_cv2', functools.partial(_logo_cv2, None))
+register_case('logo_workers', 'logo_cv2', functools.partial(_logo_cv2, 2), min_psnr=30.0, min_frame_psnr=26.0, min_ssim=0.9)
+register_case('logo_yuv', 'logo_cv2', _logo_yuv, min_psnr=30.0, min_frame_psnr=26.0, min_ssim=0.9)
+register_case('logo_stream', 'logo_cv2', _logo_stream, min_psnr=30.0, min_frame_psnr=26.0, min_ssim=0.9)
+
+def _audio_moviepy(use_pcm_cache, media, output_path):
+    from add_audio import add_audio_to_video
+    add_audio_to_video(media['video'], media['music'], output_path, video_audio_factor=0.5, music_volume=0.8,
+                       use_pcm_cache=use_pcm_cache)
+
+def _audio_stream(media, output_path):
+    from stream_tools import stream_audio
+    stream_audio(media['video'], media['music'], output_path, video_audio_factor=0.5, music_volume=0.8)
+
+register_reference('audio_moviepy', functools.partial(_audio_moviepy, False))
+register_case('audio_pcm_cache', 'audio_moviepy', functools.partial(_audio_moviepy, True))
+register_case('audio_stream', 'audio_moviepy', _audio_stream, min_audio_corr=0.8)
+
+UPSCALE_HEIGHT = 720
+
+def _upscale_backend(name, media, output_path):
+    from upscaler_engine import BACKENDS
+    backend = BACKENDS[name]
+    backend['run'](media['video'], output_path, probe_video_cached(media['video']), UPSCALE_HEIGHT,
+                   backend['variants'][0][1])
+
+def _register_upscale_cases():
+    """One case per upscaler backend against the OpenCV Lanczos + sharpen path."""
+    from upscaler_engine import BACKENDS, is_available
+    register_reference('upscale_cv2', functools.partial(_upscale_backend, 'lanczos_sharpen'))
+    for name, backend in BACKENDS.items():
+        # A backend can be installed and still have no variants (e.g. dnn without model weights)
+        if name != 'lanczos_sharpen' and backend['variants'] and is_available(backend):
+            register_case(f'upscale_{name}', 'upscale_cv2', functools.partial(_upscale_backend, name),
+                          min_psnr=28.0, min_frame_psnr=25.0, min_ssim=0.85)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Compare the fast paths against the reference implementations")
+    parser.add_argument('--case', action='append', dest='cases', help='Only run this case (repeatable)')
+    parser.add_argument('--list', action='store_true', help='List the cases and exit')
+    parser.add_argument('--no-upscale', action='store_true', help='Skip the upscaler backend cases')
+    parser.add_argument('--min-psnr', type=float, help='Override the mean PSNR limit (dB) of every case')
+    parser.add_argument('--min-ssim', type=float, help='Override the mean SSIM limit of every case')
+    parser.add_argument('--max-audio-offset-ms', type=float, help='Override the audio offset limit of every case')
+    parser.add_argument('--work-dir', default=HARNESS_DIR, help='Folder for inputs and renders')
+    parser.add_argument('--keep', action='store_true', help='Keep the rendered outputs')
+    parser.add_argument('--report', help='Also write the full report (including per-frame values) as JSON')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.no_upscale:
+        _register_upscale_cases()
+    if args.list:
+        for name, case in CASES.items():
+            print(f"{name:<22} reference: {case['reference']}")
+        return 0
+
+    overrides = {name: getattr(args, name) for name in ('min_psnr', 'min_ssim', 'max_audio_offset_ms')
+                 if getattr(args, name) is not None}
+    report = run_harness(args.cases, work_dir=args.work_dir, keep=args.keep, **overrides)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+    return 0 if report['passed'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import cv2
+import json
+import os
+import shutil
+from tqdm import tqdm
+
+from ffmpeg_runner import concat_segments
+from seek_index import load_seek_index, seek_capture
+
+MANIFEST_NAME = 'manifest.json'
+
+def _load_manifest(manifest_path, job):
+    """Returns the saved manifest if it belongs to the same job, otherwise a fresh one."""
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('job') == job:
+            return manifest
+        print("Warning: Checkpoint belongs to a different job or input, starting over.")
+    return {'job': job, 'completed_segments': [], 'last_frame': -1}
+
+def _save_manifest(manifest_path, manifest):
+    """Writes the manifest atomically so a crash never leaves it half written."""
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def resumable_upscale(input_path, output_path, transform, transform_key, new_size, checkpoint_dir=None,
+                      segment_frames=300, fourcc='mp4v', desc='Upscaling video'):
+    """
+    Run a per-frame transform over a video as closed, independently decodable segments
+
+    Every finished segment is recorded in a checkpoint manifest. If the job is
+    restarted with the same arguments it continues after the last completed segment,
+    so a crash costs at most one segment of work. Segments are joined losslessly at the end.
+
+    Args:
+        input_path (str): Path to input video file
+        output_path (str): Path to save the transformed video
+        transform (callable): Function taking a BGR frame and returning the new frame
+        transform_key (str): Identity of the transform (backend and its parameters, e.g.
+                             'lanczos_sharpen:3840x2160'); a checkpoint made by another transform is discarded
+        new_size (tuple): (width, height) of the transformed frames
+        checkpoint_dir (str): Folder for segments and manifest (default: <output_path>.parts)
+        segment_frames (int): Frames per segment (default: 300)
+        fourcc (str): Codec used for the segments (default: 'mp4v')
+        desc (str): Progress bar label
+    """
+    if checkpoint_dir is None:
+        checkpoint_dir = output_path + '.parts'
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    video = cv2.VideoCapture(input_path)
+    if not video.isOpened():
+        raise IOError(f"Cannot open video file: {input_path}")
+
+    index = load_seek_index(input_path)
+    fps = video.get(cv2.CAP_PROP_FPS)
+    frame_count = len(index)
+
+    # Anything that changes the output invalidates the checkpoint
+    job = {
+        'input': os.path.abspath(input_path),
+        'input_size': os.path.getsize(input_path),
+        'input_mtime': os.path.getmtime(input_path),
+        'transform': transform_key,
+        'new_size': list(new_size),
+        'segment_frames': segment_frames,
+        'fourcc': fourcc,
+    }
+    manifest_path = os.path.join(checkpoint_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path, job)
+
+    start_frame = len(manifest['completed_segments']) * segment_frames
+    if start_frame:
+        print(f"Resuming from frame {start_frame} ({len(manifest['completed_segments'])} segments done)")
+        seek_capture(video, index, start_frame)
+
+    writer = None
+    pbar = tqdm(total=frame_count, initial=min(start_frame, frame_count), desc=desc)
+    try:
+        frame_number = start_frame
+        while True:
+            ret, frame = video.read()
+            if not ret:
+                break
+
+            if writer is None:
+                segment_name = f"seg_{frame_number // segment_frames:05d}.mp4"
+                segment_tmp = os.path.join(checkpoint_dir, segment_name + '.tmp.mp4')
+                writer = cv2.VideoWriter(segment_tmp, cv2.VideoWriter_fourcc(*fourcc), fps, new_size, isColor=True)
+                if not writer.isOpened():
+                    raise IOError(f"Could not open video writer for segment: {segment_tmp}")
+
+            writer.write(transform(frame))
+            frame_number += 1
+            pbar.update(1)
+
+            # Close the segment and record it before starting the next one
+            if frame_number % segment_frames == 0:
+                writer.release()
+                writer = None
+                os.replace(segment_tmp, os.path.join(checkpoint_dir, segment_name))
+                manifest['completed_segments'].append(segment_name)
+                manifest['last_frame'] = frame_number - 1
+                _save_manifest(manifest_path, manifest)
+
+        # Last, partial segment
+        if writer is not None:
+            writer.release()
+            writer = None
+            os.replace(segment_tmp, os.path.join(checkpoint_dir, segment_name))
+            manifest['completed_segments'].append(segment_name)
+            manifest['last_frame'] = frame_number - 1
+            _save_manifest(manifest_path, manifest)
+    finally:
+        pbar.close()
+        video.release()
+        if writer is not None:
+            writer.release()
+
+    segment_paths = [os.path.join(checkpoint_dir, name) for name in manifest['completed_segments']]
+    concat_segments(segment_paths, output_path)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    print(f"Video saved to: {output_path} ({len(segment_paths)} segments joined)")
+
+if __name__ == "__main__":
+    # Example usage: any per-frame function can be made resumable
+    input_video = r"C:\data\hero\concat-all.mp4"
+    output_video = r"C:\data\hero\concat-all-2x.mp4"
+
+    video = cv2.VideoCapture(input_video)
+    width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH)) * 2
+    height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 2
+    video.release()
+
+    resumable_upscale(
+        input_video,
+        output_video,
+        transform=lambda frame: cv2.resize(frame, (width, height), interpolation=cv2.INTER_LANCZOS4),
+        transform_key='lanczos:2x',
+        new_size=(width, height),
+        segment_frames=300  # Re-run the same command after a crash to resume
+    )
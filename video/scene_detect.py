@@ -0,0 +1,158 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from ffmpeg_runner import RUNNER, FFmpegPipe, probe_video_cached
+from seek_index import load_seek_index
+
+HIST_BINS = 16
+
+def _histograms(frames):
+    """Normalized luma histograms of a batch of gray frames in one bincount: shape (n, HIST_BINS)."""
+    n = len(frames)
+    bins = (frames.reshape(n, -1) // (256 // HIST_BINS)).astype(np.int64)
+    bins += (np.arange(n) * HIST_BINS)[:, None]
+    counts = np.bincount(bins.ravel(), minlength=n * HIST_BINS).reshape(n, HIST_BINS)
+    return counts / frames[0].size
+
+def detect_scenes(input_path, threshold=None, min_scene_len=1.0, method='hist', width=64, batch_size=256,
+                  return_scores=False):
+    """
+    Find scene cuts by comparing consecutive frames at a tiny resolution
+
+    ffmpeg decodes the video (deblocking skipped) and scales it to a width of a few dozen
+    pixels in gray, so the Python side only sees a few KB per frame. Frames are compared
+    in batches with numpy: either the change of the luma histogram (robust to motion,
+    the default) or the mean absolute luma difference.
+
+    Args:
+        input_path (str): Path to the input video file
+        threshold (float): Cut when the frame difference exceeds this, 0-1
+                           (default: 0.35 for 'hist', 0.15 for 'luma')
+        min_scene_len (float): Minimum scene length in seconds; closer cuts are ignored (default: 1.0)
+        method (str): 'hist' (histogram distance) or 'luma' (mean absolute difference)
+        width (int): Analysis width in pixels (default: 64)
+        batch_size (int): Frames compared per numpy batch (default: 256)
+        return_scores (bool): Also return the per-frame difference scores (for tuning the threshold)
+
+    Returns:
+        list: Cut timestamps in seconds (start of each new scene), or (cuts, scores) with return_scores
+    """
+    if method not in ('hist', 'luma'):
+        raise ValueError(f"Unknown scene detection method: {method}")
+    if threshold is None:
+        threshold = 0.35 if method == 'hist' else 0.15
+
+    info = probe_video_cached(input_path)
+    if not info['width'] or not info['height']:
+        raise ValueError(f"No video stream in: {input_path}")
+    height = max(2, int(round(width * info['height'] / info['width'] / 2)) * 2)
+    frame_bytes = width * height
+
+    # Exact presentation times from the seek index when it covers every frame
+    try:
+        pts = load_seek_index(input_path)['pts']
+    except Exception:
+        pts = None
+
+    def time_of(frame_number):
+        if pts is not None and frame_number < len(pts):
+            return float(pts[frame_number])
+        return frame_number / info['fps'] if info['fps'] else 0.0
+
+    pipe = FFmpegPipe([
+        '-skip_loop_filter', 'all',  # Deblocking doesn't matter at this size
+        '-i', input_path,
+        '-map', '0:v:0',
+        '-vf', f'scale={width}:{height}:flags=area,format=gray',
+        '-vsync', 'passthrough',  # One output frame per decoded frame, so indices match the seek index
+        '-f', 'rawvideo',
+        'pipe:1'
+    ], stdout='pipe')
+
+    buffer = bytearray(batch_size * frame_bytes)
+    view = memoryview(buffer)
+    batch = np.frombuffer(buffer, dtype=np.uint8).reshape(batch_size, height, width)
+    previous = None  # Last frame of the previous batch (and its histogram)
+    previous_hist = None
+    scores = []
+    cuts = []
+    frame_number = 0
+    try:
+        while True:
+            count = 0
+            while count < batch_size and pipe.readinto(view[count * frame_bytes:(count + 1) * frame_bytes]):
+                count += 1
+            if count == 0:
+                break
+
+            frames = batch[:count]
+            if method == 'hist':
+                hists = _histograms(frames)
+                chain = hists if previous_hist is None else np.vstack([previous_hist[None], hists])
+                diffs = 0.5 * np.abs(np.diff(chain, axis=0)).sum(axis=1)
+                previous_hist = hists[-1]
+            else:
+                chain = frames if previous is None else np.concatenate([previous[None], frames])
+                diffs = np.abs(np.diff(chain.astype(np.int16), axis=0)).mean(axis=(1, 2)) / 255.0
+            previous = frames[-1].copy()
+
+            # The very first frame has no predecessor
+            first = frame_number if len(diffs) == count else frame_number + 1
+            scores.extend(diffs.tolist())
+            for offset in np.flatnonzero(diffs > threshold):
+                t = time_of(first + int(offset))
+                if t - (cuts[-1] if cuts else 0.0) >= min_scene_len:
+                    cuts.append(round(t, 3))
+            frame_number += count
+    except BaseException:
+        pipe.close(kill=True)
+        raise
+    pipe.close()
+
+    # Summaries go to stderr so a cut list printed on stdout (cli.py scenes --json) stays parseable
+    print(f"Scene detection: {frame_number} frames analyzed, {len(cuts)} cuts found", file=sys.stderr)
+    return (cuts, np.array(scores)) if return_scores else cuts
+
+def split_scenes(input_path, output_dir, cuts=None, name=None, **detect_options):
+    """
+    Write every scene as its own clip through the seek-index fast trim
+
+    Args:
+        input_path (str): Path to the input video file
+        output_dir (str): Folder for the clips (<name>-scene001.mp4, ...)
+        cuts (list): Cut timestamps (default: detected with detect_scenes)
+        name (str): Clip name prefix (default: the input file name; set it when input_path is a URL)
+        **detect_options: Passed to detect_scenes when cuts is None
+
+    Returns:
+        list: Paths of the written clips in order
+    """
+    from trim_video import fast_trim
+
+    if cuts is None:
+        cuts = detect_scenes(input_path, **detect_options)
+    index = load_seek_index(input_path)
+    duration = max(float(index['pts'][-1]), probe_video_cached(input_path)['duration'])
+    bounds = [0.0] + [t for t in cuts if 0.0 < t < duration] + [duration]
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = name or os.path.splitext(os.path.basename(input_path))[0]
+    jobs = [(os.path.join(output_dir, f"{name}-scene{number:03d}.mp4"), start, end)
+            for number, (start, end) in enumerate(zip(bounds, bounds[1:]), 1) if end > start]
+
+    # Trims are short ffmpeg calls; run as many at once as the shared runner allows
+    with ThreadPoolExecutor(max_workers=RUNNER.max_concurrent) as executor:
+        list(executor.map(lambda job: fast_trim(input_path, job[0], job[1], job[2], index=index), jobs))
+
+    print(f"Split into {len(jobs)} scenes in: {output_dir}", file=sys.stderr)
+    return [path for path, _, _ in jobs]
+
+if __name__ == "__main__":
+    # Example usage: find the cuts of a long source and split it into clips
+    input_video = r"C:\data\hero\s23.mp4"
+
+    cuts = detect_scenes(input_video)
+    print(f"Cuts at: {cuts}")
+    split_scenes(input_video, r"C:\data\hero\scenes", cuts=cuts)
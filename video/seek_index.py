@@ -0,0 +1,216 @@
+import collections
+import os
+import numpy as np
+
+from cache_utils import is_url
+from ffmpeg_runner import RUNNER
+
+# One record per video frame, in presentation order
+INDEX_DTYPE = np.dtype([
+    ('pts', '<f8'),   # Presentation time in seconds from the container start, i.e. what ffmpeg's input -ss expects
+    ('pos', '<i8'),   # Byte offset of the packet in the container (-1 if unknown)
+    ('key', '?'),     # True if the frame is a keyframe
+])
+
+# Bumped when the stored values change meaning, so older sidecars are rebuilt instead of reused
+INDEX_VERSION = 2
+
+def index_path_for(input_path):
+    """Returns the sidecar path used to store the seek index of a video."""
+    return f'{input_path}.idx{INDEX_VERSION}.npy'
+
+def build_seek_index(input_path, index_path=None):
+    """
+    Build a frame-accurate seek index for a video and save it as a .npy sidecar
+
+    Only packet headers are read (no decoding), so this is fast even for long sources.
+
+    Args:
+        input_path (str): Path to the input video file
+        index_path (str): Where to save the index (default: index_path_for(input_path), False to not save it)
+
+    Returns:
+        numpy.ndarray: Structured array with 'pts', 'pos' and 'key' fields
+    """
+    if index_path is None:
+        index_path = index_path_for(input_path)
+
+    # The container start time comes with the packets, so a remote input is read only once
+    probe_output = RUNNER.ffprobe_sync([
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,dts_time,pos,flags:format=start_time',
+        '-of', 'csv',
+        input_path
+    ]).decode('utf-8')
+
+    records = []
+    start_time = None
+    for line in probe_output.splitlines():
+        section, _, values = line.strip().partition(',')
+        fields = values.split(',')
+        if section == 'format':
+            start_time = float(fields[0]) if fields[0] not in ('', 'N/A') else None
+            continue
+        if section != 'packet' or len(fields) < 4:
+            continue
+        pts_time, dts_time, pos, flags = fields[:4]
+        # Some containers leave pts empty on a few packets; fall back to dts
+        if pts_time in ('', 'N/A'):
+            pts_time = dts_time
+        if pts_time in ('', 'N/A'):
+            continue
+        records.append((float(pts_time), int(pos) if pos not in ('', 'N/A') else -1, 'K' in flags))
+
+    if not records:
+        raise ValueError(f"No video packets found in: {input_path}")
+
+    index = np.array(records, dtype=INDEX_DTYPE)
+
+    # Packets come in decode order; sort them into presentation order
+    index.sort(order='pts')
+    # Input -ss counts from the container start, which can differ from the first video frame
+    # (MPEG-TS, audio that starts first); without a container start time use the first frame
+    index['pts'] -= index['pts'][0] if start_time is None else start_time
+
+    if index_path is not False:
+        np.save(index_path, index)
+    return index
+
+# URL -> in-memory index, so one job's several lookups on a remote input probe it only once
+_url_indexes = collections.OrderedDict()
+URL_INDEX_MEMO_SIZE = 8
+
+def load_seek_index(input_path, build=True):
+    """
+    Load the seek index of a video, memory-mapped from its sidecar file
+
+    Args:
+        input_path (str): Path to the input video file
+        build (bool): Build the index if it is missing or older than the video (default: True)
+
+    Returns:
+        numpy.ndarray: Memory-mapped index, or None if it doesn't exist and build is False
+    """
+    if is_url(input_path):
+        # Remote input: nowhere to keep a sidecar, and building reads the whole object,
+        # so the index is kept in memory for the most recent URLs
+        if input_path in _url_indexes:
+            _url_indexes.move_to_end(input_path)
+        elif not build:
+            return None
+        else:
+            _url_indexes[input_path] = build_seek_index(input_path, index_path=False)
+            while len(_url_indexes) > URL_INDEX_MEMO_SIZE:
+                _url_indexes.popitem(last=False)
+        return _url_indexes[input_path]
+
+    index_path = index_path_for(input_path)
+    is_fresh = (os.path.exists(index_path) and
+                os.path.getmtime(index_path) >= os.path.getmtime(input_path))
+
+    if not is_fresh:
+        if not build:
+            return None
+        build_seek_index(input_path, index_path)
+
+    return np.load(index_path, mmap_mode='r')
+
+def count_frames(input_path, fallback=0):
+    """
+    Exact number of frames in a video according to its seek index
+
+    Args:
+        input_path (str): Path to the input video file
+        fallback (int): Value to return if the index can't be built, and for URLs, where
+                        building it would read the whole remote object (default: 0)
+    """
+    if is_url(input_path):
+        return len(_url_indexes[input_path]) if input_path in _url_indexes else fallback
+    try:
+        return len(load_seek_index(input_path))
+    except Exception as e:
+        print(f"Warning: Could not index {input_path}, using fallback frame count. Error: {e}")
+        return fallback
+
+def frame_at_time(index, t):
+    """Returns the number of the frame that is on screen at time t (seconds)."""
+    frame_number = int(np.searchsorted(index['pts'], t, side='right')) - 1
+    return max(0, min(frame_number, len(index) - 1))
+
+def nearest_keyframe(index, frame_number):
+    """
+    Find the last keyframe at or before a frame
+
+    Args:
+        index (numpy.ndarray): Seek index of the video
+        frame_number (int): Frame to seek to
+
+    Returns:
+        tuple: (keyframe_number, keyframe_pts)
+    """
+    keyframes = np.flatnonzero(index['key'][:frame_number + 1])
+    keyframe_number = int(keyframes[-1]) if len(keyframes) else 0
+    return keyframe_number, float(index['pts'][keyframe_number])
+
+def seek_capture(video, index, frame_number):
+    """
+    Position an open cv2.VideoCapture exactly on a frame
+
+    Jumps straight to the nearest preceding keyframe and only grabs (without color
+    conversion) the frames between it and the target.
+
+    Args:
+        video (cv2.VideoCapture): Opened capture of the indexed video
+        index (numpy.ndarray): Seek index of the video
+        frame_number (int): Frame that the next read() should return
+    """
+    import cv2  # Only needed for decoding; keeps index-only users (e.g. fast trims) light
+
+    keyframe_number, keyframe_pts = nearest_keyframe(index, frame_number)
+    # OpenCV positions count from the first video frame, not from the container start
+    video.set(cv2.CAP_PROP_POS_MSEC, (keyframe_pts - float(index['pts'][0])) * 1000.0)
+    for _ in range(frame_number - keyframe_number):
+        if not video.grab():
+            break
+
+def read_frame_at(input_path, t, index=None):
+    """
+    Decode the single frame shown at time t, decoding as few frames as possible
+
+    Args:
+        input_path (str): Path to the input video file
+        t (float): Time in seconds
+        index (numpy.ndarray): Seek index (loaded or built if None)
+
+    Returns:
+        numpy.ndarray: BGR frame, or None if it couldn't be read
+    """
+    import cv2
+
+    if index is None:
+        index = load_seek_index(input_path)
+
+    video = cv2.VideoCapture(input_path)
+    if not video.isOpened():
+        raise IOError(f"Cannot open video file: {input_path}")
+
+    try:
+        seek_capture(video, index, frame_at_time(index, t))
+        ret, frame = video.read()
+        return frame if ret else None
+    finally:
+        video.release()
+
+if __name__ == "__main__":
+    # Example usage
+    input_video = r"C:\data\hero\concat-all.mp4"
+
+    index = load_seek_index(input_video)
+    print(f"Frames: {len(index)}, keyframes: {int(index['key'].sum())}")
+    print(f"Duration: {index['pts'][-1]:.3f}s")
+
+    # Grab the frame shown at 12.5 seconds
+    frame = read_frame_at(input_video, 12.5, index)
+    if frame is not None:
+        import cv2
+        cv2.imwrite(r"C:\data\hero\frame-12.5s.jpg", frame)
@@ -1,48 +1,102 @@
 from moviepy.editor import VideoFileClip, concatenate_videoclips
 import os
+import uuid
 
-def concatenate_videos(video_paths, output_path):
+from cache_utils import is_url
+from asset_cache import DEFAULT_PROFILE, get_asset_segment, get_profile, normalize_args
+from ffmpeg_runner import RUNNER, concat_segments, probe_videos
+
+def concatenate_videos(video_paths, output_path, intro=None, outro=None, profile=DEFAULT_PROFILE, qc=False,
+                       encode_plan=None):
     """
     Concatenate multiple videos in sequence
 
     Args:
         video_paths (list): List of paths to video files in desired sequence
         output_path (str): Path where the final concatenated video will be saved
+        intro (str): Optional registered asset name (or path) to put before the videos
+        outro (str): Optional registered asset name (or path) to put after the videos
+        profile (str/dict): Output profile used when an intro or outro is given. The videos are
+                            encoded to it with ffmpeg, exactly like the assets, and the pre-encoded
+                            assets are spliced in without re-encoding (default: DEFAULT_PROFILE)
+        qc (bool/str): Check the result for black frames, freezes, silence and loudness and write
+                       <output>.qc.json next to it, or the report to this path (see media_qc.py)
+        encode_plan (dict): Rate control from encode_planner, starting from MoviePy's medium/CRF 23 (or
+                            the profile's preset and CRF): a plan from plan_encode, or its constraints to
+                            plan on the first video, e.g. {'target_size': '700MB', 'deadline': 600}.
+                            With an intro or outro the plan applies to the encoded videos only and
+                            keeps the profile's preset
     """
     try:
-        # Load all video clips
-        video_clips = []
+        # Verify files exist before adding (URLs, e.g. presigned S3 inputs, are opened as they are)
+        valid_paths = []
         for path in video_paths:
-            # Verify file exists before adding
-            if not os.path.exists(path):
+            if not is_url(path) and not os.path.exists(path):
                 print(f"Warning: Video file not found, skipping: {path}")
                 continue
-            clip = VideoFileClip(path)
-            video_clips.append(clip)
+            valid_paths.append(path)
 
-        if not video_clips:
+        if not valid_paths:
             print("Error: No valid video files found to concatenate.")
             return
 
-        # Concatenate the clips
-        final_clip = concatenate_videoclips(video_clips, method="compose") # Use compose for better compatibility
+        if intro or outro:
+            # The videos get the same ffmpeg encode as the pre-encoded assets, so every piece
+            # has identical stream parameters and they are spliced without re-encoding
+            _concatenate_with_assets(valid_paths, output_path, intro, outro, profile, encode_plan)
+        else:
+            # Load all video clips and concatenate them
+            video_clips = [VideoFileClip(path) for path in valid_paths]
+            final_clip = concatenate_videoclips(video_clips, method="compose") # Use compose for better compatibility
 
-        # Write the final video to file
-        final_clip.write_videofile(
-            output_path,
-            codec='libx264',
-            audio_codec='aac'
-        )
+            # Write the final video to file
+            write_kwargs = {'codec': 'libx264', 'audio_codec': 'aac'}
+            if encode_plan is not None:
+                from encode_planner import moviepy_write_kwargs, resolve_plan, writer_settings
+                # Sampled from the first video, starting from the writer's own preset and CRF;
+                # size and time are for the whole joined length
+                plan = resolve_plan(encode_plan, valid_paths[0], output_duration=final_clip.duration,
+                                    **writer_settings(write_kwargs))
+                write_kwargs = moviepy_write_kwargs(plan, write_kwargs)
+            final_clip.write_videofile(output_path, **write_kwargs)
 
-        # Close all clips to free up memory
-        for clip in video_clips:
-            clip.close()
-        final_clip.close()
+            # Close all clips to free up memory
+            for clip in video_clips:
+                clip.close()
+            final_clip.close()
 
         print(f"Videos concatenated successfully and saved to: {output_path}")
 
+        if qc:
+            from media_qc import run_qc
+            run_qc(output_path, report_path=qc if isinstance(qc, str) else None)
+
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        raise
+
+def _concatenate_with_assets(video_paths, output_path, intro, outro, profile, encode_plan):
+    """Encodes each video to the profile like the assets (concurrently) and splices in the asset segments."""
+    plan = None
+    if encode_plan is not None:
+        from encode_planner import resolve_plan
+        # Sampled from the first video, starting from the profile's preset and CRF
+        settings = get_profile(profile)
+        plan = resolve_plan(encode_plan, video_paths[0], preset=settings['preset'], crf=settings['crf'],
+                            output_duration=sum(info['duration'] for info in probe_videos(video_paths)))
+
+    body_paths = [output_path.rsplit('.', 1)[0] + f"_body{number}_{uuid.uuid4().hex}.mp4"
+                  for number in range(len(video_paths))]
+    segments = ([get_asset_segment(intro, profile)] if intro else []) + body_paths + \
+        ([get_asset_segment(outro, profile)] if outro else [])
+    try:
+        RUNNER.run_many_sync([normalize_args(path, body_path, profile, plan)
+                              for path, body_path in zip(video_paths, body_paths)])
+        concat_segments(segments, output_path)
+    finally:
+        for body_path in body_paths:
+            if os.path.exists(body_path):
+                os.remove(body_path)
 
 if __name__ == "__main__":
     # Example usage
@@ -57,4 +111,7 @@ if __name__ == "__main__":
         ]
     output_concatenated = r"C:\data\zomato\receipe\Noodles\concatenated_final.mp4"
 
-    concatenate_videos(video_list, output_concatenated) 
\ No newline at end of file
+    concatenate_videos(video_list, output_concatenated) 
+
+    # Example usage with cached brand intro/outro (see asset_cache.register_asset)
+    # concatenate_videos(video_list, output_concatenated, intro='hero-intro', outro='hero-outro', profile='1080p30')
\ No newline at end of file
@@ -0,0 +1,349 @@
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+MIN_PART_SIZE = 5 * 1024 ** 2  # S3 minimum for every part but the last
+MAX_PARTS = 10000
+
+class LocalStorage:
+    """Storage backend on a local (or mounted network) folder; keys are relative paths."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Key escapes the storage root: {key}")
+        return path
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def input_url(self, key):
+        """Something ffmpeg/OpenCV can open directly: here simply the file path."""
+        return self.path(key)
+
+    def read_range(self, key, start, length):
+        with open(self.path(key), 'rb') as f:
+            f.seek(start)
+            return f.read(length)
+
+    def iter_chunks(self, key, start=0, chunk_size=1024 * 1024):
+        """Streams the object from byte offset start."""
+        with open(self.path(key), 'rb') as f:
+            f.seek(start)
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+    def upload_file(self, local_path, key):
+        """Copies a file in atomically so readers never see a partial object."""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(local_path, tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def download_file(self, key, local_path):
+        shutil.copyfile(self.path(key), local_path)
+
+    def open_write(self, key):
+        """Returns a writer (write/close/abort) that publishes the object on close."""
+        return _LocalWriter(self.path(key))
+
+    def delete(self, key):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path(key))
+
+class _LocalWriter:
+    def __init__(self, target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        self.target = target
+        self.tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        self.file = open(self.tmp_path, 'wb')
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        os.replace(self.tmp_path, self.target)
+
+    def abort(self):
+        self.file.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.tmp_path)
+
+class S3Storage:
+    """
+    Storage backend on an S3-compatible object store (AWS S3, MinIO, Ceph RGW...)
+
+    Decoders read objects through presigned URLs, so ffmpeg fetches only the byte
+    ranges it needs instead of the whole file being downloaded first. Uploads are
+    multipart, with parts sent in parallel.
+    """
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, part_size=16 * 1024 ** 2,
+                 max_workers=8, url_expires=6 * 3600):
+        """
+        Args:
+            bucket (str): Bucket name
+            prefix (str): Key prefix for everything stored through this backend
+            endpoint_url (str): Endpoint of a non-AWS store, e.g. http://127.0.0.1:9000 for MinIO
+            region (str): Region name (default: from the environment)
+            part_size (int): Multipart part size in bytes (default: 16 MiB, minimum 5 MiB)
+            max_workers (int): Parts uploaded in parallel (default: 8)
+            url_expires (int): Lifetime of presigned URLs in seconds (default: 6 hours)
+        """
+        try:
+            import boto3
+        except ImportError:
+            raise ImportError("S3 storage needs boto3: pip install boto3")
+
+        # Credentials come from the usual AWS environment variables / config files
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_workers = max_workers
+        self.url_expires = url_expires
+
+    def key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(key))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def size(self, key):
+        return self.client.head_object(Bucket=self.bucket, Key=self.key(key))['ContentLength']
+
+    def input_url(self, key):
+        """Presigned GET URL; ffmpeg reads it with HTTP range requests and can seek."""
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self.key(key)},
+            ExpiresIn=self.url_expires
+        )
+
+    def read_range(self, key, start, length):
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key(key),
+                                          Range=f"bytes={start}-{start + length - 1}")
+        return response['Body'].read()
+
+    def iter_chunks(self, key, start=0, chunk_size=1024 * 1024):
+        """Streams the object from byte offset start with a single ranged GET."""
+        kwargs = {'Range': f"bytes={start}-"} if start else {}
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key(key), **kwargs)
+        yield from response['Body'].iter_chunks(chunk_size)
+
+    def upload_file(self, local_path, key):
+        """Multipart upload of a local file with parts sent in parallel."""
+        size = os.path.getsize(local_path)
+        part_size = max(self.part_size, -(-size // MAX_PARTS))
+
+        def read_part(offset):
+            with open(local_path, 'rb') as f:
+                f.seek(offset)
+                return f.read(part_size)
+
+        writer = _MultipartWriter(self, key, part_size)
+        try:
+            for offset in range(0, max(size, 1), part_size):
+                writer.submit_part(lambda offset=offset: read_part(offset))
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def download_file(self, key, local_path):
+        with open(local_path, 'wb') as f:
+            for chunk in self.iter_chunks(key):
+                f.write(chunk)
+
+    def open_write(self, key):
+        """
+        Returns a writer (write/close/abort) that uploads parts while data is still being
+        written, e.g. from an encoder's stdout; the object appears on close.
+        """
+        return _MultipartWriter(self, key, self.part_size)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(key))
+
+class _MultipartWriter:
+    """Buffers writes into parts and uploads them on a thread pool as they fill up."""
+
+    def __init__(self, storage, key, part_size):
+        self.storage = storage
+        self.key = storage.key(key)
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers=storage.max_workers)
+        # Bounds memory: at most two parts per worker are buffered or in flight
+        self.slots = threading.Semaphore(2 * storage.max_workers)
+        self.upload_id = storage.client.create_multipart_upload(
+            Bucket=storage.bucket, Key=self.key)['UploadId']
+
+    def _upload(self, number, get_data):
+        try:
+            response = self.storage.client.upload_part(
+                Bucket=self.storage.bucket, Key=self.key, UploadId=self.upload_id,
+                PartNumber=number, Body=get_data())
+            return {'PartNumber': number, 'ETag': response['ETag']}
+        finally:
+            self.slots.release()
+
+    def submit_part(self, get_data):
+        self.slots.acquire()
+        number = len(self.futures) + 1
+        self.futures.append(self.executor.submit(self._upload, number, get_data))
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.part_size:
+            part = bytes(self.buffer[:self.part_size])
+            del self.buffer[:self.part_size]
+            self.submit_part(lambda part=part: part)
+
+    def close(self):
+        if self.buffer or not self.futures:
+            part = bytes(self.buffer)
+            self.buffer = bytearray()
+            self.submit_part(lambda: part)
+        try:
+            parts = [future.result() for future in self.futures]
+            self.storage.client.complete_multipart_upload(
+                Bucket=self.storage.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={'Parts': parts})
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self.executor.shutdown()
+
+    def abort(self):
+        self.executor.shutdown(cancel_futures=True)
+        with contextlib.suppress(Exception):
+            self.storage.client.abort_multipart_upload(
+                Bucket=self.storage.bucket, Key=self.key, UploadId=self.upload_id)
+
+def get_storage(location):
+    """
+    Backend for a storage location
+
+    Args:
+        location (str): 's3://bucket/prefix' (endpoint from the s3_endpoint_url setting) or a local folder
+    """
+    if location.startswith('s3://'):
+        bucket, _, prefix = location[len('s3://'):].partition('/')
+        return S3Storage(bucket, prefix, endpoint_url=config.get('s3_endpoint_url') or None)
+    return LocalStorage(location)
+
+def split_uri(uri):
+    """'s3://bucket/dir/file.mp4' -> (S3Storage for s3://bucket/dir, 'file.mp4'); local paths -> (None, path)."""
+    if not uri.startswith('s3://'):
+        return None, uri
+    location, _, key = uri.rpartition('/')
+    return get_storage(location), key
+
+def resolve_input(uri):
+    """Path or URL a decoder can open directly, without downloading the object first."""
+    storage, key = split_uri(uri)
+    return storage.input_url(key) if storage else uri
+
+@contextlib.contextmanager
+def output_target(uri, suffix='.mp4'):
+    """
+    Local path to write an output to; remote outputs are uploaded (multipart, in parallel)
+    when the with block exits without error and the file was written.
+
+    Tools that only run ffmpeg can upload while encoding instead, with stream_ffmpeg_output.
+    """
+    storage, key = split_uri(uri)
+    if storage is None:
+        yield uri
+        return
+
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp_path
+        # Never publish an empty object for a render that didn't produce its output
+        if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            raise IOError(f"No output was written for: {uri}")
+        storage.upload_file(tmp_path, key)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def streamable_output_args(key):
+    """Output arguments for stream_ffmpeg_output: MPEG-TS for .ts keys, fragmented MP4 otherwise."""
+    if key.lower().endswith('.ts'):
+        return ['-f', 'mpegts', 'pipe:1']
+    return ['-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof', 'pipe:1']
+
+def stream_ffmpeg_output(args, storage, key, chunk_size=1024 * 1024, stdin=None):
+    """
+    Run ffmpeg with its output on stdout and upload it while it is being encoded
+
+    The output must be streamable, e.g. '-f', 'mpegts' or '-f', 'mp4', '-movflags',
+    'frag_keyframe+empty_moov', with 'pipe:1' as the output (see streamable_output_args).
+
+    Args:
+        args (list): ffmpeg arguments ending with 'pipe:1'
+        storage: Backend to write to (LocalStorage or S3Storage)
+        key (str): Object key of the output
+        stdin: File object passed to ffmpeg as its stdin, for 'pipe:0' inputs (default: none)
+    """
+    from ffmpeg_runner import FFmpegPipe
+
+    writer = storage.open_write(key)
+    process = FFmpegPipe(args, stdin=stdin, stdout='pipe')
+    try:
+        for chunk in iter(lambda: process.process.stdout.read(chunk_size), b''):
+            writer.write(chunk)
+        process.close()
+    except BaseException:
+        process.close(kill=True)
+        writer.abort()
+        raise
+    writer.close()
+
+if __name__ == "__main__":
+    # Example usage against a local MinIO (credentials from AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY)
+    storage = S3Storage('media', prefix='renders', endpoint_url='http://127.0.0.1:9000')
+
+    storage.upload_file(r"C:\data\hero\concat-all.mp4", 'sources/concat-all.mp4')
+
+    # The decoder reads the source with range requests; the result is uploaded while encoding
+    stream_ffmpeg_output([
+        '-i', storage.input_url('sources/concat-all.mp4'),
+        '-vf', 'scale=-2:720',
+        '-c:v', 'libx264',
+        '-c:a', 'aac',
+        '-f', 'mp4',
+        '-movflags', 'frag_keyframe+empty_moov',
+        'pipe:1'
+    ], storage, 'outputs/concat-all-720p.mp4')
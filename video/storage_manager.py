@@ -0,0 +1,264 @@
+import contextlib
+import os
+import shutil
+import threading
+import time
+
+def last_used(stat):
+    """LRU clock of a managed file: set explicitly by mark_used, or its last write."""
+    return max(stat.st_atime, stat.st_mtime)
+
+def mark_used(path):
+    """
+    Records a use of a file by setting its atime
+
+    The mtime is left alone because seek indexes and probe/preview caches use it to
+    tell whether a file changed. Explicit utime calls work even on noatime mounts.
+    """
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except OSError:
+        pass
+
+class StorageManager:
+    """
+    Keeps working folders (uploads/, processed/) within disk quotas
+
+    Every file's size and last access time come from the filesystem (see last_used and
+    mark_used), and jobs pin the files they use with in_use(). A
+    background thread periodically moves files that have not been used for a while to
+    a slower cold tier and, if a folder is still over its quota, evicts the least
+    recently used unpinned files. Without a cold tier, demoted files are deleted.
+
+    Pins only exist in this process. Files used or modified within the last min_age seconds are
+    never touched either, which covers outputs still being encoded and jobs running in
+    other worker processes.
+    """
+
+    def __init__(self, quotas, cold_dir=None, cold_quota=None, inactive_after=24 * 3600,
+                 min_age=15 * 60, interval=60):
+        """
+        Args:
+            quotas (dict): Folder -> max bytes kept in the fast tier
+            cold_dir (str): Slower tier for inactive files, None to delete instead of moving
+            cold_quota (int): Max bytes in the cold tier, oldest deleted beyond it (default: no limit)
+            inactive_after (float): Seconds without access before a file moves to the cold tier
+            min_age (float): Files used or modified more recently than this are never moved or evicted
+            interval (float): Seconds between background sweeps
+        """
+        self.quotas = {os.path.abspath(folder): max_bytes for folder, max_bytes in quotas.items()}
+        self.cold_dir = os.path.abspath(cold_dir) if cold_dir else None
+        self.cold_quota = cold_quota
+        self.inactive_after = inactive_after
+        self.min_age = min_age
+        self.interval = interval
+
+        self._refs = {}  # abspath -> number of jobs using the file
+        self._busy = set()  # abspaths being moved or deleted right now
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+        for folder in self.quotas:
+            os.makedirs(folder, exist_ok=True)
+        if self.cold_dir:
+            os.makedirs(self.cold_dir, exist_ok=True)
+
+    # --- Job side ---
+
+    def cold_path(self, path):
+        """Where a file of a managed folder lives in the cold tier (None if it can't have one)."""
+        if not self.cold_dir:
+            return None
+        path = os.path.abspath(path)
+        for folder in self.quotas:
+            if path.startswith(folder + os.sep):
+                return os.path.join(self.cold_dir, os.path.basename(folder), os.path.relpath(path, folder))
+        return None
+
+    def resolve(self, path):
+        """Current location of a file: the fast tier path, or its cold tier copy if it was moved."""
+        path = os.path.abspath(path)
+        with self._cond:
+            while path in self._busy:
+                self._cond.wait()
+        cold = self.cold_path(path)
+        if not os.path.exists(path) and cold and os.path.exists(cold):
+            return cold
+        return path
+
+    def acquire(self, path):
+        """
+        Pin a file for a job; it is brought back from the cold tier if needed
+
+        Returns:
+            str: Path to use for the file
+        """
+        path = os.path.abspath(path)
+        cold = self.cold_path(path)
+        with self._cond:
+            while path in self._busy:
+                self._cond.wait()
+            self._refs[path] = self._refs.get(path, 0) + 1
+            promote = not os.path.exists(path) and cold and os.path.exists(cold)
+            if promote:
+                self._busy.add(path)
+
+        if promote:
+            try:
+                shutil.move(cold, path)
+            finally:
+                self._finish(path)
+        mark_used(path)
+        return path
+
+    def release(self, path):
+        """Unpins a file and marks it as just used."""
+        path = os.path.abspath(path)
+        with self._cond:
+            count = self._refs.get(path, 0) - 1
+            if count > 0:
+                self._refs[path] = count
+            else:
+                self._refs.pop(path, None)
+        mark_used(path)
+
+    @contextlib.contextmanager
+    def in_use(self, *paths):
+        """Pins files for the duration of a with block."""
+        acquired = [self.acquire(path) for path in paths]
+        try:
+            yield acquired
+        finally:
+            for path in acquired:
+                self.release(path)
+
+    # --- Maintenance side ---
+
+    def _claim(self, path, now):
+        """Marks a file as busy if nothing uses it; returns False if it must be left alone."""
+        with self._cond:
+            if self._refs.get(path) or path in self._busy:
+                return False
+            try:
+                # Re-read: the file may have been used since the folder was scanned
+                if now - last_used(os.stat(path)) < self.min_age:
+                    return False
+            except OSError:
+                return False
+            self._busy.add(path)
+            return True
+
+    def _finish(self, path):
+        with self._cond:
+            self._busy.discard(path)
+            self._cond.notify_all()
+
+    def _demote(self, path):
+        """Moves a file to the cold tier (keeping its times), or deletes it without one."""
+        if self.cold_dir:
+            cold = self.cold_path(path)
+            os.makedirs(os.path.dirname(cold), exist_ok=True)
+            shutil.move(path, cold)
+        else:
+            os.remove(path)
+
+    @staticmethod
+    def _scan(folder):
+        """(last used, size, path) of every file in a folder, least recently used first."""
+        entries = []
+        for root, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((last_used(stat), stat.st_size, os.path.abspath(path)))
+        return sorted(entries)
+
+    def usage(self):
+        """Bytes used per managed folder (and 'cold' for the cold tier)."""
+        usage = {folder: sum(size for _, size, _ in self._scan(folder)) for folder in self.quotas}
+        if self.cold_dir:
+            usage['cold'] = sum(size for _, size, _ in self._scan(self.cold_dir))
+        return usage
+
+    def sweep(self):
+        """
+        One maintenance pass: demote inactive files, then enforce every quota
+
+        Returns:
+            dict: Number of 'moved' and 'deleted' files
+        """
+        stats = {'moved': 0, 'deleted': 0}
+        now = time.time()
+
+        for folder, max_bytes in self.quotas.items():
+            entries = self._scan(folder)
+            total = sum(size for _, size, _ in entries)
+
+            for used, size, path in entries:
+                inactive = now - used > self.inactive_after
+                over_quota = total > max_bytes
+                # Entries are oldest first, so once a file is recent and we fit, we're done
+                if not inactive and not over_quota:
+                    break
+                if not self._claim(path, now):
+                    continue
+                try:
+                    self._demote(path)
+                    total -= size
+                    stats['moved' if self.cold_dir else 'deleted'] += 1
+                except OSError as e:
+                    print(f"Warning: Could not evict {path}: {e}")
+                finally:
+                    self._finish(path)
+
+            if total > max_bytes:
+                print(f"Warning: {folder} is over its quota ({total} > {max_bytes} bytes) with files in use")
+
+        if self.cold_dir and self.cold_quota is not None:
+            entries = self._scan(self.cold_dir)
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.cold_quota:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    stats['deleted'] += 1
+                except OSError as e:
+                    print(f"Warning: Could not delete cold file {path}: {e}")
+
+        return stats
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: Storage sweep failed: {e}")
+
+    def start(self):
+        """Starts the background sweeper thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='storage-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+if __name__ == "__main__":
+    # Example usage: 20 GB of uploads, 50 GB of results, older files go to a NAS share
+    manager = StorageManager(
+        {r"C:\data\video\uploads": 20 * 1024 ** 3, r"C:\data\video\processed": 50 * 1024 ** 3},
+        cold_dir=r"\\nas\video-cold",
+        inactive_after=6 * 3600
+    )
+    print(manager.usage())
+    print(manager.sweep())
@@ -0,0 +1,205 @@
+# Pipe-friendly versions of the editing tools: '-' as input reads the video from stdin,
+# '-' as output writes a streamable container (MPEG-TS or fragmented MP4) to stdout.
+#
+# ffmpeg reads and writes the standard streams directly, so every stage works on the
+# bytes as they arrive and chained stages run at the same time:
+#   python cli.py trim - - --start 5 --end 65 < in.mp4 | python cli.py logo - - --logo logo.png | python cli.py upscale - out.mp4
+# s3:// outputs are uploaded part by part while ffmpeg is still encoding.
+import sys
+
+from ffmpeg_runner import FFmpegPipe
+from preview import PREVIEW_CACHE_DIR, overlay_xy, text_sprite
+from storage_backend import split_uri, stream_ffmpeg_output, streamable_output_args
+
+STREAM = '-'
+STREAM_FORMATS = ('mpegts', 'mp4')
+
+def is_stream(path):
+    return path == STREAM
+
+def input_args(input_path):
+    """'-i' arguments for a file or for stdin."""
+    return ['-i', 'pipe:0' if is_stream(input_path) else input_path]
+
+def output_args(output_path, stream_format='mpegts'):
+    """
+    Output arguments: a regular MP4 for files, a container that needs no seeking for stdout
+
+    Args:
+        output_path (str): File path, s3:// URI or '-' for stdout
+        stream_format (str): 'mpegts' (default) or 'mp4' (fragmented) when writing to stdout
+    """
+    storage, key = split_uri(output_path)
+    if storage is not None:
+        # Uploaded while encoding, so written without seeking back (container from the key)
+        return streamable_output_args(key)
+    if not is_stream(output_path):
+        return ['-movflags', '+faststart', '-y', output_path]
+    if stream_format == 'mp4':
+        # moov up front with no sample tables, then self-contained fragments per keyframe
+        return ['-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof', 'pipe:1']
+    if stream_format == 'mpegts':
+        return ['-f', 'mpegts', 'pipe:1']
+    raise ValueError(f"Unsupported stream format: {stream_format} (choose from {', '.join(STREAM_FORMATS)})")
+
+def run_stream(args, input_path, output_path):
+    """
+    Run ffmpeg with stdin/stdout handed over directly when they are part of the pipeline
+
+    There is no progress output (stdout may carry the video); status messages go to stderr.
+    """
+    if is_stream(input_path) and sys.stdin.isatty():
+        raise ValueError("Input '-' needs a video piped into stdin")
+    stdin = sys.stdin.buffer if is_stream(input_path) else None
+    storage, key = split_uri(output_path)
+    if storage is not None:
+        stream_ffmpeg_output(args, storage, key, stdin=stdin)
+        return
+    sys.stdout.flush()
+    process = FFmpegPipe(
+        args,
+        stdin=stdin,
+        stdout=sys.stdout.buffer if is_stream(output_path) else None
+    )
+    process.close()
+
+def stream_trim(input_path, output_path, start_time, end_time, stream_format='mpegts'):
+    """
+    Trim without a seekable input: frames before the cut are decoded and dropped as they
+    arrive, and ffmpeg stops reading once the end time is reached
+
+    Args:
+        input_path (str): Input file or '-' for stdin
+        output_path (str): Output file, s3:// URI or '-' for stdout
+        start_time (float): Start time in seconds
+        end_time (float): End time in seconds
+        stream_format (str): Container on stdout, 'mpegts' or 'mp4' (default: 'mpegts')
+    """
+    if start_time >= end_time:
+        raise ValueError("Start time must be less than end time")
+    run_stream(input_args(input_path) + [
+        '-ss', f'{start_time:.6f}',
+        '-t', f'{end_time - start_time:.6f}',
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-c:a', 'aac',
+    ] + output_args(output_path, stream_format), input_path, output_path)
+    print(f"Video trimmed successfully and saved to: {output_path}", file=sys.stderr)
+
+def stream_logo(input_path, output_path, logo_path, position='top-left', size=None, padding=5,
+                stream_format='mpegts'):
+    """
+    Logo overlay with ffmpeg's overlay filter, frame by frame as the input arrives
+
+    Args:
+        input_path (str): Input file or '-' for stdin
+        output_path (str): Output file, s3:// URI or '-' for stdout
+        logo_path (str): Logo image (PNG with transparency preferred)
+        position (str): 'top-left', 'top-right', 'bottom-left' or 'bottom-right'
+        size (tuple): Resize the logo to (width, height) (default: original size)
+        padding (int): Distance from the edges in pixels
+        stream_format (str): Container on stdout, 'mpegts' or 'mp4' (default: 'mpegts')
+    """
+    x, y = overlay_xy(position, padding)
+    logo = f'[1:v]scale={size[0]}:{size[1]}[logo];[0:v][logo]' if size else '[0:v][1:v]'
+    run_stream(input_args(input_path) + [
+        '-i', logo_path,
+        '-filter_complex', f'{logo}overlay={x}:{y}[v]',
+        '-map', '[v]',
+        '-map', '0:a?',
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-c:a', 'copy',
+    ] + output_args(output_path, stream_format), input_path, output_path)
+    print(f"Logo added successfully and saved to: {output_path}", file=sys.stderr)
+
+def stream_text(input_path, output_path, text, font_size=70, color='white', position='center',
+                stream_format='mpegts'):
+    """
+    Text caption for the whole video, rendered once with TextClip and overlaid by ffmpeg
+
+    Args:
+        input_path (str): Input file or '-' for stdin
+        output_path (str): Output file, s3:// URI or '-' for stdout
+        text (str): Caption
+        font_size (int): Font size
+        color (str): Text color
+        position: 'center', 'top', 'bottom' or a tuple like ('right', 'top')
+        stream_format (str): Container on stdout, 'mpegts' or 'mp4' (default: 'mpegts')
+    """
+    sprite_path = text_sprite({'text': text, 'font_size': font_size, 'color': color}, 1.0, PREVIEW_CACHE_DIR)
+    x, y = overlay_xy(position, 5)
+    run_stream(input_args(input_path) + [
+        '-i', sprite_path,
+        '-filter_complex', f'[0:v][1:v]overlay={x}:{y}[v]',
+        '-map', '[v]',
+        '-map', '0:a?',
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-c:a', 'copy',
+    ] + output_args(output_path, stream_format), input_path, output_path)
+    print(f"Text overlay added successfully and saved to: {output_path}", file=sys.stderr)
+
+def stream_audio(video_path, audio_path, output_path, video_audio_factor=0.0, music_volume=1.0,
+                 stream_format='mpegts'):
+    """
+    Mix looped background music into a video; the video stream is copied, not re-encoded
+
+    Args:
+        video_path (str): Input video file or '-' for stdin
+        audio_path (str): Music file (must be a file: stdin already carries the video)
+        output_path (str): Output file, s3:// URI or '-' for stdout
+        video_audio_factor (float): Volume of the original audio, 0 mutes it (the input must
+                                    have an audio track when above 0)
+        music_volume (float): Volume of the music
+        stream_format (str): Container on stdout, 'mpegts' or 'mp4' (default: 'mpegts')
+    """
+    if is_stream(audio_path):
+        raise ValueError("The music must be a file; stdin is reserved for the video")
+
+    if video_audio_factor > 0:
+        audio_filter = (f'[0:a]volume={video_audio_factor}[orig];[1:a]volume={music_volume}[music];'
+                        '[orig][music]amix=inputs=2:duration=first:normalize=0[a]')
+    else:
+        audio_filter = f'[1:a]volume={music_volume}[a]'
+
+    run_stream(input_args(video_path) + [
+        '-stream_loop', '-1',
+        '-i', audio_path,
+        '-filter_complex', audio_filter,
+        '-map', '0:v',
+        '-map', '[a]',
+        '-c:v', 'copy',
+        '-c:a', 'aac',
+        '-shortest',  # The music loops forever; stop with the video
+    ] + output_args(output_path, stream_format), video_path, output_path)
+    print(f"Audio added successfully and saved to: {output_path}", file=sys.stderr)
+
+def stream_upscale(input_path, output_path, target_height=2160, preset='medium', crf=18,
+                   stream_format='mpegts'):
+    """
+    Lanczos upscale (same filter chain as upscale_video_ffmpeg) on a stream
+
+    Args:
+        input_path (str): Input file or '-' for stdin
+        output_path (str): Output file, s3:// URI or '-' for stdout
+        target_height (int): Target height in pixels (default: 2160)
+        preset (str): x264 preset (default: 'medium')
+        crf (int): x264 constant rate factor (default: 18)
+        stream_format (str): Container on stdout, 'mpegts' or 'mp4' (default: 'mpegts')
+    """
+    run_stream(input_args(input_path) + [
+        '-vf', f'scale=-2:{target_height}:flags=lanczos,unsharp=5:5:1.5:5:5:0.0',
+        '-map', '0:v',
+        '-map', '0:a?',
+        '-c:v', 'libx264',
+        '-preset', preset,
+        '-crf', str(crf),
+        '-c:a', 'copy',
+    ] + output_args(output_path, stream_format), input_path, output_path)
+    print(f"Video upscaled successfully and saved to: {output_path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    # Example usage: trim a file straight to fragmented MP4 on stdout
+    # (python stream_tools.py > clip.mp4)
+    stream_trim(r"C:\data\hero\concat-all.mp4", STREAM, 6, 8, stream_format='mp4')
@@ -0,0 +1,97 @@
+# Unit tests of the harness metrics and tolerance checks; no ffmpeg or media files needed
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+pytest.importorskip('tqdm')
+
+import quality_harness
+from quality_harness import AUDIO_RATE, TOLERANCES, check, compare_audio, psnr, ssim
+
+def _frame(seed=0, size=(90, 160)):
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8)
+
+def test_psnr_identical_frames():
+    frame = _frame()
+    assert psnr(frame, frame.copy()) == 100.0
+
+def test_psnr_known_error():
+    a = np.zeros((16, 16), dtype=np.uint8)
+    b = np.full((16, 16), 10, dtype=np.uint8)
+    # MSE 100: 10 * log10(255^2 / 100)
+    assert psnr(a, b) == pytest.approx(28.1308, abs=1e-3)
+
+def test_ssim_identical_frames():
+    frame = _frame()
+    assert ssim(frame, frame.copy()) == pytest.approx(1.0)
+
+def test_ssim_drops_with_noise():
+    frame = np.tile(np.linspace(0, 255, 160), (90, 1)).astype(np.uint8)  # Smooth gradient
+    noise = np.random.default_rng(1).integers(-1, 2, frame.shape)
+    light, heavy = (np.clip(frame + noise * amount, 0, 255).astype(np.uint8) for amount in (2, 30))
+    assert ssim(frame, heavy) < ssim(frame, light) < 1.0
+    assert ssim(frame, heavy) < 0.9
+
+def _patch_samples(monkeypatch, reference, candidate):
+    samples = {'reference': reference, 'candidate': candidate}
+    monkeypatch.setattr(quality_harness, '_mono_samples', lambda path, seconds: samples[path])
+
+@pytest.mark.parametrize('lag', [0, 48, -96])
+def test_compare_audio_finds_lag(monkeypatch, lag):
+    noise = np.random.default_rng(2).standard_normal(AUDIO_RATE)
+    if lag >= 0:
+        candidate = np.concatenate([np.zeros(lag), noise[:len(noise) - lag]])
+    else:
+        candidate = np.concatenate([noise[-lag:], np.zeros(-lag)])
+    _patch_samples(monkeypatch, noise, candidate)
+
+    result = compare_audio('reference', 'candidate')
+    assert result['offset_samples'] == lag  # Positive: the candidate is late
+    assert result['offset_ms'] == pytest.approx(lag * 1000 / AUDIO_RATE, abs=1e-3)
+    assert result['correlation'] > 0.99
+
+def test_compare_audio_without_samples(monkeypatch):
+    _patch_samples(monkeypatch, np.zeros(0), np.ones(10))
+    with pytest.raises(ValueError):
+        compare_audio('reference', 'candidate')
+
+def _result(**changes):
+    result = {
+        'video': {'frames_reference': 180, 'frames_candidate': 180, 'psnr_mean': 45.0, 'psnr_min': 40.0,
+                  'ssim_mean': 0.99},
+        'audio': {'offset_samples': 0, 'offset_ms': 0.0, 'correlation': 0.999},
+    }
+    for section, values in changes.items():
+        result[section] = values if not isinstance(values, dict) else dict(result[section], **values)
+    return result
+
+def test_check_passes_within_tolerances():
+    assert check(_result(), TOLERANCES) == []
+
+@pytest.mark.parametrize('changes, expected', [
+    ({'video': {'frames_candidate': 175}}, 'frame count'),
+    ({'video': {'psnr_mean': 30.0}}, 'mean PSNR'),
+    ({'video': {'psnr_min': 20.0}}, 'worst frame PSNR'),
+    ({'video': {'ssim_mean': 0.5}}, 'mean SSIM'),
+    ({'video': {'psnr_mean': None}}, 'no frames'),
+    ({'audio': {'offset_samples': 96, 'offset_ms': 2.0}}, 'audio offset'),
+    ({'audio': {'correlation': 0.5}}, 'audio correlation'),
+    ({'audio': 'missing'}, 'audio missing'),
+])
+def test_check_reports_breaches(changes, expected):
+    failures = check(_result(**changes), TOLERANCES)
+    assert len(failures) == 1 and failures[0].startswith(expected)
+
+def test_upscale_cases_skip_backends_without_variants(monkeypatch):
+    import upscaler_engine
+    backends = {
+        'lanczos_sharpen': {'name': 'lanczos_sharpen', 'variants': [(0, {'threads': 0})], 'requires': ()},
+        'dnn': {'name': 'dnn', 'variants': [], 'requires': ()},  # No model weights on disk
+        'ffmpeg': {'name': 'ffmpeg', 'variants': [(0, {'preset': 'slow'})], 'requires': ()},
+    }
+    monkeypatch.setattr(upscaler_engine, 'BACKENDS', backends)
+    monkeypatch.setattr(quality_harness, 'CASES', {})
+    monkeypatch.setattr(quality_harness, 'REFERENCES', {})
+
+    quality_harness._register_upscale_cases()
+    assert list(quality_harness.CASES) == ['upscale_ffmpeg']
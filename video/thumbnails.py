@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import cv2
+import numpy as np
+
+from cache_utils import file_version, touch, enforce_budget
+from ffmpeg_runner import RUNNER
+from seek_index import load_seek_index, frame_at_time, nearest_keyframe
+
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'thumbnails')
+THUMBNAIL_CACHE_BUDGET = 512 * 1024 ** 2  # 512 MiB
+
+def thumbnail_times(index, count):
+    """
+    Evenly spaced timestamps and the keyframe each one maps to
+
+    Returns:
+        list: (time, keyframe_pts) per thumbnail
+    """
+    duration = float(index['pts'][-1])
+    times = (np.arange(count) + 0.5) * duration / count  # Middle of each slot
+    return [(float(t), nearest_keyframe(index, frame_at_time(index, t))[1]) for t in times]
+
+def generate_filmstrip(input_path, count=100, thumb_width=160, columns=10, cache_dir=THUMBNAIL_CACHE_DIR):
+    """
+    Build a sprite sheet of evenly spaced thumbnails plus a JSON timing map
+
+    Each thumbnail is the keyframe at or before its timestamp, found with the seek
+    index. Keyframes are decoded directly (-skip_frame nokey, one small ffmpeg per
+    distinct keyframe, run concurrently on the shared runner) and scaled down in the
+    same process, so generation time depends on the number of thumbnails, not on the
+    length of the source. Results are cached per file version.
+
+    Args:
+        input_path (str): Path to the input video file
+        count (int): Number of thumbnails (default: 100)
+        thumb_width (int): Thumbnail width in pixels, height keeps aspect (default: 160)
+        columns (int): Thumbnails per sprite row (default: 10)
+        cache_dir (str): Cache folder
+
+    Returns:
+        tuple: (sprite_path, map_path); the map lists 'time', 'keyframe_time', 'x', 'y' per thumbnail
+    """
+    key = hashlib.sha1(f"{file_version(input_path)}:{count}:{thumb_width}:{columns}".encode('utf-8')).hexdigest()
+    sprite_path = os.path.join(cache_dir, f"{key}.jpg")
+    map_path = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(sprite_path) and os.path.exists(map_path):
+        touch(sprite_path)
+        touch(map_path)
+        return sprite_path, map_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_seek_index(input_path)
+    slots = thumbnail_times(index, count)
+    keyframes = sorted({pts for _, pts in slots})
+
+    work_dir = tempfile.mkdtemp(prefix='thumbs_')
+    try:
+        # One decode per distinct keyframe; long GOPs map several slots to the same one
+        frame_paths = {pts: os.path.join(work_dir, f"{i:05d}.png") for i, pts in enumerate(keyframes)}
+        RUNNER.run_many_sync([[
+            '-skip_frame', 'nokey',
+            '-ss', f'{pts:.6f}',
+            '-i', input_path,
+            '-map', '0:v:0',
+            '-frames:v', '1',
+            '-vf', f'scale={thumb_width}:-2:flags=fast_bilinear',
+            '-y',
+            frame_paths[pts]
+        ] for pts in keyframes])
+
+        frames = {pts: cv2.imread(path) for pts, path in frame_paths.items()}
+        sample = next((frame for frame in frames.values() if frame is not None), None)
+        if sample is None:
+            raise IOError(f"Could not decode any keyframe of: {input_path}")
+        thumb_height = sample.shape[0]
+
+        rows = -(-count // columns)
+        sprite = np.zeros((rows * thumb_height, columns * thumb_width, 3), dtype=np.uint8)
+        entries = []
+        for i, (t, pts) in enumerate(slots):
+            x, y = (i % columns) * thumb_width, (i // columns) * thumb_height
+            frame = frames[pts]
+            if frame is not None:
+                h, w = frame.shape[:2]
+                sprite[y:y + min(h, thumb_height), x:x + min(w, thumb_width)] = frame[:thumb_height, :thumb_width]
+            entries.append({'time': round(t, 3), 'keyframe_time': round(pts, 3), 'x': x, 'y': y})
+
+        timing_map = {
+            'sprite': os.path.basename(sprite_path),
+            'thumb_width': thumb_width,
+            'thumb_height': thumb_height,
+            'columns': columns,
+            'rows': rows,
+            'duration': float(index['pts'][-1]),
+            'thumbnails': entries,
+        }
+
+        # Write both atomically; the map last so its presence means the entry is complete
+        tmp_sprite = f"{sprite_path}.{uuid.uuid4().hex}.jpg"
+        if not cv2.imwrite(tmp_sprite, sprite, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+            raise IOError(f"Could not write sprite sheet: {tmp_sprite}")
+        os.replace(tmp_sprite, sprite_path)
+        tmp_map = f"{map_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_map, 'w', encoding='utf-8') as f:
+            json.dump(timing_map, f, indent=2)
+        os.replace(tmp_map, map_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        for path in (locals().get('tmp_sprite'), locals().get('tmp_map')):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    enforce_budget(cache_dir, THUMBNAIL_CACHE_BUDGET, keep=[sprite_path, map_path])
+    return sprite_path, map_path
+
+if __name__ == "__main__":
+    # Example usage: scrubbing strip for a long source
+    input_video = r"C:\data\hero\concat-all.mp4"
+
+    sprite_path, map_path = generate_filmstrip(input_video, count=100, thumb_width=160)
+    print(f"Sprite: {sprite_path}")
+    print(f"Map: {map_path}")
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import uuid
+
+from asset_cache import DEFAULT_PROFILE, get_profile, profile_encoder_args, profile_key
+from cache_utils import file_digest, touch, enforce_budget
+from ffmpeg_runner import RUNNER, concat_segments, probe_video_cached
+from preview import overlay_xy, text_sprite
+
+SEGMENT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'segments')
+SEGMENT_CACHE_BUDGET = 20 * 1024 ** 3  # 20 GiB
+
+# Settings of each op that change the picture; anything else in an op dict is ignored
+OP_FIELDS = {
+    'text': ('text', 'font_size', 'color', 'position', 'font', 'stroke_color', 'stroke_width'),
+    'logo': ('logo_path', 'position', 'size', 'padding'),
+}
+
+def segment_key(clip, profile):
+    """
+    Cache key of a clip's rendered segment: source content, trim range, op chain and profile
+
+    Files referenced by ops (logos) are keyed by content too, so replacing a logo file
+    re-renders the clips that use it.
+    """
+    ops = []
+    for op in clip.get('ops', []):
+        if op['op'] not in OP_FIELDS:
+            raise ValueError(f"Unknown timeline op: {op['op']}")
+        settings = {name: op[name] for name in OP_FIELDS[op['op']] if name in op}
+        if 'logo_path' in settings:
+            settings['logo_path'] = file_digest(settings['logo_path'])
+        ops.append([op['op'], settings])
+    payload = json.dumps([file_digest(clip['source']), clip.get('trim'), ops, profile_key(profile)], sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def segment_args(clip, profile, output_path, cache_dir=SEGMENT_CACHE_DIR):
+    """
+    ffmpeg arguments that render one clip in a single pass: trim, fit to the profile,
+    apply its ops in order and encode with the profile's settings
+
+    Ops work in output-profile pixels (positions, font size and logo size refer to the
+    normalized frame), so the same op looks the same on every clip of the timeline.
+    """
+    profile = get_profile(profile)
+    width, height = profile['width'], profile['height']
+
+    args = []
+    if clip.get('trim'):
+        start, end = clip['trim']
+        args += ['-ss', f'{start:.6f}', '-t', f'{end - start:.6f}']
+    args += ['-i', clip['source']]
+
+    filters = [f"[0:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+               f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={profile['fps']}[v0]"]
+    label = '[v0]'
+    for number, op in enumerate(clip.get('ops', []), 1):
+        input_index = number  # One extra input per op, in op order
+        if op['op'] == 'text':
+            args += ['-i', text_sprite(op, 1.0, cache_dir)]
+            x, y = overlay_xy(op.get('position', 'center'), 5)
+            filters.append(f'{label}[{input_index}:v]overlay={x}:{y}[v{number}]')
+        elif op['op'] == 'logo':
+            args += ['-i', op['logo_path']]
+            size = op.get('size')
+            logo = f'[{input_index}:v]scale={size[0]}:{size[1]}[logo{number}];' if size else ''
+            x, y = overlay_xy(op.get('position', 'top-left'), op.get('padding', 5))
+            source = f'[logo{number}]' if size else f'[{input_index}:v]'
+            filters.append(f'{logo}{label}{source}overlay={x}:{y}[v{number}]')
+        else:
+            raise ValueError(f"Unknown timeline op: {op['op']}")
+        label = f'[v{number}]'
+
+    if probe_video_cached(clip['source'])['has_audio']:
+        audio_map = ['-map', '0:a:0']
+    else:
+        # Every segment needs the same streams for a lossless splice
+        layout = 'stereo' if profile['audio_channels'] == 2 else 'mono'
+        args += ['-f', 'lavfi', '-i', f"anullsrc=r={profile['audio_fps']}:cl={layout}"]
+        audio_map = ['-map', f"{len(clip.get('ops', [])) + 1}:a:0", '-shortest']
+
+    return args + ['-filter_complex', ';'.join(filters), '-map', label] + audio_map + \
+        profile_encoder_args(profile) + ['-movflags', '+faststart', '-y', output_path]
+
+def render_timeline(clips, output_path, profile=DEFAULT_PROFILE, cache_dir=SEGMENT_CACHE_DIR):
+    """
+    Render a list of clips with per-clip ops, re-encoding only the clips that changed
+
+    Every clip is rendered to its own segment in the output profile and cached under a key
+    made of its source content, trim range, op chain and the profile. On a re-render the
+    unchanged segments are reused as they are, the missing ones are rendered concurrently,
+    and all segments are spliced without re-encoding. Changing one clip's caption costs
+    one clip's render plus a stream copy of the timeline.
+
+    Args:
+        clips (list): One dict per clip, in playback order:
+                      - 'source' (str): Path of the source video
+                      - 'trim' (tuple): Optional (start, end) in seconds
+                      - 'ops' (list): Optional edits applied in order, e.g.
+                        {'op': 'text', 'text': 'Hero Xoom 160', 'font_size': 70, 'color': 'Red', 'position': ('right', 'top')}
+                        {'op': 'logo', 'logo_path': 'logo.png', 'position': 'top-left', 'size': (100, 100), 'padding': 5}
+        output_path (str): Path where the final video will be saved
+        profile (str/dict): Output profile all segments are encoded to (default: DEFAULT_PROFILE)
+        cache_dir (str): Segment cache folder
+
+    Returns:
+        dict: 'segments' (paths in order), 'rendered' and 'reused' clip counts
+    """
+    if not clips:
+        raise ValueError("The timeline has no clips")
+    for clip in clips:
+        if not os.path.exists(clip['source']):
+            raise FileNotFoundError(f"Clip source not found: {clip['source']}")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    segments = []
+    missing = {}  # segment path -> (clip, tmp path); identical clips render once
+    for clip in clips:
+        segment_path = os.path.join(cache_dir, f"{segment_key(clip, profile)}.mp4")
+        segments.append(segment_path)
+        if os.path.exists(segment_path):
+            touch(segment_path)
+        elif segment_path not in missing:
+            missing[segment_path] = (clip, f"{segment_path}.{uuid.uuid4().hex}.mp4")
+
+    print(f"Timeline: {len(clips)} clips, {len(missing)} to render, {len(clips) - len(missing)} cached")
+    try:
+        RUNNER.run_many_sync([segment_args(clip, profile, tmp_path, cache_dir)
+                              for clip, tmp_path in missing.values()])
+        for segment_path, (_, tmp_path) in missing.items():
+            os.replace(tmp_path, segment_path)
+    finally:
+        for _, tmp_path in missing.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    concat_segments(segments, output_path)
+    enforce_budget(cache_dir, SEGMENT_CACHE_BUDGET, keep=segments)
+    print(f"Timeline rendered successfully and saved to: {output_path}")
+    return {'segments': segments, 'rendered': len(missing), 'reused': len(clips) - len(missing)}
+
+def load_timeline(spec_path):
+    """
+    Reads a timeline JSON file: {"profile": "1080p30", "clips": [...]} with clips as in
+    render_timeline; relative paths are resolved against the file's folder
+
+    Returns:
+        tuple: (clips, profile)
+    """
+    with open(spec_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(spec_path))
+    clips = spec['clips']
+    for clip in clips:
+        clip['source'] = os.path.join(base_dir, clip['source'])
+        for op in clip.get('ops', []):
+            if 'logo_path' in op:
+                op['logo_path'] = os.path.join(base_dir, op['logo_path'])
+            if isinstance(op.get('position'), list):
+                op['position'] = tuple(op['position'])
+    return clips, spec.get('profile', DEFAULT_PROFILE)
+
+if __name__ == "__main__":
+    # Example usage: the trim-s1..s12 edit from video_editor.py as a cached timeline
+    base_dir = r"C:\data\hero"
+    logo_path = r"C:\data\hero\hero-logo.png"
+
+    clips = []
+    for i in range(1, 13):
+        if i == 2:  # Skip s2
+            continue
+        clips.append({
+            'source': fr"{base_dir}\trim-s{i}.mp4",
+            'ops': [
+                {'op': 'text', 'text': "Hero Xoom 160", 'font_size': 70, 'color': 'Red', 'position': ('right', 'top')},
+                {'op': 'logo', 'logo_path': logo_path, 'position': 'top-left', 'size': (100, 100)},
+            ],
+        })
+
+    result = render_timeline(clips, fr"{base_dir}\concat-all.mp4", profile='1080p30')
+    print(f"Rendered {result['rendered']} clip(s), reused {result['reused']}")
+
+    # Change one caption: only that clip is rendered again
+    clips[6]['ops'].insert(0, {'op': 'text', 'text': "Twin Rear Suspension", 'font_size': 50,
+                               'color': 'White', 'position': ('left', 'bottom')})
+    result = render_timeline(clips, fr"{base_dir}\concat-all.mp4", profile='1080p30')
+    print(f"Rendered {result['rendered']} clip(s), reused {result['reused']}")
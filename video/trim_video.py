@@ -1,7 +1,56 @@
-from moviepy.editor import VideoFileClip
 import os
 
-def trim_video(input_path, output_path, start_time, end_time):
+from ffmpeg_runner import run_ffmpeg
+from seek_index import load_seek_index, frame_at_time, nearest_keyframe
+
+def fast_trim(input_path, output_path, start_time, end_time, index=None):
+    """
+    Trim a video using its seek index to jump straight to the right keyframe
+
+    If the cut starts on a keyframe the streams are copied without re-encoding,
+    otherwise only the frames between the keyframe and the cut are decoded and dropped.
+
+    Args:
+        input_path (str): Path to the input video file
+        output_path (str): Path where the trimmed video will be saved
+        start_time (float): Start time in seconds
+        end_time (float): End time in seconds
+        index (numpy.ndarray): Seek index of the input (loaded or built if None)
+    """
+    if index is None:
+        index = load_seek_index(input_path)
+
+    start_frame = frame_at_time(index, start_time)
+    keyframe_number, keyframe_pts = nearest_keyframe(index, start_frame)
+    duration = end_time - start_time
+
+    if keyframe_number == start_frame:
+        # Cut point is a keyframe: no decoding needed at all
+        ffmpeg_args = [
+            '-ss', f'{keyframe_pts:.6f}',
+            '-i', input_path,
+            '-t', f'{duration:.6f}',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-y',
+            output_path
+        ]
+    else:
+        # Seek to the keyframe, then decode forward only up to the cut point
+        ffmpeg_args = [
+            '-ss', f'{keyframe_pts:.6f}',
+            '-i', input_path,
+            '-ss', f'{start_time - keyframe_pts:.6f}',
+            '-t', f'{duration:.6f}',
+            '-c:v', 'libx264',
+            '-c:a', 'aac',
+            '-y',
+            output_path
+        ]
+
+    run_ffmpeg(ffmpeg_args)
+
+def trim_video(input_path, output_path, start_time, end_time, use_index=True, encode_plan=None):
     """
     Trim a video file based on start and end times (in seconds)
 
@@ -10,8 +59,25 @@ def trim_video(input_path, output_path, start_time, end_time):
         output_path (str): Path where the trimmed video will be saved
         start_time (float): Start time in seconds
         end_time (float): End time in seconds
+        use_index (bool): Use the seek index for a fast, keyframe-accurate trim (default: True).
+                          Falls back to MoviePy if it fails.
+        encode_plan (dict): Rate control from encode_planner, starting from MoviePy's medium/CRF 23: a plan
+                            from plan_encode, or its constraints to plan on the input, e.g.
+                            {'target_size': '700MB', 'deadline': 600}
+                            (always written through MoviePy: a stream copy can't follow a plan)
     """
     try:
+        if use_index and encode_plan is None:
+            try:
+                fast_trim(input_path, output_path, start_time, end_time)
+                print(f"Video trimmed successfully and saved to: {output_path}")
+                return
+            except Exception as e:
+                print(f"Warning: Fast trim failed, falling back to MoviePy. Error: {e}")
+
+        # MoviePy is only needed for the slow path
+        from moviepy.editor import VideoFileClip
+
         # Load the video file
         video = VideoFileClip(input_path)
 
@@ -19,11 +85,13 @@ def trim_video(input_path, output_path, start_time, end_time):
         trimmed_video = video.subclip(start_time, end_time)
 
         # Write the trimmed video to file
-        trimmed_video.write_videofile(
-            output_path,
-            codec='libx264',
-            audio_codec='aac'
-        )
+        write_kwargs = {'codec': 'libx264', 'audio_codec': 'aac'}
+        if encode_plan is not None:
+            from encode_planner import moviepy_write_kwargs, resolve_plan, writer_settings
+            plan = resolve_plan(encode_plan, input_path, output_duration=trimmed_video.duration,
+                                **writer_settings(write_kwargs))
+            write_kwargs = moviepy_write_kwargs(plan, write_kwargs)
+        trimmed_video.write_videofile(output_path, **write_kwargs)
 
         # Close the video files to free up memory
         video.close()
@@ -33,6 +101,7 @@ def trim_video(input_path, output_path, start_time, end_time):
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        raise
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,318 @@
+import functools
+import importlib.util
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+
+from ffmpeg_runner import probe_video, run_ffmpeg
+from seek_index import count_frames, load_seek_index, read_frame_at
+
+# Highest backend quality allowed for each requested quality level
+QUALITY_LEVELS = {'low': 30, 'medium': 60, 'high': 100}
+
+# name -> backend dict, see register_backend
+BACKENDS = {}
+
+def register_backend(name, quality, variants, run, make_transform=None, benchmark=None, requires=()):
+    """
+    Register an upscaler backend with the engine
+
+    A backend is benchmarked either per frame (make_transform) or as a whole
+    (benchmark, for backends like FFmpeg that do their own decoding and encoding).
+
+    Args:
+        name (str): Backend name
+        quality (int): Quality rank, higher is better (see QUALITY_LEVELS)
+        variants (list): (quality_bonus, params) tuples, best first. params are passed to
+                         run/make_transform/benchmark (tile size, threads, preset, ...)
+        run (callable): run(input_path, output_path, info, target_height, params) renders the video
+        make_transform (callable): make_transform(info, target_height, params) returns a function
+                                   mapping one BGR frame to its upscaled version
+        benchmark (callable): benchmark(input_path, info, target_height, params) returns seconds per frame
+        requires (iterable): Modules that must be importable for the backend to be used
+    """
+    BACKENDS[name] = {
+        'name': name,
+        'quality': quality,
+        'variants': variants,
+        'run': run,
+        'make_transform': make_transform,
+        'benchmark': benchmark,
+        'requires': tuple(requires),
+    }
+
+def is_available(backend):
+    """Returns True if all the optional modules a backend needs are installed."""
+    return all(importlib.util.find_spec(module) is not None for module in backend['requires'])
+
+def output_size(info, target_height):
+    """(width, height) of the upscaled video, keeping aspect ratio and even dimensions."""
+    new_width = int(info['width'] * target_height / info['height'])
+    return new_width - (new_width % 2), target_height - (target_height % 2)
+
+def sample_frames(input_path, count=8):
+    """Decodes a few frames spread over the video, seeking with the seek index."""
+    index = load_seek_index(input_path)
+    duration = float(index['pts'][-1])
+    times = np.linspace(0.1 * duration, 0.9 * duration, count)
+    frames = [read_frame_at(input_path, t, index) for t in times]
+    return [frame for frame in frames if frame is not None]
+
+def benchmark_transform(transform, frames, new_size, fps):
+    """
+    Seconds per frame of a per-frame transform, including the VideoWriter encode
+
+    Args:
+        transform (callable): BGR frame -> upscaled BGR frame
+        frames (list): Sample frames
+        new_size (tuple): (width, height) of the upscaled frames
+        fps (float): Frame rate for the throwaway writer
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, new_size, isColor=True)
+    try:
+        # First frame warms up caches/model and is not timed
+        writer.write(transform(frames[0]))
+        start = time.perf_counter()
+        for frame in frames[1:]:
+            writer.write(transform(frame))
+        return (time.perf_counter() - start) / max(1, len(frames) - 1)
+    finally:
+        writer.release()
+        os.remove(tmp_path)
+
+def upscale(input_path, output_path, target=2160, quality='high', deadline=None, sample_count=8, backends=None):
+    """
+    Upscale a video with the best backend that fits a time budget
+
+    Every candidate (backend + parameter variant) is tried from best to worst
+    quality: it is benchmarked on a short sample of this input and the first one
+    whose projected render time fits the remaining deadline is used.
+
+    Args:
+        input_path (str): Path to input video file
+        output_path (str): Path to save the upscaled video
+        target (int): Target height in pixels (default: 2160 for 4K)
+        quality (str): 'high', 'medium' or 'low' - the best quality level to consider (default: 'high')
+        deadline (float): Wall-clock budget in seconds for the whole job, None for no limit
+        sample_count (int): Frames used to benchmark per-frame backends (default: 8)
+        backends (list): Restrict the choice to these backend names (default: all registered)
+
+    Returns:
+        dict: The chosen 'backend', 'params' and 'estimated_seconds' (None without a deadline)
+    """
+    started = time.time()
+    info = probe_video(input_path)
+    frame_count = count_frames(input_path, fallback=int(info['duration'] * info['fps']))
+    new_size = output_size(info, target)
+
+    max_quality = QUALITY_LEVELS[quality]
+    candidates = []
+    for backend in BACKENDS.values():
+        if backends and backend['name'] not in backends:
+            continue
+        if backend['quality'] > max_quality or not is_available(backend):
+            continue
+        for bonus, params in backend['variants']:
+            candidates.append((backend['quality'] + bonus, backend, params))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+    if not candidates:
+        raise ValueError("No upscaler backend available for the requested quality")
+
+    choice = None
+    fastest = None
+    frames = None
+    if deadline is None:
+        choice = (candidates[0][1], candidates[0][2], None)
+    else:
+        for score, backend, params in candidates:
+            try:
+                if backend['make_transform']:
+                    if frames is None:
+                        frames = sample_frames(input_path, sample_count)
+                    transform = backend['make_transform'](info, target, params)
+                    seconds_per_frame = benchmark_transform(transform, frames, new_size, info['fps'])
+                else:
+                    seconds_per_frame = backend['benchmark'](input_path, info, target, params)
+            except Exception as e:
+                print(f"Warning: Benchmark of {backend['name']} {params} failed: {e}")
+                continue
+
+            estimate = seconds_per_frame * frame_count
+            remaining = deadline - (time.time() - started)
+            print(f"{backend['name']} {params}: ~{estimate:.0f}s (remaining budget {remaining:.0f}s)")
+
+            if fastest is None or estimate < fastest[2]:
+                fastest = (backend, params, estimate)
+            if estimate <= remaining:
+                choice = (backend, params, estimate)
+                break
+
+        if choice is None:
+            if fastest is None:
+                raise RuntimeError("Every upscaler backend failed its benchmark")
+            print("Warning: No backend meets the deadline, using the fastest one")
+            choice = fastest
+
+    backend, params, estimate = choice
+    print(f"Using backend '{backend['name']}' with {params} for {new_size[0]}x{new_size[1]}")
+    backend['run'](input_path, output_path, info, target, params)
+    return {'backend': backend['name'], 'params': params, 'estimated_seconds': estimate}
+
+# --- Built-in backends ---
+# Backend modules are imported when used so that e.g. torch is only loaded for ESRGAN.
+
+def _esrgan_transform(info, target_height, params):
+    from video_upscaler import esrgan_upscale_frame, load_upsampler
+    upsampler = load_upsampler(params['model_name'], tile=params['tile'])
+    return functools.partial(esrgan_upscale_frame, upsampler=upsampler, scale=target_height / info['height'])
+
+def _esrgan_run(input_path, output_path, info, target_height, params):
+    from video_upscaler import upscale_video
+    upscale_video(input_path, output_path, scale=target_height / info['height'], **params)
+
+register_backend(
+    'esrgan',
+    quality=100,
+    variants=[
+        # fp16 is left to load_upsampler: on when CUDA is available, off on CPU
+        (0, {'model_name': 'RealESRGAN_x4plus', 'tile': 0}),
+        (-2, {'model_name': 'RealESRGAN_x4plus', 'tile': 512}),
+        (-10, {'model_name': 'realesr-animevideov3', 'tile': 0}),
+    ],
+    run=_esrgan_run,
+    make_transform=_esrgan_transform,
+    requires=('torch', 'basicsr', 'realesrgan'),
+)
+
+def _dnn_transform(info, target_height, params):
+    from video_upscaler_dnn import load_sr_net, sr_upscale_frame
+    net = load_sr_net(params['model_path'], params['threads'])
+    return functools.partial(sr_upscale_frame, net=net, new_size=output_size(info, target_height),
+                             luma_only=params['luma_only'])
+
+def _dnn_run(input_path, output_path, info, target_height, params):
+    from video_upscaler_dnn import upscale_video
+    upscale_video(input_path, output_path, target_height=target_height, **params)
+
+def _dnn_variants():
+    """One variant per model whose weights are present locally."""
+    from video_upscaler_dnn import FSRCNN_MODEL_PATH, ESPCN_MODEL_PATH
+    variants = []
+    for bonus, model_path in ((0, FSRCNN_MODEL_PATH), (-5, ESPCN_MODEL_PATH)):
+        if os.path.exists(model_path):
+            variants.append((bonus, {'model_path': model_path, 'batch_size': 8, 'luma_only': True, 'threads': 0}))
+    return variants
+
+register_backend(
+    'dnn',
+    quality=60,
+    variants=_dnn_variants(),
+    run=_dnn_run,
+    make_transform=_dnn_transform,
+)
+
+def _ffmpeg_benchmark(input_path, info, target_height, params, sample_seconds=2.0):
+    """Encodes a short window from the middle of the input and returns seconds per frame."""
+    new_width, new_height = output_size(info, target_height)
+    start = max(0.0, info['duration'] / 2 - sample_seconds / 2)
+    fd, tmp_path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    try:
+        began = time.perf_counter()
+        progress = run_ffmpeg([
+            '-ss', f'{start:.3f}',
+            '-i', input_path,
+            '-t', f'{sample_seconds:.3f}',
+            '-vf', f'scale={new_width}:{new_height}:flags=lanczos,unsharp=5:5:1.5:5:5:0.0',
+            '-c:v', 'libx264',
+            '-preset', params['preset'],
+            '-crf', str(params['crf']),
+            '-threads', str(params['threads']),
+            '-an',
+            '-y',
+            tmp_path
+        ])
+        elapsed = time.perf_counter() - began
+        frames = int(progress.get('frame', 0)) or int(sample_seconds * info['fps'])
+        return elapsed / frames
+    finally:
+        os.remove(tmp_path)
+
+def _ffmpeg_run(input_path, output_path, info, target_height, params):
+    from video_upscaler_ffmpeg import upscale_video_ffmpeg
+    upscale_video_ffmpeg(input_path, output_path, target_height=target_height, **params)
+
+register_backend(
+    'ffmpeg',
+    quality=40,
+    variants=[
+        (0, {'preset': 'slow', 'crf': 18, 'threads': 0}),
+        (-2, {'preset': 'medium', 'crf': 18, 'threads': 0}),
+        (-5, {'preset': 'fast', 'crf': 19, 'threads': 0}),
+        (-10, {'preset': 'veryfast', 'crf': 20, 'threads': 0}),
+    ],
+    run=_ffmpeg_run,
+    benchmark=_ffmpeg_benchmark,
+)
+
+def _set_cv2_threads(threads):
+    """OpenCV's thread count is process-wide and 0 disables threading, so 0 keeps the default."""
+    if threads:
+        cv2.setNumThreads(threads)
+
+def _lanczos_sharpen_transform(info, target_height, params):
+    from video_upscaler_cv2 import sharpen_upscale_frame
+    _set_cv2_threads(params['threads'])
+    new_width, new_height = output_size(info, target_height)
+    return functools.partial(sharpen_upscale_frame, new_width=new_width, new_height=new_height)
+
+def _lanczos_sharpen_run(input_path, output_path, info, target_height, params):
+    from video_upscaler_cv2 import upscale_video
+    _set_cv2_threads(params['threads'])
+    upscale_video(input_path, output_path, target_height=target_height)
+
+register_backend(
+    'lanczos_sharpen',
+    quality=30,
+    variants=[(0, {'threads': 0})],
+    run=_lanczos_sharpen_run,
+    make_transform=_lanczos_sharpen_transform,
+)
+
+def _lanczos_scale_transform(info, target_height, params):
+    from video_upscaler_simple import lanczos_upscale_frame
+    _set_cv2_threads(params['threads'])
+    new_width, new_height = output_size(info, target_height)
+    return functools.partial(lanczos_upscale_frame, new_width=new_width, new_height=new_height)
+
+def _lanczos_scale_run(input_path, output_path, info, target_height, params):
+    from video_upscaler_simple import upscale_video
+    _set_cv2_threads(params['threads'])
+    upscale_video(input_path, output_path, scale=target_height / info['height'])
+
+register_backend(
+    'lanczos',
+    quality=25,
+    variants=[(0, {'threads': 0})],
+    run=_lanczos_scale_run,
+    make_transform=_lanczos_scale_transform,
+)
+
+if __name__ == "__main__":
+    # Example usage: best quality that finishes within 20 minutes
+    input_video = r"C:\data\hero\concat-all-text.mp4"
+    output_video = r"C:\data\hero\concat-all-4k-auto.mp4"
+
+    result = upscale(
+        input_video,
+        output_video,
+        target=2160,
+        quality='high',
+        deadline=20 * 60
+    )
+    print(result)
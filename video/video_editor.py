@@ -1,13 +1,12 @@
 from moviepy.editor import VideoFileClip, concatenate_videoclips, TextClip, CompositeVideoClip, ImageClip, AudioFileClip
 import os
-from moviepy.config import change_settings
 import cv2
 import numpy as np
 
-# Configure moviepy to use ImageMagick
-change_settings({"IMAGEMAGICK_BINARY": r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe"})
+from trim_video import fast_trim
+from config import configure_imagemagick
 
-def trim_video(input_path, output_path, start_time, end_time):
+def trim_video(input_path, output_path, start_time, end_time, use_index=True):
     """
     Trim a video file based on start and end times (in seconds)
     
@@ -16,8 +15,17 @@ def trim_video(input_path, output_path, start_time, end_time):
         output_path (str): Path where the trimmed video will be saved
         start_time (float): Start time in seconds
         end_time (float): End time in seconds
+        use_index (bool): Use the seek index for a fast, keyframe-accurate trim (default: True)
     """
     try:
+        if use_index:
+            try:
+                fast_trim(input_path, output_path, start_time, end_time)
+                print(f"Video trimmed successfully and saved to: {output_path}")
+                return
+            except Exception as e:
+                print(f"Warning: Fast trim failed, falling back to MoviePy. Error: {e}")
+        
         # Load the video file
         video = VideoFileClip(input_path)
         
@@ -89,6 +97,8 @@ def add_text_overlay(input_path, output_path, text, font_size=70, color='white',
                             or tuple of (x,y) coordinates (default: 'center')
     """
     try:
+        configure_imagemagick()
+        
         # Load the video
         video = VideoFileClip(input_path)
         
@@ -1,77 +1,153 @@
 import cv2
 import numpy as np
-import torch
-from basicsr.archs.rrdbnet_arch import RRDBNet
-from basicsr.utils.download_util import load_file_from_url
-from basicsr.utils import img2tensor, tensor2img
-from realesrgan import RealESRGANer
 import os
+import functools
 from tqdm import tqdm
 
-def upscale_video(input_path, output_path, scale=4, model_name='RealESRGAN_x4plus'):
+from seek_index import count_frames
+from resumable_upscale import resumable_upscale
+from frame_ring import parallel_transform
+
+def esrgan_upscale_frame(frame, upsampler, scale):
+    """Upscales one BGR frame with a RealESRGANer and returns it as BGR."""
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    output, _ = upsampler.enhance(frame_rgb, outscale=scale)
+    return cv2.cvtColor(output, cv2.COLOR_RGB2BGR)
+
+def load_upsampler(model_name='RealESRGAN_x4plus', tile=0, half=None):
+    """
+    Build a RealESRGANer for one of the supported models, downloading weights if needed
+    
+    Args:
+        model_name (str): RealESRGAN_x4plus, RealESRGAN_x4plus_anime_6B or realesr-animevideov3
+        tile (int): Tile size in pixels, 0 to process whole frames (default: 0)
+        half (bool): Use fp16 inference (default: None, only when CUDA is available - fp16 fails on CPU)
+    """
+    # Imported here so that importing this module (e.g. for the CLI) doesn't load torch
+    import torch
+    from basicsr.archs.rrdbnet_arch import RRDBNet
+    from basicsr.utils.download_util import load_file_from_url
+    from realesrgan import RealESRGANer
+    from realesrgan.archs.srvgg_arch import SRVGGNetCompact
+
+    if half is None:
+        half = torch.cuda.is_available()
+
+    if model_name == 'RealESRGAN_x4plus':
+        model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=4)
+        netscale = 4
+        file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.1.0/RealESRGAN_x4plus.pth']
+    elif model_name == 'RealESRGAN_x4plus_anime_6B':
+        model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=6, num_grow_ch=32, scale=4)
+        netscale = 4
+        file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.2.4/RealESRGAN_x4plus_anime_6B.pth']
+    elif model_name == 'realesr-animevideov3':
+        # Compact VGG-style network, not RRDB
+        model = SRVGGNetCompact(num_in_ch=3, num_out_ch=3, num_feat=64, num_conv=16, upscale=4, act_type='prelu')
+        netscale = 4
+        file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-animevideov3.pth']
+    else:
+        raise ValueError(f"Unknown model: {model_name}")
+    
+    # Download the model weights if not exists
+    model_path = load_file_from_url(url=file_url[0], 
+                                  model_dir='weights', 
+                                  progress=True, 
+                                  file_name=None)
+    
+    # Load the model (RealESRGANer maps the weights to the CPU when there is no GPU)
+    upsampler = RealESRGANer(
+        scale=netscale,
+        model_path=model_path,
+        model=model,
+        tile=tile,
+        tile_pad=10,
+        pre_pad=0,
+        half=half,
+        gpu_id=None
+    )
+    return upsampler
+
+def make_esrgan_transform(model_name, tile, half, scale):
+    """Builds the ESRGAN per-frame transform; run in each frame ring worker since the model can't be pickled."""
+    upsampler = load_upsampler(model_name, tile=tile, half=half)
+    return functools.partial(esrgan_upscale_frame, upsampler=upsampler, scale=scale)
+
+def upscale_video(input_path, output_path, scale=4, model_name='RealESRGAN_x4plus',
+                  checkpoint_dir=None, segment_frames=300, tile=0, half=None, workers=None):
     """
     Upscale a video to higher resolution using RealESRGAN
     
     Args:
         input_path (str): Path to input video file
         output_path (str): Path to save the upscaled video
-        scale (int): Upscaling factor (default: 4)
+        scale (float): Upscaling factor (default: 4)
         model_name (str): Name of the model to use. Options:
                          - RealESRGAN_x4plus (default)
                          - RealESRGAN_x4plus_anime_6B
                          - realesr-animevideov3
+        checkpoint_dir (str): If set, write the output as checkpointed segments in this folder
+                              so an interrupted run can be resumed (default: None)
+        segment_frames (int): Frames per checkpointed segment (default: 300)
+        tile (int): Tile size in pixels, 0 to process whole frames; smaller tiles use less memory (default: 0)
+        half (bool): Use fp16 inference (default: None, on when CUDA is available)
+        workers (int): If set, run this many model instances in separate processes through the
+                       shared-memory frame ring (default: None, single process)
     """
     try:
-        # Initialize the model
-        if model_name == 'RealESRGAN_x4plus':
-            model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=4)
-            netscale = 4
-            file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.1.0/RealESRGAN_x4plus.pth']
-        elif model_name == 'RealESRGAN_x4plus_anime_6B':
-            model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=6, num_grow_ch=32, scale=4)
-            netscale = 4
-            file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.2.4/RealESRGAN_x4plus_anime_6B.pth']
-        elif model_name == 'realesr-animevideov3':
-            model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=9, num_grow_ch=32, scale=4)
-            netscale = 4
-            file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-animevideov3.pth']
-        
-        # Load the model
-        upsampler = RealESRGANer(
-            scale=netscale,
-            model_path=None,
-            model=model,
-            tile=0,
-            tile_pad=10,
-            pre_pad=0,
-            half=True,
-            gpu_id=0
-        )
+        if workers:
+            video = cv2.VideoCapture(input_path)
+            new_width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH) * scale)
+            new_height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT) * scale)
+            video.release()
+            new_size = (new_width - (new_width % 2), new_height - (new_height % 2))
+            parallel_transform(
+                input_path,
+                output_path,
+                new_size,
+                make_transform=functools.partial(make_esrgan_transform, model_name, tile, half, scale),
+                workers=workers,
+                fourcc='H264',
+                desc='Upscaling video'
+            )
+            return
         
-        # Download the model weights if not exists
-        model_path = load_file_from_url(url=file_url[0], 
-                                      model_dir='weights', 
-                                      progress=True, 
-                                      file_name=None)
-        upsampler.model.load_state_dict(torch.load(model_path)['params'], strict=True)
+        # Initialize the model
+        upsampler = load_upsampler(model_name, tile=tile, half=half)
         
         # Open the video
         video = cv2.VideoCapture(input_path)
         
         # Get video properties
         fps = video.get(cv2.CAP_PROP_FPS)
-        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        # CAP_PROP_FRAME_COUNT is only an estimate (often wrong for VFR footage)
+        frame_count = count_frames(input_path, fallback=int(video.get(cv2.CAP_PROP_FRAME_COUNT)))
         width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
         # Calculate new dimensions
-        new_width = width * scale
-        new_height = height * scale
+        new_width = int(width * scale)
+        new_height = int(height * scale)
         
         # Ensure dimensions are divisible by 2 (required by some codecs)
         new_width = new_width - (new_width % 2)
         new_height = new_height - (new_height % 2)
         
+        if checkpoint_dir:
+            video.release()
+            resumable_upscale(
+                input_path,
+                output_path,
+                functools.partial(esrgan_upscale_frame, upsampler=upsampler, scale=scale),
+                f"esrgan:{model_name}:x{scale}:tile{tile}:{'fp16' if upsampler.half else 'fp32'}",
+                (new_width, new_height),
+                checkpoint_dir=checkpoint_dir,
+                segment_frames=segment_frames,
+                fourcc='H264'
+            )
+            print(f"New resolution: {new_width}x{new_height}")
+            return
+        
         # Initialize video writer with high quality settings
         fourcc = cv2.VideoWriter_fourcc(*'H264')
         out = cv2.VideoWriter(
@@ -89,14 +165,8 @@ def upscale_video(input_path, output_path, scale=4, model_name='RealESRGAN_x4plu
             if not ret:
                 break
             
-            # Convert BGR to RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Upscale the frame
-            output, _ = upsampler.enhance(frame_rgb, outscale=scale)
-            
-            # Convert back to BGR for OpenCV
-            output_bgr = cv2.cvtColor(output, cv2.COLOR_RGB2BGR)
+            # Upscale the frame (RealESRGAN works in RGB)
+            output_bgr = esrgan_upscale_frame(frame, upsampler, scale)
             
             # Write the frame
             out.write(output_bgr)
@@ -113,6 +183,7 @@ def upscale_video(input_path, output_path, scale=4, model_name='RealESRGAN_x4plu
         
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        raise
 
 if __name__ == "__main__":
     # Example usage
@@ -2,8 +2,28 @@ import cv2
 import numpy as np
 from tqdm import tqdm
 import os
+import functools
 
-def upscale_video(input_path, output_path, target_height=2160):
+from seek_index import count_frames
+from resumable_upscale import resumable_upscale
+from frame_ring import parallel_transform
+
+# Sharpening kernel applied after the Lanczos resize
+SHARPEN_KERNEL = np.array([[-1,-1,-1],
+                           [-1, 9,-1],
+                           [-1,-1,-1]]) / 9
+
+def sharpen_upscale_frame(frame, new_width, new_height):
+    """Upscales one frame with Lanczos interpolation and sharpens the result."""
+    upscaled = cv2.resize(
+        frame, 
+        (new_width, new_height), 
+        interpolation=cv2.INTER_LANCZOS4
+    )
+    return cv2.filter2D(upscaled, -1, SHARPEN_KERNEL)
+
+def upscale_video(input_path, output_path, target_height=2160, checkpoint_dir=None, segment_frames=300,
+                  workers=None):
     """
     Upscale a video to a target resolution while maintaining aspect ratio
     
@@ -11,6 +31,11 @@ def upscale_video(input_path, output_path, target_height=2160):
         input_path (str): Path to input video file
         output_path (str): Path to save the upscaled video
         target_height (int): Target height in pixels (default: 2160 for 4K)
+        checkpoint_dir (str): If set, write the output as checkpointed segments in this folder
+                              so an interrupted run can be resumed (default: None)
+        segment_frames (int): Frames per checkpointed segment (default: 300)
+        workers (int): If set, upscale frames in this many processes through the shared-memory
+                       frame ring (default: None, single process)
     """
     try:
         # Open the video
@@ -18,7 +43,8 @@ def upscale_video(input_path, output_path, target_height=2160):
         
         # Get video properties
         fps = video.get(cv2.CAP_PROP_FPS)
-        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        # CAP_PROP_FRAME_COUNT is only an estimate (often wrong for VFR footage)
+        frame_count = count_frames(input_path, fallback=int(video.get(cv2.CAP_PROP_FRAME_COUNT)))
         width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
@@ -34,6 +60,31 @@ def upscale_video(input_path, output_path, target_height=2160):
         print(f"Original resolution: {width}x{height}")
         print(f"New resolution: {new_width}x{new_height}")
         
+        if checkpoint_dir:
+            video.release()
+            resumable_upscale(
+                input_path,
+                output_path,
+                functools.partial(sharpen_upscale_frame, new_width=new_width, new_height=new_height),
+                f"lanczos_sharpen:{new_width}x{new_height}",
+                (new_width, new_height),
+                checkpoint_dir=checkpoint_dir,
+                segment_frames=segment_frames
+            )
+            return
+        
+        if workers:
+            video.release()
+            parallel_transform(
+                input_path,
+                output_path,
+                (new_width, new_height),
+                transform=functools.partial(sharpen_upscale_frame, new_width=new_width, new_height=new_height),
+                workers=workers,
+                desc='Upscaling video'
+            )
+            return
+        
         # Calculate target bitrate (higher for better quality)
         target_bitrate = int(new_width * new_height * fps * 0.2)  # 0.2 bits per pixel
         
@@ -94,18 +145,8 @@ def upscale_video(input_path, output_path, target_height=2160):
             if not ret:
                 break
             
-            # Upscale the frame using Lanczos interpolation
-            upscaled = cv2.resize(
-                frame, 
-                (new_width, new_height), 
-                interpolation=cv2.INTER_LANCZOS4
-            )
-            
-            # Apply sharpening
-            kernel = np.array([[-1,-1,-1],
-                             [-1, 9,-1],
-                             [-1,-1,-1]]) / 9
-            upscaled = cv2.filter2D(upscaled, -1, kernel)
+            # Upscale the frame using Lanczos interpolation and sharpen it
+            upscaled = sharpen_upscale_frame(frame, new_width, new_height)
             
             # Write the frame
             writer.write(upscaled)
@@ -125,6 +166,7 @@ def upscale_video(input_path, output_path, target_height=2160):
             video.release()
         if 'writer' in locals() and writer is not None:
             writer.release()
+        raise
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,184 @@
+import cv2
+import numpy as np
+import os
+from tqdm import tqdm
+
+from seek_index import count_frames
+
+# Default weights: FSRCNN/ESPCN models as published for OpenCV's dnn_superres module
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights')
+FSRCNN_MODEL_PATH = os.path.join(WEIGHTS_DIR, 'FSRCNN_x4.pb')
+ESPCN_MODEL_PATH = os.path.join(WEIGHTS_DIR, 'ESPCN_x4.pb')
+
+def load_sr_net(model_path, threads=0):
+    """
+    Load a small super-resolution network (FSRCNN/ESPCN-class .pb or .onnx) for CPU inference
+
+    Args:
+        model_path (str): Path to the local weights file
+        threads (int): OpenCV worker threads, 0 for all cores (default: 0)
+    """
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Super-resolution model not found: {model_path}")
+
+    if threads:
+        cv2.setNumThreads(threads)
+    net = cv2.dnn.readNet(model_path)
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    return net
+
+def sr_upscale_batch(net, frames, new_size, luma_only=True):
+    """
+    Upscale a batch of BGR frames in one forward pass
+
+    In luma mode only the Y channel goes through the network (which is what FSRCNN
+    and ESPCN are trained on) and chroma is upscaled with a cheap bicubic resize.
+
+    Args:
+        net (cv2.dnn.Net): Network from load_sr_net
+        frames (list): BGR frames of the same size
+        new_size (tuple): (width, height) of the output frames
+        luma_only (bool): Run the network on luma only (default: True)
+
+    Returns:
+        list: Upscaled BGR frames
+    """
+    if luma_only:
+        ycrcb = [cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb) for frame in frames]
+        blob = cv2.dnn.blobFromImages([image[:, :, 0] for image in ycrcb], scalefactor=1.0 / 255)
+        net.setInput(blob)
+        luma = net.forward()  # (N, 1, H*scale, W*scale)
+
+        upscaled = []
+        for i, image in enumerate(ycrcb):
+            y = np.clip(luma[i, 0] * 255.0, 0, 255).astype(np.uint8)
+            if (y.shape[1], y.shape[0]) != new_size:
+                y = cv2.resize(y, new_size, interpolation=cv2.INTER_LANCZOS4)
+            chroma = cv2.resize(image[:, :, 1:], new_size, interpolation=cv2.INTER_CUBIC)
+            merged = np.dstack([y, chroma])
+            upscaled.append(cv2.cvtColor(merged, cv2.COLOR_YCrCb2BGR))
+        return upscaled
+
+    blob = cv2.dnn.blobFromImages(frames, scalefactor=1.0 / 255, swapRB=True)
+    net.setInput(blob)
+    output = net.forward()  # (N, 3, H*scale, W*scale), RGB
+
+    upscaled = []
+    for i in range(len(frames)):
+        rgb = np.clip(output[i].transpose(1, 2, 0) * 255.0, 0, 255).astype(np.uint8)
+        if (rgb.shape[1], rgb.shape[0]) != new_size:
+            rgb = cv2.resize(rgb, new_size, interpolation=cv2.INTER_LANCZOS4)
+        upscaled.append(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+    return upscaled
+
+def sr_upscale_frame(frame, net, new_size, luma_only=True):
+    """Upscales a single BGR frame (batch of one); usable as a per-frame transform."""
+    return sr_upscale_batch(net, [frame], new_size, luma_only)[0]
+
+def upscale_video(input_path, output_path, model_path=FSRCNN_MODEL_PATH, target_height=2160,
+                  batch_size=8, luma_only=True, threads=0):
+    """
+    Upscale a video with a lightweight super-resolution network on CPU
+
+    The network upscales by its own factor (e.g. x4) and the result is resized to the
+    target height, so the same model can serve any target resolution.
+
+    Args:
+        input_path (str): Path to input video file
+        output_path (str): Path to save the upscaled video
+        model_path (str): Local FSRCNN/ESPCN-class weights (.pb or .onnx) (default: weights/FSRCNN_x4.pb)
+        target_height (int): Target height in pixels (default: 2160 for 4K)
+        batch_size (int): Frames per forward pass (default: 8)
+        luma_only (bool): Run the network on luma only, bicubic chroma (default: True)
+        threads (int): OpenCV worker threads, 0 for all cores (default: 0)
+    """
+    try:
+        net = load_sr_net(model_path, threads)
+
+        # Open the video
+        video = cv2.VideoCapture(input_path)
+        if not video.isOpened():
+            raise IOError(f"Cannot open video file: {input_path}")
+
+        # Get video properties
+        fps = video.get(cv2.CAP_PROP_FPS)
+        frame_count = count_frames(input_path, fallback=int(video.get(cv2.CAP_PROP_FRAME_COUNT)))
+        width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        # Calculate new dimensions maintaining aspect ratio
+        new_width = int(width * target_height / height)
+        new_width = new_width - (new_width % 2)
+        new_height = target_height - (target_height % 2)
+
+        print(f"Original resolution: {width}x{height}")
+        print(f"New resolution: {new_width}x{new_height}")
+
+        # Try different codecs in order of preference
+        codecs = [
+            ('mp4v', '.mp4'),
+            ('XVID', '.avi'),
+            ('MJPG', '.avi'),
+            ('avc1', '.mp4')
+        ]
+
+        writer = None
+        for codec, ext in codecs:
+            if output_path.endswith('.mp4') and not ext.endswith('.mp4'):
+                current_output = output_path.rsplit('.', 1)[0] + ext
+            else:
+                current_output = output_path
+            writer = cv2.VideoWriter(current_output, cv2.VideoWriter_fourcc(*codec), fps,
+                                     (new_width, new_height), isColor=True)
+            if writer.isOpened():
+                print(f"Using codec: {codec}")
+                break
+            writer.release()
+            writer = None
+
+        if writer is None:
+            raise Exception("No working codec found")
+
+        # Process frames in batches
+        pbar = tqdm(total=frame_count, desc='Upscaling video (DNN)')
+        batch = []
+        while True:
+            ret, frame = video.read()
+            if ret:
+                batch.append(frame)
+            if batch and (len(batch) == batch_size or not ret):
+                for upscaled in sr_upscale_batch(net, batch, (new_width, new_height), luma_only):
+                    writer.write(upscaled)
+                pbar.update(len(batch))
+                batch = []
+            if not ret:
+                break
+
+        # Clean up
+        pbar.close()
+        video.release()
+        writer.release()
+
+        print(f"Video upscaled successfully and saved to: {current_output}")
+
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        if 'video' in locals():
+            video.release()
+        if 'writer' in locals() and writer is not None:
+            writer.release()
+        raise
+
+if __name__ == "__main__":
+    # Example usage
+    input_video = r"C:\data\hero\concat-all-text.mp4"
+    output_video = r"C:\data\hero\concat-all-4k-fsrcnn.mp4"
+
+    upscale_video(
+        input_video,
+        output_video,
+        model_path=FSRCNN_MODEL_PATH,  # or ESPCN_MODEL_PATH for more speed
+        target_height=2160,
+        batch_size=8
+    )
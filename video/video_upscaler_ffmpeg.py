@@ -1,21 +1,29 @@
-import subprocess
 import os
-from tqdm import tqdm
+import shutil
+import tempfile
 import time
 
-# Add at the top of the file
-FFMPEG_PATH = r"C:\ffmpeg\bin\ffmpeg.exe"
-FFPROBE_PATH = r"C:\ffmpeg\bin\ffprobe.exe"
+from ffmpeg_runner import FFMPEG_PATH, FFPROBE_PATH, probe_video, run_ffmpeg
+from storage_backend import split_uri, stream_ffmpeg_output, streamable_output_args
 
-def upscale_video_ffmpeg(input_path, output_path, target_height=2160):
+def upscale_video_ffmpeg(input_path, output_path, target_height=2160, preset='slow', crf=18, threads=0, encode_plan=None):
     """
     Upscale a video using FFmpeg with high-quality settings
     
     Args:
         input_path (str): Path to input video file
-        output_path (str): Path to save the upscaled video
+        output_path (str): Path to save the upscaled video, or an s3:// URI to upload it to while
+                           it is encoded (fragmented MP4)
         target_height (int): Target height in pixels (default: 2160 for 4K)
+        preset (str): x264 preset; slower = better quality (default: 'slow')
+        crf (int): x264 constant rate factor; lower = better (default: 18)
+        threads (int): Encoder threads, 0 for automatic (default: 0)
+        encode_plan (dict): Rate control from encode_planner, starting from preset/crf: either a plan
+                            from plan_encode, or its constraints to plan on this input, e.g.
+                            {'target_size': '2GB', 'max_bitrate': '40M', 'deadline': 1800}
     """
+    passlog_dir = None
+    storage, key = split_uri(output_path)
     try:
         # Print debug information
         print(f"FFmpeg path: {FFMPEG_PATH}")
@@ -23,34 +31,9 @@ def upscale_video_ffmpeg(input_path, output_path, target_height=2160):
         print(f"Input file: {input_path}")
         print(f"Output file: {output_path}")
         
-        # Get video information using FFprobe
-        probe_cmd = [
-            FFPROBE_PATH,
-            '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height,r_frame_rate',
-            '-of', 'csv=p=0',
-            input_path
-        ]
-        
-        print("Running FFprobe command...")
-        try:
-            probe_output = subprocess.check_output(probe_cmd, stderr=subprocess.PIPE)
-            print(f"FFprobe output: {probe_output.decode('utf-8')}")
-        except subprocess.CalledProcessError as e:
-            print(f"FFprobe error: {e.stderr.decode('utf-8')}")
-            raise
-        
-        probe_output = probe_output.decode('utf-8').strip().split(',')
-        width, height = map(float, probe_output[:2])  # Only convert width and height to float
-        
-        # Handle fractional frame rate properly
-        fps_fraction = probe_output[2]
-        if '/' in fps_fraction:
-            num, den = map(int, fps_fraction.split('/'))
-            fps = num / den
-        else:
-            fps = float(fps_fraction)
+        # Get resolution, frame rate and duration in a single FFprobe call
+        info = probe_video(input_path)
+        width, height, fps = info['width'], info['height'], info['fps']
         
         # Calculate new width maintaining aspect ratio
         scale = target_height / height
@@ -60,66 +43,47 @@ def upscale_video_ffmpeg(input_path, output_path, target_height=2160):
         print(f"Original resolution: {int(width)}x{int(height)}")
         print(f"New resolution: {new_width}x{target_height}")
         
-        # FFmpeg command with high-quality settings
-        ffmpeg_cmd = [
-            FFMPEG_PATH,
-            '-i', input_path,
-            '-vf', f'scale={new_width}:{target_height}:flags=lanczos,unsharp=5:5:1.5:5:5:0.0',
-            '-c:v', 'libx264',  # Use H.264 codec
-            '-preset', 'slow',   # Slower encoding = better quality
-            '-crf', '18',       # High quality (lower = better, range 0-51)
-            '-c:a', 'aac',      # Copy audio codec
-            '-b:a', '192k',     # Audio bitrate
-            '-movflags', '+faststart',  # Enable streaming
-            '-y',               # Overwrite output file if exists
-            output_path
-        ]
-        
-        # Start FFmpeg process
-        process = subprocess.Popen(
-            ffmpeg_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-        
-        # Calculate total duration
-        duration_cmd = [
-            FFPROBE_PATH,
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            input_path
-        ]
-        duration = float(subprocess.check_output(duration_cmd).decode('utf-8').strip())
-        total_frames = int(duration * fps)
-        
-        # Setup progress bar
-        pbar = tqdm(total=total_frames, desc='Upscaling video')
-        last_frame_count = 0
-        
-        # Monitor progress
-        while True:
-            line = process.stderr.readline()
-            if not line and process.poll() is not None:
-                break
-                
-            # Try to parse frame number from FFmpeg output
-            if 'frame=' in line:
-                try:
-                    current_frame = int(line.split('frame=')[1].split()[0])
-                    pbar.update(current_frame - last_frame_count)
-                    last_frame_count = current_frame
-                except:
-                    pass
-        
-        pbar.close()
-        
-        # Check if process was successful
-        if process.returncode == 0:
-            print(f"Video upscaled successfully and saved to: {output_path}")
+        video_filter = f'scale={new_width}:{target_height}:flags=lanczos,unsharp=5:5:1.5:5:5:0.0'
+
+        if encode_plan is None:
+            encoder_passes = [[
+                '-c:v', 'libx264',  # Use H.264 codec
+                '-preset', preset,   # Slower encoding = better quality
+                '-crf', str(crf),   # High quality (lower = better, range 0-51)
+            ]]
         else:
-            raise Exception("FFmpeg encoding failed")
+            from encode_planner import resolve_plan, encoder_passes as plan_passes
+            # Sample encodes of this input with the same filter pick preset and rate control
+            encode_plan = resolve_plan(encode_plan, input_path, video_filter=video_filter, threads=threads,
+                                       preset=preset, crf=crf)
+            if encode_plan['passes'] > 1:
+                passlog_dir = tempfile.mkdtemp(prefix='passlog_')
+            encoder_passes = plan_passes(encode_plan, passlog_dir and os.path.join(passlog_dir, 'x264'))
+
+        # Progress comes from FFmpeg's -progress output; raises FFmpegError on failure
+        total_frames = int(info['duration'] * fps)
+        for number, encoder_args in enumerate(encoder_passes, 1):
+            ffmpeg_args = ['-i', input_path, '-vf', video_filter] + encoder_args + ['-threads', str(threads)]
+            if number < len(encoder_passes):
+                # Analysis pass: only the stats file matters
+                ffmpeg_args += ['-an', '-f', 'null', os.devnull]
+            elif storage is not None:
+                # Remote output: parts are uploaded while the encode runs (no progress bar)
+                ffmpeg_args += ['-c:a', 'aac', '-b:a', '192k'] + streamable_output_args(key)
+                stream_ffmpeg_output(ffmpeg_args, storage, key)
+                continue
+            else:
+                ffmpeg_args += [
+                    '-c:a', 'aac',      # Copy audio codec
+                    '-b:a', '192k',     # Audio bitrate
+                    '-movflags', '+faststart',  # Enable streaming
+                    '-y',               # Overwrite output file if exists
+                    output_path
+                ]
+            desc = 'Upscaling video' if len(encoder_passes) == 1 else f'Upscaling video (pass {number}/{len(encoder_passes)})'
+            run_ffmpeg(ffmpeg_args, total_frames=total_frames, desc=desc)
+        
+        print(f"Video upscaled successfully and saved to: {output_path}")
         
     except Exception as e:
         print(f"An error occurred: {str(e)}")
@@ -129,6 +93,76 @@ def upscale_video_ffmpeg(input_path, output_path, target_height=2160):
                 os.remove(output_path)
             except:
                 pass
+        raise
+    finally:
+        if passlog_dir:
+            shutil.rmtree(passlog_dir, ignore_errors=True)
+
+def upscale_ladder_ffmpeg(input_path, renditions, preset='slow'):
+    """
+    Render several output resolutions from a single decode of the source
+
+    The source is decoded once and the frame stream is split inside one FFmpeg
+    filter graph; every rendition is scaled and encoded in parallel and all outputs
+    are written in the same pass.
+
+    Args:
+        input_path (str): Path to input video file
+        renditions (list): One dict per output with keys:
+                           - 'height' (int): Target height in pixels
+                           - 'output_path' (str): Where to save this rendition
+                           - 'bitrate' (str): Optional video bitrate, e.g. '35M'. If omitted CRF 18 is used
+        preset (str): x264 preset used for every rendition (default: 'slow')
+    """
+    try:
+        if not renditions:
+            raise ValueError("No renditions requested")
+
+        info = probe_video(input_path)
+        width, height = info['width'], info['height']
+        total_frames = int(info['duration'] * info['fps'])
+
+        # One split branch per rendition; only sharpen branches that are upscaled
+        count = len(renditions)
+        split_labels = ''.join(f'[s{i}]' for i in range(count))
+        filters = [f'[0:v]split={count}{split_labels}']
+        for i, rendition in enumerate(renditions):
+            target_height = rendition['height']
+            new_width = int(width * target_height / height)
+            new_width = new_width - (new_width % 2)  # Ensure even number
+            chain = f'scale={new_width}:{target_height}:flags=lanczos'
+            if target_height > height:
+                chain += ',unsharp=5:5:1.5:5:5:0.0'
+            filters.append(f'[s{i}]{chain}[v{i}]')
+            print(f"Rendition {i + 1}: {new_width}x{target_height} -> {rendition['output_path']}")
+
+        ffmpeg_args = [
+            '-i', input_path,
+            '-filter_complex', ';'.join(filters)
+        ]
+        for i, rendition in enumerate(renditions):
+            ffmpeg_args += ['-map', f'[v{i}]', '-map', '0:a?', '-c:v', 'libx264', '-preset', preset]
+            if rendition.get('bitrate'):
+                # Constrained bitrate so each rung stays within its delivery budget
+                bitrate = rendition['bitrate']
+                ffmpeg_args += ['-b:v', bitrate, '-maxrate', bitrate, '-bufsize', bitrate]
+            else:
+                ffmpeg_args += ['-crf', '18']
+            ffmpeg_args += ['-c:a', 'aac', '-b:a', '192k', '-movflags', '+faststart', '-y', rendition['output_path']]
+
+        run_ffmpeg(ffmpeg_args, total_frames=total_frames, desc='Rendering ladder')
+        print(f"Rendered {count} renditions successfully")
+
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        # Don't leave partial renditions behind
+        for rendition in renditions or []:
+            if rendition.get('output_path') and os.path.exists(rendition['output_path']):
+                try:
+                    os.remove(rendition['output_path'])
+                except:
+                    pass
+        raise
 
 if __name__ == "__main__":
     # Example usage
@@ -147,4 +181,22 @@ if __name__ == "__main__":
         input_video,
         output_video,
         target_height=2160
-    ) 
\ No newline at end of file
+    ) 
+
+    # Example: fit a 2 GB delivery limit within 30 minutes (preset and rate control from sample encodes)
+    # upscale_video_ffmpeg(
+    #     input_video,
+    #     r"C:\data\hero\concat-all-4k-2gb.mp4",
+    #     target_height=2160,
+    #     encode_plan={'target_size': '2GB', 'deadline': 1800}
+    # )
+
+    # Example: full delivery ladder from one decode
+    # upscale_ladder_ffmpeg(
+    #     input_video,
+    #     [
+    #         {'height': 2160, 'bitrate': '35M', 'output_path': r"C:\data\hero\concat-all-2160p.mp4"},
+    #         {'height': 1080, 'bitrate': '8M', 'output_path': r"C:\data\hero\concat-all-1080p.mp4"},
+    #         {'height': 720, 'bitrate': '5M', 'output_path': r"C:\data\hero\concat-all-720p.mp4"},
+    #     ]
+    # )
\ No newline at end of file
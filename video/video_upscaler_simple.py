@@ -2,6 +2,22 @@ import cv2
 import numpy as np
 from tqdm import tqdm
 
+from seek_index import count_frames
+
+# Slight sharpening after the resize
+KERNEL = np.array([[-1,-1,-1],
+                   [-1, 9,-1],
+                   [-1,-1,-1]]) / 9
+
+def lanczos_upscale_frame(frame, new_width, new_height):
+    """Upscales one frame with Lanczos interpolation and applies the slight sharpening."""
+    upscaled = cv2.resize(
+        frame, 
+        (new_width, new_height), 
+        interpolation=cv2.INTER_LANCZOS4
+    )
+    return cv2.filter2D(upscaled, -1, KERNEL)
+
 def upscale_video(input_path, output_path, scale=4):
     """
     Upscale a video using OpenCV's high-quality interpolation
@@ -9,7 +25,7 @@ def upscale_video(input_path, output_path, scale=4):
     Args:
         input_path (str): Path to input video file
         output_path (str): Path to save the upscaled video
-        scale (int): Upscaling factor (default: 4)
+        scale (float): Upscaling factor (default: 4)
     """
     try:
         # Open the video
@@ -17,13 +33,14 @@ def upscale_video(input_path, output_path, scale=4):
         
         # Get video properties
         fps = video.get(cv2.CAP_PROP_FPS)
-        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        # CAP_PROP_FRAME_COUNT is only an estimate (often wrong for VFR footage)
+        frame_count = count_frames(input_path, fallback=int(video.get(cv2.CAP_PROP_FRAME_COUNT)))
         width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
         # Calculate new dimensions
-        new_width = width * scale
-        new_height = height * scale
+        new_width = int(width * scale)
+        new_height = int(height * scale)
         
         # Ensure dimensions are divisible by 2
         new_width = new_width - (new_width % 2)
@@ -80,17 +97,7 @@ def upscale_video(input_path, output_path, scale=4):
                 break
             
             # Upscale the frame using Lanczos interpolation
-            upscaled = cv2.resize(
-                frame, 
-                (new_width, new_height), 
-                interpolation=cv2.INTER_LANCZOS4
-            )
-            
-            # Apply slight sharpening
-            kernel = np.array([[-1,-1,-1],
-                             [-1, 9,-1],
-                             [-1,-1,-1]]) / 9
-            upscaled = cv2.filter2D(upscaled, -1, kernel)
+            upscaled = lanczos_upscale_frame(frame, new_width, new_height)
             
             # Write the frame
             writer.write(upscaled)
@@ -111,6 +118,7 @@ def upscale_video(input_path, output_path, scale=4):
             video.release()
         if 'writer' in locals() and writer is not None:
             writer.release()
+        raise
 
 if __name__ == "__main__":
     # Example usage
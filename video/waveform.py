@@ -0,0 +1,217 @@
+import hashlib
+import os
+import struct
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from cache_utils import file_version, touch, enforce_budget
+from ffmpeg_runner import FFmpegPipe, probe_video_cached
+
+WAVEFORM_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'waveforms')
+WAVEFORM_CACHE_BUDGET = 256 * 1024 ** 2  # 256 MiB
+
+WAVEFORM_RATE = 44100
+SAMPLES_PER_PEAK = 256  # Finest level: ~172 peaks per second
+
+# Peaks file: header, one (offset, count) entry per level, then int8 (min, max) pairs level by level
+_MAGIC = b'WFPK'
+_HEADER = struct.Struct('<4sHIIHdQ')  # magic, version, sample rate, samples per peak, levels, duration, samples
+_LEVEL = struct.Struct('<QQ')  # byte offset of the level, number of peaks
+
+# Background generation: at most two decodes at a time, one job per peaks file
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='waveform')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def waveform_path(media_path, cache_dir=WAVEFORM_CACHE_DIR):
+    """Returns the peaks file of a media file version."""
+    key = f"{file_version(media_path)}:{WAVEFORM_RATE}:{SAMPLES_PER_PEAK}"
+    return os.path.join(cache_dir, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.wfpk")
+
+def _to_int8(mins, maxs):
+    """Quantizes float peaks to int8, rounding outwards so quiet peaks never vanish."""
+    return np.stack([
+        np.clip(np.floor(mins * 127), -127, 127),
+        np.clip(np.ceil(maxs * 127), -127, 127)
+    ], axis=1).astype(np.int8)
+
+def build_pyramid(peaks):
+    """
+    Halve a (n, 2) min/max peak array until a single peak is left
+
+    Returns:
+        list: Levels from the finest (the input) to the coarsest
+    """
+    levels = [peaks]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        if len(level) % 2:
+            level = np.concatenate([level, level[-1:]])
+        pairs = level.reshape(-1, 2, 2)
+        levels.append(np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)], axis=1))
+    return levels
+
+def generate_waveform(media_path, cache_dir=WAVEFORM_CACHE_DIR, chunk_peaks=4096):
+    """
+    Decode the audio of a file once and store a min/max peak pyramid for waveform displays
+
+    ffmpeg mixes the first audio stream down to mono float32, which is read in chunks
+    and reduced to (min, max) per SAMPLES_PER_PEAK samples with numpy, so memory stays
+    flat however long the file is. Each coarser level halves the previous one. The
+    pyramid is stored as int8 pairs (about 1.2 MB per hour of audio for the finest level,
+    the same again for all other levels) and any zoom level is read back with read_peaks
+    without decoding again.
+
+    Args:
+        media_path (str): Path to an audio or video file
+        cache_dir (str): Cache folder
+        chunk_peaks (int): Peaks computed per read (default: 4096)
+
+    Returns:
+        str: Path of the peaks file
+    """
+    peaks_path = waveform_path(media_path, cache_dir)
+    if os.path.exists(peaks_path):
+        touch(peaks_path)
+        return peaks_path
+    if not probe_video_cached(media_path)['has_audio']:
+        raise ValueError(f"No audio stream in: {media_path}")
+
+    pipe = FFmpegPipe([
+        '-i', media_path,
+        '-map', '0:a:0',
+        '-ac', '1',
+        '-ar', str(WAVEFORM_RATE),
+        '-f', 'f32le',
+        'pipe:1'
+    ], stdout='pipe')
+
+    mins, maxs = [], []
+    leftover = np.empty(0, dtype=np.float32)
+    total = 0
+    try:
+        for chunk in iter(lambda: pipe.process.stdout.read(SAMPLES_PER_PEAK * chunk_peaks * 4), b''):
+            samples = np.frombuffer(chunk[:len(chunk) - len(chunk) % 4], dtype=np.float32)
+            total += len(samples)
+            if len(leftover):
+                samples = np.concatenate([leftover, samples])
+            whole = len(samples) // SAMPLES_PER_PEAK * SAMPLES_PER_PEAK
+            leftover = samples[whole:].copy()
+            if whole:
+                blocks = samples[:whole].reshape(-1, SAMPLES_PER_PEAK)
+                mins.append(blocks.min(axis=1))
+                maxs.append(blocks.max(axis=1))
+        if len(leftover):  # Partial last block
+            mins.append(leftover.min(keepdims=True))
+            maxs.append(leftover.max(keepdims=True))
+    except BaseException:
+        pipe.close(kill=True)
+        raise
+    pipe.close()
+    if not mins:
+        raise ValueError(f"No audio samples decoded from: {media_path}")
+
+    levels = build_pyramid(_to_int8(np.concatenate(mins), np.concatenate(maxs)))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{peaks_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, 1, WAVEFORM_RATE, SAMPLES_PER_PEAK, len(levels),
+                                 total / WAVEFORM_RATE, total))
+            offset = _HEADER.size + _LEVEL.size * len(levels)
+            for level in levels:
+                f.write(_LEVEL.pack(offset, len(level)))
+                offset += level.nbytes
+            for level in levels:
+                f.write(level.tobytes())
+        os.replace(tmp_path, peaks_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    enforce_budget(cache_dir, WAVEFORM_CACHE_BUDGET, keep=[peaks_path])
+    print(f"Waveform: {len(levels[0])} peaks in {len(levels)} levels saved to: {peaks_path}")
+    return peaks_path
+
+def read_peaks(peaks_path, start=0.0, end=None, pixels=1000):
+    """
+    Read the peaks for a time range at the zoom level that fits a display width
+
+    The coarsest level that still has at least one peak per pixel is used, so the
+    result holds between `pixels` and 2 * `pixels` peaks (fewer when the range is short).
+    Only that slice of the file is read (memory-mapped).
+
+    Args:
+        peaks_path (str): Peaks file from generate_waveform
+        start (float): Range start in seconds (default: 0.0)
+        end (float): Range end in seconds (default: end of the audio)
+        pixels (int): Display width in pixels (default: 1000)
+
+    Returns:
+        dict: 'sample_rate', 'samples_per_peak', 'start' (time of the first peak), 'duration'
+              and 'peaks', an int8 array of (min, max) pairs scaled to -127..127
+    """
+    with open(peaks_path, 'rb') as f:
+        magic, version, rate, base, level_count, duration, _ = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != 1:
+            raise ValueError(f"Not a peaks file: {peaks_path}")
+        table = [_LEVEL.unpack(f.read(_LEVEL.size)) for _ in range(level_count)]
+
+    end = duration if end is None else min(end, duration)
+    start = max(0.0, min(start, end))
+    wanted = max((end - start) * rate / max(pixels, 1), base)
+    level = min(int(np.log2(wanted / base)), level_count - 1)
+    samples_per_peak = base << level
+    offset, count = table[level]
+
+    first = min(int(start * rate // samples_per_peak), count)
+    last = min(-(-int(np.ceil(end * rate)) // samples_per_peak), count)
+    peaks = np.memmap(peaks_path, dtype=np.int8, mode='r', offset=offset, shape=(count, 2))[first:last]
+    return {
+        'sample_rate': rate,
+        'samples_per_peak': samples_per_peak,
+        'start': first * samples_per_peak / rate,
+        'duration': duration,
+        'peaks': np.array(peaks),
+    }
+
+def _forget(peaks_path):
+    with _jobs_lock:
+        _jobs.pop(peaks_path, None)
+
+def start_waveform(media_path, cache_dir=WAVEFORM_CACHE_DIR):
+    """
+    Generate the peaks file in the background (no-op when it exists or is being generated)
+
+    Returns:
+        tuple: (peaks_path, future); future is None when the peaks file is ready. A failed
+               job is reported once through its future and retried on the next call.
+    """
+    peaks_path = waveform_path(media_path, cache_dir)
+    if os.path.exists(peaks_path):
+        touch(peaks_path)
+        return peaks_path, None
+    with _jobs_lock:
+        future = _jobs.get(peaks_path)
+        if future is None:
+            future = _executor.submit(generate_waveform, media_path, cache_dir)
+            _jobs[peaks_path] = future
+            submitted = True
+        else:
+            submitted = False
+    if submitted:  # Outside the lock: the callback runs right away if the job already finished
+        future.add_done_callback(lambda _: _forget(peaks_path))
+    return peaks_path, future
+
+if __name__ == "__main__":
+    # Example usage: overview of a whole track, then a 10 second zoom
+    music_path = r"C:\data\zomato\receipe\Noodles\s2.wav"
+
+    peaks_path = generate_waveform(music_path)
+    overview = read_peaks(peaks_path, pixels=800)
+    print(f"Overview: {len(overview['peaks'])} peaks, {overview['samples_per_peak']} samples each")
+    zoom = read_peaks(peaks_path, start=30, end=40, pixels=800)
+    print(f"Zoom: {len(zoom['peaks'])} peaks, {zoom['samples_per_peak']} samples each")